@@ -0,0 +1,179 @@
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Directory of the columnar match archive; unset disables archiving
+MATCH_ARCHIVE_DIR = os.getenv("MATCH_ARCHIVE_DIR")
+
+# One row per hero appearance, in the narrowest dtypes that fit
+ARCHIVE_COLUMNS = (
+    ("match_id", "int64"),
+    ("winner_team", "int8"),
+    ("hero_id", "int16"),
+    ("team", "int8"),
+    ("kills", "int16"),
+    ("deaths", "int16"),
+    ("assists", "int16"),
+    ("damage_dealt", "int32"),
+)
+
+def load_pyarrow():
+    """Import pyarrow, which is only needed for the match archive"""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise ImportError("The match archive requires pyarrow (pip install pyarrow)") from e
+    return pa
+
+def _column_to_numpy(column) -> np.ndarray:
+    """Zero-copy view of a single-chunk column; multi-chunk columns are concatenated once"""
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return np.concatenate([chunk.to_numpy(zero_copy_only=True) for chunk in column.chunks])
+
+class MatchArchive:
+    """Day-partitioned Arrow IPC files of match_heroes for analysis reads
+
+    Layout: <root>/date=YYYY-MM-DD/part-<uuid>.arrow, one file per write
+    and day. Files are uncompressed so they can be memory-mapped; a read
+    of a single file is zero-copy, while reads spanning several files are
+    concatenated into new arrays. The database stays the source of truth.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.pa = load_pyarrow()
+        self.schema = self.pa.schema([(name, getattr(self.pa, dtype)()) for name, dtype in ARCHIVE_COLUMNS])
+
+    @classmethod
+    def from_env(cls) -> Optional["MatchArchive"]:
+        """Archive at MATCH_ARCHIVE_DIR, or None when archiving is not configured"""
+        if not MATCH_ARCHIVE_DIR:
+            return None
+        return cls(MATCH_ARCHIVE_DIR)
+
+    # Writing
+
+    def write_matches(self, matches: List[Dict], match_day) -> int:
+        """Append matches to their day partitions and return the number of rows written
+
+        Each match needs its database row "id", "winner_team" and "heroes";
+        match_day maps a match to the day it is filed under.
+        """
+        by_day = defaultdict(list)
+        for match in matches:
+            by_day[match_day(match)].append(match)
+
+        rows = 0
+        for day, day_matches in by_day.items():
+            rows += self._write_partition(day, day_matches)
+        return rows
+
+    def _write_partition(self, day: date, matches: List[Dict]) -> int:
+        columns = {name: [] for name, _ in ARCHIVE_COLUMNS}
+        for match in matches:
+            for hero in match["heroes"]:
+                columns["match_id"].append(match["id"])
+                columns["winner_team"].append(match["winner_team"])
+                for name in ("hero_id", "team", "kills", "deaths", "assists", "damage_dealt"):
+                    columns[name].append(hero[name])
+
+        table = self.pa.table(
+            {name: np.asarray(columns[name], dtype=dtype) for name, dtype in ARCHIVE_COLUMNS},
+            schema=self.schema
+        )
+
+        directory = os.path.join(self.root, f"date={day.isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{uuid.uuid4().hex}.arrow")
+
+        # Write under a temporary name so readers never see a partial file
+        with self.pa.OSFile(path + ".tmp", "wb") as sink:
+            with self.pa.ipc.new_file(sink, self.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + ".tmp", path)
+        return table.num_rows
+
+    # Reading
+
+    def days(self) -> List[date]:
+        """Days with at least one archived partition, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            date.fromisoformat(entry[len("date="):])
+            for entry in os.listdir(self.root)
+            if entry.startswith("date=")
+        )
+
+    def files(self, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[str]:
+        """Archive files for the days in [start, end]; either bound may be omitted"""
+        for day in self.days():
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            directory = os.path.join(self.root, f"date={day.isoformat()}")
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".arrow"):
+                    yield os.path.join(directory, name)
+
+    def _read_files(self, start: Optional[date], end: Optional[date]) -> List:
+        return [self.pa.ipc.open_file(self.pa.memory_map(path)).read_all() for path in self.files(start, end)]
+
+    def read_table(self, start: Optional[date] = None, end: Optional[date] = None):
+        """pyarrow Table of every archived row in [start, end], duplicates included
+
+        Chunks stay memory-mapped; no data is copied.
+        """
+        tables = self._read_files(start, end)
+        if not tables:
+            return self.schema.empty_table()
+        return self.pa.concat_tables(tables)
+
+    def read_columns(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """Archive columns as NumPy arrays in their compact dtypes
+
+        Zero-copy views of a single file; reading several files copies
+        them into one array per column. A match written to more than one file, e.g. by an export over
+        matches that were already archived, keeps only the rows of the
+        first file it appears in.
+        """
+        tables = self._read_files(start, end)
+        if not tables:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in ARCHIVE_COLUMNS}
+        table = self.pa.concat_tables(tables)
+        columns = {name: _column_to_numpy(table.column(name)) for name, _ in ARCHIVE_COLUMNS}
+
+        if len(tables) > 1:
+            file_idx = np.repeat(np.arange(len(tables)), [t.num_rows for t in tables])
+            _, first, match_idx = np.unique(columns["match_id"], return_index=True, return_inverse=True)
+            keep = file_idx == file_idx[first][match_idx]
+            if not keep.all():
+                columns = {name: column[keep] for name, column in columns.items()}
+        return columns
+
+    def match_ids(self) -> np.ndarray:
+        """Sorted IDs of every archived match, read from the match_id column only"""
+        ids = [_column_to_numpy(table.column("match_id")) for table in self._read_files(None, None)]
+        if not ids:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(ids))
+
+    def match_columns(self, start: Optional[date] = None,
+                      end: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(match_idx, hero_id, team) per appearance and winner_team per match
+
+        The format GameTreeAnalysis.initialize_from_columns takes; matches
+        are numbered in match ID order.
+        """
+        columns = self.read_columns(start, end)
+        _, first, match_idx = np.unique(columns["match_id"], return_index=True, return_inverse=True)
+        winner_team = columns["winner_team"][first]
+        return match_idx, columns["hero_id"], columns["team"], winner_team
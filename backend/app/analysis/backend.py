@@ -0,0 +1,87 @@
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "numpy", "cupy" or "auto" (use an accelerator only if it is present and faster)
+ANALYSIS_BACKEND = os.getenv("ANALYSIS_BACKEND", "auto")
+
+class ArrayBackend:
+    """Array module used by the analysis code, plus host/device transfers"""
+
+    def __init__(self, name: str, xp):
+        self.name = name
+        self.xp = xp
+
+    def asarray(self, array):
+        """Move a host array to the backend's device (no copy for numpy)"""
+        return self.xp.asarray(array)
+
+    def asnumpy(self, array) -> np.ndarray:
+        """Bring a backend array back to host memory"""
+        if self.xp is np:
+            return np.asarray(array)
+        return self.xp.asnumpy(array)
+
+    def synchronize(self):
+        if self.xp is not np:
+            self.xp.cuda.Stream.null.synchronize()
+
+    def __repr__(self):
+        return f"ArrayBackend({self.name!r})"
+
+NUMPY_BACKEND = ArrayBackend("numpy", np)
+
+def load_cupy_backend() -> Optional[ArrayBackend]:
+    """CuPy backend if cupy is installed and a CUDA device is visible, else None"""
+    try:
+        import cupy as cp
+        if cp.cuda.runtime.getDeviceCount() < 1:
+            return None
+    except Exception:
+        return None
+    return ArrayBackend("cupy", cp)
+
+def time_team_scoring(backend: ArrayBackend, n_heroes: int = 40, n_teams: int = 4096,
+                      team_size: int = 6, repeats: int = 5) -> float:
+    """Best-of-N wall time for scoring a batch of team pairs on a backend"""
+    rng = np.random.default_rng(0)
+    matrix = backend.asarray(rng.standard_normal((n_heroes, n_heroes)).astype(np.float32))
+    team1 = backend.asarray(rng.integers(0, n_heroes, (n_teams, team_size)))
+    team2 = backend.asarray(rng.integers(0, n_heroes, (n_teams, team_size)))
+
+    best = float("inf")
+    for _ in range(repeats + 1):  # first run is a warm-up
+        start = time.perf_counter()
+        scores = matrix[team1[:, :, None], team2[:, None, :]].sum(axis=(1, 2))
+        backend.asnumpy(scores)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+@lru_cache(maxsize=None)
+def get_backend(name: Optional[str] = None) -> ArrayBackend:
+    """Resolve the configured array backend, falling back to NumPy"""
+    name = (name or ANALYSIS_BACKEND).lower()
+    if name == "numpy":
+        return NUMPY_BACKEND
+
+    accelerator = load_cupy_backend()
+    if accelerator is None:
+        if name == "cupy":
+            logger.warning("cupy backend requested but no CUDA device is available, using numpy")
+        return NUMPY_BACKEND
+    if name == "cupy":
+        return accelerator
+
+    # auto: only switch when the accelerator is measurably faster
+    numpy_time = time_team_scoring(NUMPY_BACKEND)
+    accelerator_time = time_team_scoring(accelerator)
+    if accelerator_time < 0.8 * numpy_time:
+        logger.info(f"Using {accelerator.name} backend ({accelerator_time:.5f}s vs {numpy_time:.5f}s)")
+        return accelerator
+    return NUMPY_BACKEND
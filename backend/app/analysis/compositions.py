@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def composition_key(hero_ids: Iterable[int]) -> str:
+    """Canonical key of a team composition: sorted hero IDs joined by commas"""
+    return ",".join(map(str, sorted(hero_ids)))
+
+class CompositionInterner:
+    """Assigns dense integer IDs to canonical team compositions
+
+    The same interner can be shared by the ETL aggregation and the payoff
+    matrix so both refer to a composition by the same integer.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._heroes: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._heroes)
+
+    def __contains__(self, hero_ids: Iterable[int]) -> bool:
+        return composition_key(hero_ids) in self._ids
+
+    def intern(self, hero_ids: Iterable[int]) -> int:
+        """ID of a composition, assigning the next free ID on first sight"""
+        heroes = tuple(sorted(hero_ids))
+        key = ",".join(map(str, heroes))
+        comp_id = self._ids.get(key)
+        if comp_id is None:
+            comp_id = len(self._heroes)
+            self._ids[key] = comp_id
+            self._heroes.append(heroes)
+        return comp_id
+
+    def get(self, hero_ids: Iterable[int]) -> Optional[int]:
+        return self._ids.get(composition_key(hero_ids))
+
+    def heroes(self, comp_id: int) -> List[int]:
+        return list(self._heroes[comp_id])
+
+    def key(self, comp_id: int) -> str:
+        return ",".join(map(str, self._heroes[comp_id]))
@@ -1,85 +1,169 @@
 import numpy as np
-import cupy as cp  # GPU acceleration library
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+from app.analysis.backend import ArrayBackend, get_backend
+from app.analysis.team_search import RoleQuotas, build_synergy_matrix, search_best_team
+from app.analysis.matchup_matrix import (
+    build_hero_lookup,
+    build_win_counts,
+    map_hero_ids,
+    match_data_to_columns,
+    smooth_win_counts,
+)
+
+# Imaginary games, half won and half lost, every hero pair starts from
+MATCHUP_PRIOR_GAMES = 20.0
 
 class GameTreeAnalysis:
-    def __init__(self, hero_pool: List[Dict]):
+    def __init__(self, hero_pool: List[Dict], backend: Optional[ArrayBackend] = None,
+                 prior_games: float = MATCHUP_PRIOR_GAMES):
         self.hero_pool = hero_pool
+        self.prior_games = prior_games
+        self.backend = backend or get_backend()
         self.hero_ids = [hero["id"] for hero in hero_pool]
+        self.hero_index = {hero_id: i for i, hero_id in enumerate(self.hero_ids)}
+        self.hero_lookup = build_hero_lookup(self.hero_ids)
+        self.hero_roles = [hero.get("role") or "unknown" for hero in hero_pool]
+        self.win_counts = None  # (heroes x heroes) games hero i won against hero j
+        self.pair_games = None  # (heroes x heroes) games hero i played against hero j
         self.matchup_matrix = None
+        self.device_matrix = None  # matchup_matrix on the backend's device
+        self.padded_device_matrix = None  # extra zero row/column for ragged team batches
+        self.synergy_matrix = np.zeros((len(self.hero_ids), len(self.hero_ids)), dtype=np.float32)
         
     def initialize_matchup_matrix(self, match_data: List[Dict]):
         """Initialize the matchup matrix from historical match data"""
-        n = len(self.hero_ids)
-        self.matchup_matrix = np.zeros((n, n), dtype=np.float32)
+        match_idx, hero_id, team, winner_team = match_data_to_columns(match_data)
+        self.initialize_from_columns(match_idx, hero_id, team, winner_team)
+    
+    def initialize_from_columns(self, match_idx, hero_id, team, winner_team):
+        """Initialize the matchup matrix from columnar match data
+
+        match_idx, hero_id and team have one entry per hero appearance;
+        winner_team has one entry per match.
+        """
+        hero_idx = map_hero_ids(self.hero_lookup, hero_id)
+        win_counts = build_win_counts(match_idx, hero_idx, team, winner_team, len(self.hero_ids))
+        self.set_win_counts(win_counts.astype(np.int32))
+    
+    def set_win_counts(self, win_counts: np.ndarray):
+        """Derive pair game counts and the smoothed matchup matrix from raw win counts"""
+        self.win_counts = win_counts
+        self.pair_games = win_counts + win_counts.T
+        self.matchup_matrix = smooth_win_counts(win_counts, self.prior_games)
+        self.device_matrix = self.backend.asarray(self.matchup_matrix)
+        self.padded_device_matrix = self.backend.asarray(np.pad(self.matchup_matrix, ((0, 1), (0, 1))))
+    
+    def initialize_from_store(self, store):
+        """Initialize the matchup matrix from a MatchStore"""
+        self.initialize_from_columns(*store.to_columns())
+    
+    def initialize_from_archive(self, archive, start=None, end=None):
+        """Initialize the matchup matrix from memory-mapped MatchArchive files for days in [start, end]"""
+        self.initialize_from_columns(*archive.match_columns(start, end))
+    
+    def apply_matches(self, match_data: List[Dict]):
+        """Fold new matches into the win counts, re-deriving only the affected heroes
+        
+        Costs O(batch) plus O(heroes) per affected hero, independent of the
+        history already counted. Arrays are replaced, never modified in
+        place, so a shallow copy of this object can be updated while
+        readers still use the original.
+        """
+        match_idx, hero_id, team, winner_team = match_data_to_columns(match_data)
+        hero_idx = map_hero_ids(self.hero_lookup, hero_id)
+        delta = build_win_counts(match_idx, hero_idx, team, winner_team, len(self.hero_ids)).astype(np.int32)
+        affected = np.flatnonzero(delta.any(axis=0) | delta.any(axis=1))
+        if len(affected) == 0:
+            return
         
-        # Process match data to build matchup matrix
-        for match in match_data:
-            winner_team = match["winner_team"]
-            for hero1 in match["heroes"]:
-                if hero1["team"] == winner_team:
-                    for hero2 in match["heroes"]:
-                        if hero2["team"] != winner_team:
-                            idx1 = self.hero_ids.index(hero1["hero_id"])
-                            idx2 = self.hero_ids.index(hero2["hero_id"])
-                            self.matchup_matrix[idx1, idx2] += 1
-                            self.matchup_matrix[idx2, idx1] -= 1
+        self.win_counts = self.win_counts + delta
+        self.pair_games = self.pair_games + delta + delta.T
         
-        # Normalize
-        row_sums = self.matchup_matrix.sum(axis=1, keepdims=True)
-        self.matchup_matrix = np.divide(self.matchup_matrix, row_sums, 
-                                        out=np.zeros_like(self.matchup_matrix), 
-                                        where=row_sums!=0)
+        # An affected hero's row and, by antisymmetry, its column change
+        matrix = self.matchup_matrix.copy()
+        rows = smooth_win_counts(self.win_counts, self.prior_games, affected)
+        matrix[affected, :] = rows
+        matrix[:, affected] = -rows.T
+        self.matchup_matrix = matrix
+        self.device_matrix = self.backend.asarray(matrix)
+        self.padded_device_matrix = self.backend.asarray(np.pad(matrix, ((0, 1), (0, 1))))
+    
+    def initialize_synergy_matrix(self, team_compositions: List[Dict]):
+        """Initialize ally synergy from identify_team_compositions-style records"""
+        self.synergy_matrix = build_synergy_matrix(self.hero_index, team_compositions)
+    
+    def team_indices(self, hero_ids: List[int]) -> np.ndarray:
+        """Matrix indices for a list of hero IDs"""
+        return np.array([self.hero_index[hero_id] for hero_id in hero_ids], dtype=np.int64)
+    
+    def padded_team_indices(self, teams: List[List[int]]) -> np.ndarray:
+        """(teams x max team size) matrix indices, padded with the index of the zero row"""
+        width = max((len(team) for team in teams), default=0)
+        hero_ids = np.full((len(teams), width), -1, dtype=np.int64)
+        for row, team in enumerate(teams):
+            hero_ids[row, :len(team)] = team
+        
+        indices = np.full(hero_ids.shape, len(self.hero_ids), dtype=np.int64)
+        filled = hero_ids != -1
+        indices[filled] = map_hero_ids(self.hero_lookup, hero_ids[filled])
+        return indices
+    
+    def predict_matchups(self, team1s: List[List[int]], team2s: List[List[int]],
+                         chunk_size: int = 65536) -> np.ndarray:
+        """Predict team1 win probabilities for many team pairs in one vectorized pass"""
+        team1_indices = self.padded_team_indices(team1s)
+        team2_indices = self.padded_team_indices(team2s)
+        
+        scores = np.empty(len(team1s), dtype=np.float64)
+        for lo in range(0, len(team1s), chunk_size):
+            hi = lo + chunk_size
+            t1 = self.backend.asarray(team1_indices[lo:hi])
+            t2 = self.backend.asarray(team2_indices[lo:hi])
+            chunk = self.padded_device_matrix[t1[:, :, None], t2[:, None, :]].sum(axis=(1, 2))
+            scores[lo:hi] = self.backend.asnumpy(chunk)
+        
+        return 1 / (1 + np.exp(-scores))
     
     def predict_matchup(self, team1: List[int], team2: List[int]) -> float:
         """Predict win probability for team1 against team2"""
-        # Convert to GPU arrays for acceleration
-        team1_indices = [self.hero_ids.index(hero_id) for hero_id in team1]
-        team2_indices = [self.hero_ids.index(hero_id) for hero_id in team2]
-        
-        # Transfer to GPU
-        gpu_matchup_matrix = cp.asarray(self.matchup_matrix)
+        xp = self.backend.xp
+        team1_indices = self.backend.asarray(self.team_indices(team1))
+        team2_indices = self.backend.asarray(self.team_indices(team2))
         
-        # Calculate team vs team matchup score using GPU
-        score = 0.0
-        for i in team1_indices:
-            for j in team2_indices:
-                score += float(gpu_matchup_matrix[i, j])
+        # Team vs team matchup score in a single gather + reduction
+        score = float(self.device_matrix[xp.ix_(team1_indices, team2_indices)].sum())
         
         # Convert to win probability
         win_probability = 1 / (1 + np.exp(-score))
         return win_probability
     
-    def find_optimal_counter(self, enemy_team: List[int], available_heroes: List[int]) -> List[int]:
-        """Find optimal counter team composition using game tree analysis"""
-        best_team = []
-        best_score = float('-inf')
-        
-        # Number of heroes in a team
-        team_size = 5
-        
-        # GPU acceleration for batch processing
-        enemy_indices = [self.hero_ids.index(hero_id) for hero_id in enemy_team]
-        available_indices = [self.hero_ids.index(hero_id) for hero_id in available_heroes 
-                            if hero_id not in enemy_team]
-        
-        # Transfer to GPU
-        gpu_matchup_matrix = cp.asarray(self.matchup_matrix)
-        gpu_enemy_indices = cp.asarray(enemy_indices)
-        
-        # Pre-compute matchup scores for all available heroes against enemy team
-        hero_scores = cp.zeros(len(available_indices), dtype=cp.float32)
-        for i, hero_idx in enumerate(available_indices):
-            hero_scores[i] = cp.sum(gpu_matchup_matrix[hero_idx, gpu_enemy_indices])
-        
-        # Convert back to CPU for team composition generation
-        hero_scores_cpu = cp.asnumpy(hero_scores)
+    def find_optimal_counter(self, enemy_team: List[int], available_heroes: List[int],
+                             banned_heroes: Optional[List[int]] = None,
+                             role_quotas: Optional[RoleQuotas] = None,
+                             team_size: int = 6,
+                             synergy_weight: float = 1.0) -> List[int]:
+        """Find the best counter team under role quotas, bans and ally synergy
         
-        # Sort heroes by their score against enemy team
-        sorted_indices = np.argsort(-hero_scores_cpu)
+        Exact branch-and-bound search (see team_search.search_best_team).
+        Heroes are returned strongest counter first.
+        """
+        excluded = set(enemy_team) | set(banned_heroes or [])
+        candidates = [hero_id for hero_id in dict.fromkeys(available_heroes) if hero_id not in excluded]
+        candidate_indices = self.team_indices(candidates)
+        enemy_indices = self.backend.asarray(self.team_indices(enemy_team))
         
-        # Select top heroes as the counter team
-        best_team = [available_heroes[available_indices.index(available_indices[idx])] 
-                    for idx in sorted_indices[:team_size]]
+        # Matchup scores for all candidate heroes against the enemy team at once
+        xp = self.backend.xp
+        counter_scores = self.device_matrix[xp.ix_(self.backend.asarray(candidate_indices), enemy_indices)].sum(axis=1)
+        counter_scores = self.backend.asnumpy(counter_scores)
         
-        return best_team 
\ No newline at end of file
+        team, _ = search_best_team(
+            counter_scores,
+            self.synergy_matrix[np.ix_(candidate_indices, candidate_indices)],
+            [self.hero_roles[i] for i in candidate_indices],
+            team_size,
+            role_quotas=role_quotas,
+            synergy_weight=synergy_weight
+        )
+        team.sort(key=lambda i: -counter_scores[i])
+        return [candidates[i] for i in team]
@@ -0,0 +1,96 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import disable_statement_timeout
+from app.analysis.match_store import MATCH_SLOTS, MatchStore
+
+logger = logging.getLogger(__name__)
+
+# Data access for analysis: every caller that needs matches with their hero
+# lists goes through here instead of joining matches and match_heroes itself.
+
+def match_rows_query(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     max_match_id: Optional[int] = None):
+    """One row per hero appearance, joined to its match, in match ID order"""
+    rows = db.query(
+        models.MatchHero.match_id,
+        models.Match.timestamp,
+        models.Match.winner_team,
+        models.MatchHero.hero_id,
+        models.MatchHero.team,
+        models.MatchHero.kills,
+        models.MatchHero.deaths,
+        models.MatchHero.assists,
+        models.MatchHero.damage_dealt
+    ).join(
+        models.Match,
+        models.Match.id == models.MatchHero.match_id
+    )
+    if start is not None:
+        rows = rows.filter(models.Match.timestamp >= start)
+    if end is not None:
+        rows = rows.filter(models.Match.timestamp < end)
+    if max_match_id is not None:
+        rows = rows.filter(models.MatchHero.match_id <= max_match_id)
+    return rows.order_by(models.MatchHero.match_id, models.MatchHero.id)
+
+def iter_matches(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 batch_size: int = 10_000, max_match_id: Optional[int] = None) -> Iterator[Dict]:
+    """Stream stored matches with their heroes, one dict per match, in match ID order
+
+    match_heroes is read ordered by match_id with yield_per, which uses a
+    server-side cursor on PostgreSQL, and grouped in a single pass, so
+    memory holds one batch of rows rather than the whole table. Matches
+    are limited to start <= timestamp < end when bounds are given, and to
+    row IDs up to max_match_id when it is.
+    """
+    # Streaming the whole history is one long statement
+    disable_statement_timeout(db)
+    rows = match_rows_query(db, start, end, max_match_id).yield_per(batch_size)
+
+    match = None
+    for row in rows:
+        if match is None or match["id"] != row.match_id:
+            if match is not None:
+                yield match
+            match = {"id": row.match_id, "timestamp": row.timestamp, "winner_team": row.winner_team, "heroes": []}
+        match["heroes"].append({
+            "hero_id": row.hero_id,
+            "team": row.team,
+            "kills": row.kills or 0,
+            "deaths": row.deaths or 0,
+            "assists": row.assists or 0,
+            "damage_dealt": row.damage_dealt or 0
+        })
+    if match is not None:
+        yield match
+
+def load_match_store(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     batch_size: int = 10_000, max_match_id: Optional[int] = None) -> MatchStore:
+    """Stream the match history into a MatchStore, batch_size matches at a time
+
+    Matches with more heroes than MATCH_SLOTS are logged and left out
+    rather than failing the whole load.
+    """
+    store = MatchStore()
+    batch = []
+    skipped = []
+    for match in iter_matches(db, start, end, batch_size, max_match_id):
+        if len(match["heroes"]) > MATCH_SLOTS:
+            skipped.append(match["id"])
+            continue
+        if match["winner_team"] is None:
+            match["winner_team"] = 0
+        batch.append(match)
+        if len(batch) >= batch_size:
+            store.append(batch)
+            batch = []
+    store.append(batch)
+    if skipped:
+        logger.warning(f"Skipped {len(skipped)} matches with more than {MATCH_SLOTS} heroes, "
+                       f"match row IDs {skipped[:10]}")
+    return store
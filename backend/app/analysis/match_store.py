@@ -0,0 +1,249 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Hero slots per match; shorter matches are padded with EMPTY_SLOT
+MATCH_SLOTS = 12
+EMPTY_SLOT = -1
+
+# Per-slot hero stats kept alongside the hero matrix
+STAT_COLUMNS = (
+    ("kills", np.int16),
+    ("deaths", np.int16),
+    ("assists", np.int16),
+    ("damage_dealt", np.int32),
+)
+
+def to_datetime64(timestamp) -> np.datetime64:
+    """Match timestamp (datetime or ISO string, optionally with a trailing Z) as naive UTC seconds"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(timestamp, "s")
+
+class MatchStore:
+    """Match history as fixed-width NumPy arrays instead of nested dicts
+
+    Per match: match_ids (int64), winner_team (int8) and timestamps
+    (datetime64[s]). Per hero slot, as (matches x MATCH_SLOTS) matrices:
+    heroes (int16 hero IDs, EMPTY_SLOT for unused slots), team1 (True for
+    team 1) and the stats in STAT_COLUMNS. Appends grow the arrays
+    geometrically; slicing and filtering return new stores.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._time_sorted = True
+        self._match_ids = np.zeros(capacity, dtype=np.int64)
+        self._winner_team = np.zeros(capacity, dtype=np.int8)
+        self._timestamps = np.zeros(capacity, dtype="datetime64[s]")
+        self._heroes = np.full((capacity, MATCH_SLOTS), EMPTY_SLOT, dtype=np.int16)
+        self._team1 = np.zeros((capacity, MATCH_SLOTS), dtype=bool)
+        self._stats = {name: np.zeros((capacity, MATCH_SLOTS), dtype=dtype) for name, dtype in STAT_COLUMNS}
+
+    @classmethod
+    def from_matches(cls, matches: Iterable[Dict]) -> "MatchStore":
+        """Build a store from transformed (list-of-dicts) matches"""
+        store = cls()
+        store.append(matches)
+        return store
+
+    @classmethod
+    def _from_arrays(cls, match_ids, winner_team, timestamps, heroes, team1, stats,
+                     time_sorted: bool) -> "MatchStore":
+        store = cls(capacity=0)
+        store._size = len(match_ids)
+        store._time_sorted = time_sorted
+        store._match_ids = match_ids
+        store._winner_team = winner_team
+        store._timestamps = timestamps
+        store._heroes = heroes
+        store._team1 = team1
+        store._stats = stats
+        return store
+
+    # Array views over the filled rows
+
+    @property
+    def match_ids(self) -> np.ndarray:
+        return self._match_ids[:self._size]
+
+    @property
+    def winner_team(self) -> np.ndarray:
+        return self._winner_team[:self._size]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._size]
+
+    @property
+    def heroes(self) -> np.ndarray:
+        return self._heroes[:self._size]
+
+    @property
+    def team1(self) -> np.ndarray:
+        return self._team1[:self._size]
+
+    def stat(self, name: str) -> np.ndarray:
+        return self._stats[name][:self._size]
+
+    @property
+    def filled(self) -> np.ndarray:
+        """(matches x slots) mask of slots holding a hero"""
+        return self.heroes != EMPTY_SLOT
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.match_ids, self.winner_team, self.timestamps, self.heroes, self.team1]
+        arrays += [self.stat(name) for name, _ in STAT_COLUMNS]
+        return sum(array.nbytes for array in arrays)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # Appending
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self._match_ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+
+        def grow(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._match_ids = grow(self._match_ids, 0)
+        self._winner_team = grow(self._winner_team, 0)
+        self._timestamps = grow(self._timestamps, np.datetime64(0, "s"))
+        self._heroes = grow(self._heroes, EMPTY_SLOT)
+        self._team1 = grow(self._team1, False)
+        self._stats = {name: grow(array, 0) for name, array in self._stats.items()}
+
+    def append_arrays(self, match_ids, winner_team, timestamps, heroes, team1,
+                      stats: Optional[Dict[str, np.ndarray]] = None):
+        """Append matches already in columnar form; heroes and team1 are (matches x slots)"""
+        n = len(match_ids)
+        if n == 0:
+            return
+        self._reserve(n)
+        lo, hi = self._size, self._size + n
+        heroes = np.asarray(heroes)
+
+        timestamps = np.asarray(timestamps, dtype="datetime64[s]")
+        if self._time_sorted:
+            previous = self._timestamps[lo - 1:lo]
+            self._time_sorted = bool((np.diff(timestamps) >= np.timedelta64(0, "s")).all()
+                                     and (lo == 0 or timestamps[0] >= previous[0]))
+
+        self._match_ids[lo:hi] = match_ids
+        self._winner_team[lo:hi] = winner_team
+        self._timestamps[lo:hi] = timestamps
+        self._heroes[lo:hi, :heroes.shape[1]] = heroes
+        self._team1[lo:hi, :heroes.shape[1]] = team1
+        for name, values in (stats or {}).items():
+            self._stats[name][lo:hi, :heroes.shape[1]] = values
+        self._size = hi
+
+    def append(self, matches: Iterable[Dict]):
+        """Append transformed matches: winner_team, timestamp and heroes, plus "id" when known"""
+        matches = list(matches)
+        n = len(matches)
+        heroes = np.full((n, MATCH_SLOTS), EMPTY_SLOT, dtype=np.int16)
+        team1 = np.zeros((n, MATCH_SLOTS), dtype=bool)
+        stats = {name: np.zeros((n, MATCH_SLOTS), dtype=dtype) for name, dtype in STAT_COLUMNS}
+
+        for row, match in enumerate(matches):
+            if len(match["heroes"]) > MATCH_SLOTS:
+                raise ValueError(f"Match has more than {MATCH_SLOTS} heroes")
+            for slot, hero in enumerate(match["heroes"]):
+                heroes[row, slot] = hero["hero_id"]
+                team1[row, slot] = hero["team"] == 1
+                for name, _ in STAT_COLUMNS:
+                    stats[name][row, slot] = hero.get(name, 0)
+
+        self.append_arrays(
+            np.array([match.get("id", 0) for match in matches], dtype=np.int64),
+            np.array([match["winner_team"] for match in matches], dtype=np.int8),
+            np.array([to_datetime64(match["timestamp"]) for match in matches], dtype="datetime64[s]"),
+            heroes, team1, stats
+        )
+
+    # Slicing and filtering
+
+    def take(self, rows) -> "MatchStore":
+        """Store of the selected rows (a slice gives views, a mask or index array copies)"""
+        timestamps = self.timestamps[rows]
+        time_sorted = self._time_sorted
+        if not isinstance(rows, slice) and np.asarray(rows).dtype != bool:
+            time_sorted = bool((np.diff(timestamps) >= np.timedelta64(0, "s")).all())
+
+        return MatchStore._from_arrays(
+            self.match_ids[rows],
+            self.winner_team[rows],
+            timestamps,
+            self.heroes[rows],
+            self.team1[rows],
+            {name: self.stat(name)[rows] for name, _ in STAT_COLUMNS},
+            time_sorted
+        )
+
+    def filter(self, mask: np.ndarray) -> "MatchStore":
+        """Matches where the boolean per-match mask is True"""
+        return self.take(np.asarray(mask, dtype=bool))
+
+    def window(self, start=None, end=None) -> "MatchStore":
+        """Matches with start <= timestamp < end; either bound may be omitted
+
+        A binary search on time-ordered stores, so the result shares memory.
+        """
+        start = None if start is None else to_datetime64(start)
+        end = None if end is None else to_datetime64(end)
+        if self._time_sorted:
+            lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side="left"))
+            hi = self._size if end is None else int(np.searchsorted(self.timestamps, end, side="left"))
+            return self.take(slice(lo, max(lo, hi)))
+
+        mask = np.ones(self._size, dtype=bool)
+        if start is not None:
+            mask &= self.timestamps >= start
+        if end is not None:
+            mask &= self.timestamps < end
+        return self.filter(mask)
+
+    def hero_mask(self, hero_id: int, team: Optional[int] = None) -> np.ndarray:
+        """Per-match mask of matches the hero played in, optionally on a given team"""
+        slots = self.heroes == hero_id
+        if team is not None:
+            slots &= self.team1 if team == 1 else ~self.team1
+        return slots.any(axis=1)
+
+    def with_hero(self, hero_id: int, team: Optional[int] = None) -> "MatchStore":
+        return self.filter(self.hero_mask(hero_id, team))
+
+    # Analysis views
+
+    def team_of_slot(self) -> np.ndarray:
+        """(matches x slots) team number per slot, 0 for empty slots"""
+        return np.where(self.filled, np.where(self.team1, 1, 2), 0).astype(np.int8)
+
+    def to_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(match_idx, hero_id, team) per appearance and winner_team per match
+
+        The columnar format GameTreeAnalysis.initialize_from_columns takes.
+        """
+        filled = self.filled
+        match_idx = np.broadcast_to(np.arange(self._size)[:, None], filled.shape)[filled]
+        return match_idx, self.heroes[filled], self.team_of_slot()[filled], self.winner_team
+
+    def team_heroes(self, team: int) -> np.ndarray:
+        """(matches x slots) sorted hero IDs of one team per match, padded with EMPTY_SLOT"""
+        on_team = self.filled & (self.team1 if team == 1 else ~self.team1)
+        sentinel = np.iinfo(np.int16).max
+        rows = np.sort(np.where(on_team, self.heroes, sentinel), axis=1)
+        rows[rows == sentinel] = EMPTY_SLOT
+        return rows
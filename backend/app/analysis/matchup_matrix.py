@@ -0,0 +1,110 @@
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+def build_hero_lookup(hero_ids: Sequence[int]) -> np.ndarray:
+    """Dense hero id -> matrix index table, -1 for ids that are not in the pool"""
+    hero_ids = np.asarray(hero_ids, dtype=np.int64)
+    size = int(hero_ids.max()) + 1 if len(hero_ids) else 0
+    lookup = np.full(size, -1, dtype=np.int64)
+    lookup[hero_ids] = np.arange(len(hero_ids))
+    return lookup
+
+def map_hero_ids(lookup: np.ndarray, hero_ids) -> np.ndarray:
+    """Translate hero ids to matrix indices in one vectorized gather"""
+    hero_ids = np.asarray(hero_ids, dtype=np.int64)
+    in_range = (hero_ids >= 0) & (hero_ids < len(lookup))
+    indices = np.full(hero_ids.shape, -1, dtype=np.int64)
+    indices[in_range] = lookup[hero_ids[in_range]]
+    if (indices < 0).any():
+        unknown = hero_ids[indices < 0][0]
+        raise ValueError(f"Unknown hero ID: {unknown}")
+    return indices
+
+def match_data_to_columns(match_data: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten the router's list-of-dicts match format into columnar arrays
+
+    Returns (match_idx, hero_id, team) per hero appearance and winner_team per match.
+    """
+    sizes = [len(match["heroes"]) for match in match_data]
+    total = sum(sizes)
+
+    match_idx = np.repeat(np.arange(len(match_data), dtype=np.int64), sizes)
+    hero_id = np.fromiter(
+        (hero["hero_id"] for match in match_data for hero in match["heroes"]),
+        dtype=np.int64, count=total
+    )
+    team = np.fromiter(
+        (hero["team"] for match in match_data for hero in match["heroes"]),
+        dtype=np.int64, count=total
+    )
+    winner_team = np.fromiter(
+        (match["winner_team"] for match in match_data),
+        dtype=np.int64, count=len(match_data)
+    )
+    return match_idx, hero_id, team, winner_team
+
+def build_win_counts(match_idx, hero_idx, team, winner_team, n_heroes: int,
+                     chunk_size: int = 100_000) -> np.ndarray:
+    """Count, for every hero pair (i, j), how often i was on the winning side against j
+
+    Inputs are columnar: one entry per hero appearance for match_idx, hero_idx
+    and team, and one entry per match for winner_team. Matches are processed in
+    chunks: each chunk is turned into (matches x heroes) winner and loser
+    incidence matrices with bincount, and their product adds that chunk's
+    winner-vs-loser pairs to the total, so memory stays bounded.
+    """
+    match_idx = np.asarray(match_idx, dtype=np.int64)
+    hero_idx = np.asarray(hero_idx, dtype=np.int64)
+    team = np.asarray(team)
+    winner_team = np.asarray(winner_team)
+
+    counts = np.zeros((n_heroes, n_heroes), dtype=np.float64)
+    if len(match_idx) == 0 or n_heroes == 0:
+        return counts.astype(np.int64)
+
+    # Group appearances by match so each chunk is a contiguous slice
+    if (np.diff(match_idx) < 0).any():
+        order = np.argsort(match_idx, kind="stable")
+        match_idx, hero_idx, team = match_idx[order], hero_idx[order], team[order]
+
+    won = team == winner_team[match_idx]
+    n_matches = len(winner_team)
+
+    for lo in range(0, n_matches, chunk_size):
+        hi = min(lo + chunk_size, n_matches)
+        start, end = np.searchsorted(match_idx, [lo, hi])
+        if start == end:
+            continue
+
+        flat = (match_idx[start:end] - lo) * n_heroes + hero_idx[start:end]
+        chunk_won = won[start:end]
+        size = (hi - lo) * n_heroes
+
+        winners = np.bincount(flat[chunk_won], minlength=size).reshape(hi - lo, n_heroes)
+        losers = np.bincount(flat[~chunk_won], minlength=size).reshape(hi - lo, n_heroes)
+        counts += winners.T.astype(np.float64) @ losers.astype(np.float64)
+
+    return np.rint(counts).astype(np.int64)
+
+def normalize_win_counts(win_counts: np.ndarray) -> np.ndarray:
+    """Turn raw win counts into the row-normalized win-minus-loss matchup matrix"""
+    matrix = (win_counts - win_counts.T).astype(np.float32)
+    row_sums = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, row_sums,
+                     out=np.zeros_like(matrix),
+                     where=row_sums != 0)
+
+def smooth_win_counts(win_counts: np.ndarray, prior_games: float, rows=None) -> np.ndarray:
+    """Posterior mean win-minus-loss rate of every hero pair under a Beta prior
+
+    Each pair starts from prior_games imaginary games split evenly between
+    wins and losses, so (wins - losses) / (games + prior_games) stays close
+    to 0 for rarely seen pairs and approaches the observed rate as games
+    accumulate. The result is antisymmetric and lies in (-1, 1). With rows
+    (matrix indices), only those rows of the matrix are computed.
+    """
+    rows = slice(None) if rows is None else rows
+    wins = win_counts[rows].astype(np.float64)
+    losses = win_counts[:, rows].T.astype(np.float64)
+    matrix = (wins - losses) / (wins + losses + prior_games)
+    return matrix.astype(np.float32)
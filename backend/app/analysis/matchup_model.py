@@ -0,0 +1,275 @@
+import copy
+import dataclasses
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.analysis.game_tree import GameTreeAnalysis
+from app.analysis.match_history import load_match_store
+from app.analysis.matchup_matrix import map_hero_ids
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Matchups whose advantage is below this are left out of explanations
+SIGNIFICANT_ADVANTAGE = 0.1
+# Average games per hero pair at which a prediction counts as fully supported
+CONFIDENT_PAIR_GAMES = 100
+
+@dataclass(frozen=True)
+class MatchupModelSnapshot:
+    """Immutable, fully built matchup model that requests can read without locking"""
+    version: int
+    data_version: Tuple[int, int, int]  # (match count, max match id, hero count)
+    built_at: datetime
+    hero_pool: List[Dict]
+    game_tree: GameTreeAnalysis
+    hero_names: Dict[int, str] = field(default_factory=dict)
+    # Hero name per matrix index
+    name_table: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def cache_tag(self) -> str:
+        """Key fragment that changes whenever the underlying match data changes"""
+        return "-".join(map(str, self.data_version))
+
+    @property
+    def pair_games(self) -> np.ndarray:
+        """(heroes x heroes) games in which hero i played against hero j"""
+        return self.game_tree.pair_games
+
+    def has_hero(self, hero_id: int) -> bool:
+        return hero_id in self.hero_names
+
+    def indices(self, hero_ids: List[int]) -> np.ndarray:
+        """Matrix indices for hero IDs, through the dense id -> index table"""
+        return map_hero_ids(self.game_tree.hero_lookup, hero_ids)
+
+    def matchup_block(self, team1: List[int], team2: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(team1 x team2) matchup scores and the games behind each of them"""
+        block = np.ix_(self.indices(team1), self.indices(team2))
+        return self.game_tree.matchup_matrix[block], self.pair_games[block]
+
+    def _hero(self, index: int) -> Dict:
+        return {"id": int(self.game_tree.hero_ids[index]), "name": self.name_table[index]}
+
+    def confidence(self, team1: List[int], team2: List[int]) -> float:
+        """Share of the data supporting a prediction, from the average games per hero pair"""
+        if not team1 or not team2:
+            return 0.0
+        _, games = self.matchup_block(team1, team2)
+        return min(1.0, float(games.mean()) / CONFIDENT_PAIR_GAMES)
+
+    def key_matchups(self, team1: List[int], team2: List[int], limit: int = 5) -> List[Dict]:
+        """Most significant hero-vs-hero matchups, strongest first"""
+        rows, columns = self.indices(team1), self.indices(team2)
+        flat = self.game_tree.matchup_matrix[np.ix_(rows, columns)].ravel()
+        ranked = np.argsort(-np.abs(flat), kind="stable")
+        ranked = ranked[np.abs(flat[ranked]) > SIGNIFICANT_ADVANTAGE][:limit]
+
+        key_matchups = []
+        for position in ranked:
+            i, j = divmod(int(position), len(columns))
+            advantage = float(flat[position])
+            key_matchups.append({
+                "hero1": self._hero(rows[i]),
+                "hero2": self._hero(columns[j]),
+                "advantage": advantage,
+                "favors": "team1" if advantage > 0 else "team2"
+            })
+        return key_matchups
+
+    def counter_explanations(self, team: List[int], enemy_team: List[int]) -> List[Dict]:
+        """Enemy heroes each hero of team counters, most valuable hero first"""
+        rows, columns = self.indices(team), self.indices(enemy_team)
+        scores = self.game_tree.matchup_matrix[np.ix_(rows, columns)]
+        countered = scores > SIGNIFICANT_ADVANTAGE
+        overall = np.where(countered, scores, 0).sum(axis=1, dtype=np.float64)
+
+        explanations = []
+        for i in np.argsort(-overall, kind="stable"):
+            explanations.append(dict(
+                self._hero(rows[i]),
+                counters=[
+                    dict(self._hero(columns[j]), advantage=float(scores[i, j]))
+                    for j in np.flatnonzero(countered[i])
+                ],
+                overall_value=float(overall[i])
+            ))
+        return explanations
+
+def get_data_version(db: Session) -> Tuple[int, int, int]:
+    """Cheap fingerprint of the match history used to detect newly loaded matches"""
+    match_count, max_match_id = db.query(
+        func.count(models.Match.id),
+        func.max(models.Match.id)
+    ).one()
+    hero_count = db.query(func.count(models.Hero.id)).scalar()
+    return (match_count or 0, max_match_id or 0, hero_count or 0)
+
+def build_snapshot(db: Session, version: int) -> MatchupModelSnapshot:
+    """Load the match history once and build a matchup model snapshot from it
+
+    The snapshot must hold exactly the matches its data version describes,
+    or apply_matches would count a match twice. On PostgreSQL every read
+    runs in one REPEATABLE READ transaction; elsewhere the history is cut
+    off at the fingerprint's max match ID and the hero count is taken from
+    the heroes actually loaded.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    match_count, max_match_id, _ = get_data_version(db)
+
+    heroes = db.query(models.Hero.id, models.Hero.name, models.Hero.role).order_by(models.Hero.id).all()
+    hero_pool = [{"id": h.id, "name": h.name, "role": h.role} for h in heroes]
+    data_version = (match_count, max_match_id, len(hero_pool))
+
+    # Stream the match history, grouped per match, into compact arrays
+    store = load_match_store(db, max_match_id=max_match_id)
+    game_tree = GameTreeAnalysis(hero_pool)
+    game_tree.initialize_from_store(store)
+
+    # Ally synergy from the aggregated team compositions
+    team_compositions = db.query(
+        models.TeamComposition.heroes,
+        models.TeamComposition.win_count,
+        models.TeamComposition.loss_count
+    ).all()
+    game_tree.initialize_synergy_matrix([
+        {"heroes": comp.heroes or [], "wins": comp.win_count or 0, "losses": comp.loss_count or 0}
+        for comp in team_compositions
+    ])
+
+    return MatchupModelSnapshot(
+        version=version,
+        data_version=data_version,
+        built_at=datetime.utcnow(),
+        hero_pool=hero_pool,
+        game_tree=game_tree,
+        hero_names={h["id"]: h["name"] for h in hero_pool},
+        name_table=[h["name"] for h in hero_pool]
+    )
+
+class MatchupModelRegistry:
+    """Process-wide holder of the current matchup model.
+
+    The model is built once at startup and swapped atomically for a new
+    snapshot whenever the match history changes, so readers never block.
+    Matches stored through this process's loaders are folded in at once
+    by apply_matches. Matches stored by any other process, such as the ETL
+    CLI or another API worker, are only noticed when the background worker
+    next polls the data version, every refresh_interval seconds.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], refresh_interval: float = 60.0):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[MatchupModelSnapshot] = None
+        self._build_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[MatchupModelSnapshot]:
+        return self._snapshot
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the model if the match data changed. Returns True if a new snapshot was published"""
+        with self._build_lock:
+            db = self.session_factory()
+            try:
+                current = self._snapshot
+                if not force and current is not None and get_data_version(db) == current.data_version:
+                    return False
+                # End the fingerprint read so the build starts its own transaction
+                db.rollback()
+
+                version = current.version + 1 if current is not None else 1
+                snapshot = build_snapshot(db, version)
+            finally:
+                db.close()
+
+            self._snapshot = snapshot
+            logger.info(
+                f"Published matchup model v{snapshot.version} "
+                f"({snapshot.data_version[0]} matches, {len(snapshot.hero_pool)} heroes)"
+            )
+            return True
+
+    def apply_matches(self, matches: List[Dict]) -> bool:
+        """Publish a snapshot with newly stored matches folded in, without a rebuild
+
+        matches are transformed matches with their database row "id". Ones
+        the current snapshot already covers are skipped, and the data
+        version advances so the background worker does not rebuild for
+        them. Ally synergy is left as is until the next full rebuild.
+        Returns True if a new snapshot was published.
+        """
+        with self._build_lock:
+            current = self._snapshot
+            if current is None:
+                return False
+            match_count, max_match_id, hero_count = current.data_version
+            new = [match for match in matches if match["id"] > max_match_id]
+            if not new:
+                return False
+
+            game_tree = copy.copy(current.game_tree)
+            try:
+                game_tree.apply_matches(new)
+            except ValueError as e:
+                # e.g. a hero the model was built without; rebuild instead
+                logger.warning(f"Could not apply {len(new)} matches to the matchup model: {e}")
+                self._wake.set()
+                return False
+
+            self._snapshot = dataclasses.replace(
+                current,
+                version=current.version + 1,
+                data_version=(match_count + len(new), max(match["id"] for match in new), hero_count),
+                built_at=datetime.utcnow(),
+                game_tree=game_tree
+            )
+            return True
+
+    def start(self):
+        """Build the initial snapshot and start the background refresh worker"""
+        if self._thread is not None:
+            return
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            logger.error(f"Error building initial matchup model: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="matchup-model-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing matchup model: {e}")
+
+matchup_registry = MatchupModelRegistry(SessionLocal)
@@ -1,51 +1,241 @@
+import time
 import numpy as np
+from scipy import sparse
 from scipy.optimize import linprog
+from app.analysis.compositions import CompositionInterner
+from app.analysis.match_store import EMPTY_SLOT, MatchStore
+
+def _softmax(logits):
+    weights = np.exp(logits - logits.max())
+    return weights / weights.sum()
 
 class TeamCompositionAnalyzer:
-    def __init__(self, hero_pool):
+    def __init__(self, hero_pool, interner=None, min_games=1):
         self.hero_pool = hero_pool
+        self.interner = interner or CompositionInterner()
+        self.min_games = min_games
         self.payoff_matrix = None
-    
-    def build_payoff_matrix(self, match_history):
+        self.pair_games = None
+        self.composition_ids = None  # matrix row -> interned composition ID
+        self.composition_rows = {}  # interned composition ID -> matrix row
+        self.equilibrium = None
+        self.exploitability = None
+        self.converged = False
+        self.iterations = 0
+
+    def build_payoff_matrix(self, match_history, min_games=None):
         """
-        Builds payoff matrix from match history
-        Returns: n x n matrix where n is number of possible team compositions
+        Builds a sparse payoff matrix from match history (match dicts or a MatchStore)
+        Returns: k x k CSR matrix over the k compositions played at least
+        min_games times. Entry (i, j) is the mean result (+1 win, -1 loss)
+        of composition i against composition j; only observed pairs are stored
         """
-        n = len(self.hero_pool)
-        self.payoff_matrix = np.zeros((n, n))
-        
-        for match in match_history:
-            team1_idx = self._get_team_index(match.team1)
-            team2_idx = self._get_team_index(match.team2)
-            if match.winner == 1:
-                self.payoff_matrix[team1_idx][team2_idx] += 1
-            else:
-                self.payoff_matrix[team1_idx][team2_idx] -= 1
-                
+        min_games = self.min_games if min_games is None else min_games
+
+        if isinstance(match_history, MatchStore):
+            comp1 = self._intern_rows(match_history.team_heroes(1))
+            comp2 = self._intern_rows(match_history.team_heroes(2))
+            outcome = np.where(match_history.winner_team == 1, 1.0, -1.0)
+        else:
+            comp1, comp2, outcome = [], [], []
+            for match in match_history:
+                team1 = [h["hero_id"] for h in match["heroes"] if h["team"] == 1]
+                team2 = [h["hero_id"] for h in match["heroes"] if h["team"] == 2]
+                comp1.append(self.interner.intern(team1))
+                comp2.append(self.interner.intern(team2))
+                outcome.append(1.0 if match["winner_team"] == 1 else -1.0)
+
+            comp1 = np.array(comp1, dtype=np.int64)
+            comp2 = np.array(comp2, dtype=np.int64)
+            outcome = np.array(outcome, dtype=np.float64)
+
+        # Keep only compositions with enough games
+        total = len(self.interner)
+        games = np.bincount(comp1, minlength=total) + np.bincount(comp2, minlength=total)
+        self.composition_ids = np.flatnonzero(games >= min_games)
+        self.composition_rows = {int(comp_id): row for row, comp_id in enumerate(self.composition_ids)}
+
+        row_of = np.full(total, -1, dtype=np.int64)
+        row_of[self.composition_ids] = np.arange(len(self.composition_ids))
+        row1, row2 = row_of[comp1], row_of[comp2]
+        kept = (row1 >= 0) & (row2 >= 0)
+
+        # Zero-sum: every match fills (i, j) and the mirrored (j, i) entry
+        rows = np.concatenate([row1[kept], row2[kept]])
+        cols = np.concatenate([row2[kept], row1[kept]])
+        results = np.concatenate([outcome[kept], -outcome[kept]])
+
+        k = len(self.composition_ids)
+        pairs, inverse = np.unique(rows * k + cols, return_inverse=True)
+        pair_games = np.bincount(inverse, minlength=len(pairs)).astype(np.float64)
+        pair_margin = np.bincount(inverse, weights=results, minlength=len(pairs))
+
+        self.pair_games = sparse.csr_matrix((pair_games, (pairs // k, pairs % k)), shape=(k, k))
+        self.payoff_matrix = sparse.csr_matrix((pair_margin / pair_games, (pairs // k, pairs % k)), shape=(k, k))
+
         return self.payoff_matrix
-    
-    def find_nash_equilibrium(self):
+
+    def _intern_rows(self, team_heroes):
+        """Composition IDs for a (matches x slots) matrix of sorted, padded team rows
+
+        Only the distinct rows go through the interner.
+        """
+        if len(team_heroes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        unique_rows, inverse = np.unique(team_heroes, axis=0, return_inverse=True)
+        comp_ids = np.array([self.interner.intern(row[row != EMPTY_SLOT].tolist()) for row in unique_rows],
+                            dtype=np.int64)
+        return comp_ids[inverse.reshape(-1)]
+
+    def composition_heroes(self, row):
+        """Hero IDs of the composition behind a payoff matrix row"""
+        return self.interner.heroes(int(self.composition_ids[row]))
+
+    def find_nash_equilibrium(self, method="lp", warm_start=None, time_budget=None,
+                              tolerance=1e-3, max_iterations=100_000):
         """
-        Implements Nash equilibrium using linear programming
+        Finds a Nash equilibrium of the composition game
+        method="lp" solves the exact linear program over every composition.
+        method="oracle" solves it over a growing set of compositions, adding
+        best responses until none gains more than tolerance (double oracle).
+        method="mwu" runs multiplicative weights on the sparse payoff matrix.
+        Iterative methods stop at tolerance, max_iterations or after
+        time_budget seconds; converged tells whether tolerance was reached.
+        warm_start maps composition IDs to probabilities from a previous equilibrium.
         Returns: Optimal team composition probabilities
         """
-        n = len(self.payoff_matrix)
-        
-        # Objective: maximize the minimum payoff
+        if method == "lp":
+            strategy = self._solve_linear_program()
+        elif method == "oracle":
+            strategy = self._solve_double_oracle(warm_start, time_budget, tolerance, max_iterations)
+        elif method == "mwu":
+            strategy = self._solve_multiplicative_weights(warm_start, time_budget, tolerance, max_iterations)
+        else:
+            raise ValueError(f"Unknown equilibrium method: {method}")
+
+        # The composition game is symmetric, so one strategy serves both sides
+        self.equilibrium = strategy
+        self.exploitability = None if strategy is None else self.exploitability_of(strategy, strategy)
+        self.converged = self.exploitability is not None and (method == "lp" or self.exploitability <= tolerance)
+        return strategy
+
+    def exploitability_of(self, row_strategy, col_strategy):
+        """Duality gap: best response value against col_strategy minus the
+        worst-case value of row_strategy. Zero exactly at an equilibrium"""
+        best_response = (self.payoff_matrix @ col_strategy).max()
+        worst_case = (self.payoff_matrix.T @ row_strategy).min()
+        return float(best_response - worst_case)
+
+    def _solve_linear_program(self, payoff=None):
+        payoff = self.payoff_matrix if payoff is None else payoff
+        n = payoff.shape[0]
+
+        # Objective: maximize the game value v over [v, x]
         c = np.array([-1] + [0] * n)
-        
-        # Constraints
-        A_ub = np.vstack([-np.ones(n) - self.payoff_matrix.T,
-                         -np.eye(n)])
-        b_ub = np.zeros(2 * n)
-        
+
+        # Constraints: v <= (x^T A)_j for every opposing composition j
+        A_ub = sparse.hstack([sparse.csr_matrix(np.ones((n, 1))), -payoff.T]).tocsr()
+        b_ub = np.zeros(n)
+
         A_eq = np.array([[0] + [1] * n])
         b_eq = np.array([1])
-        
-        # Bounds
-        bounds = [(None, None)] + [(0, 1)] * n
-        
+
+        # The game value lies within the payoff range; bounding it keeps HiGHS fast
+        value_bound = np.abs(payoff.data).max() if payoff.nnz else 1.0
+        bounds = [(-value_bound, value_bound)] + [(0, 1)] * n
+
         # Solve linear program
-        result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds)
-        
-        return result.x[1:] if result.success else None 
\ No newline at end of file
+        result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs")
+
+        return result.x[1:] if result.success else None
+
+    def _solve_double_oracle(self, warm_start, time_budget, tolerance, max_iterations, responses_per_iteration=10):
+        n = self.payoff_matrix.shape[0]
+        if n == 0:
+            return None
+        payoff = self.payoff_matrix.tocsr()
+
+        # Start from the previous equilibrium's support, or the most played composition
+        support = np.zeros(n, dtype=bool)
+        if warm_start:
+            support[[self.composition_rows[comp_id] for comp_id, p in warm_start.items()
+                     if p > 0 and comp_id in self.composition_rows]] = True
+        if not support.any():
+            support[np.asarray(self.pair_games.sum(axis=1)).argmax()] = True
+
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        strategy = None
+        self.iterations = 0
+
+        for t in range(1, max_iterations + 1):
+            rows = np.flatnonzero(support)
+            restricted = self._solve_linear_program(payoff[rows][:, rows])
+            if restricted is None:
+                return strategy
+            strategy = np.zeros(n)
+            strategy[rows] = restricted
+            self.iterations = t
+
+            # Compositions that beat the restricted equilibrium join the game
+            values = payoff @ strategy
+            game_value = (payoff.T @ strategy)[rows].min()
+            responses = np.flatnonzero(~support & (values > game_value + tolerance / 2))
+            if len(responses) == 0:
+                break
+            support[responses[np.argsort(values[responses])[::-1][:responses_per_iteration]]] = True
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+        return strategy
+
+    def _solve_multiplicative_weights(self, warm_start, time_budget, tolerance, max_iterations,
+                                      check_every=10):
+        n = self.payoff_matrix.shape[0]
+        if n == 0:
+            return None
+        payoff = self.payoff_matrix.tocsr()
+        payoff_t = payoff.T.tocsr()
+        payoff_range = max(1e-12, 2 * np.abs(payoff.data).max()) if payoff.nnz else 1.0
+
+        # Start from the previous equilibrium, leaving some mass on every composition
+        start = np.full(n, 1.0 / n)
+        if warm_start:
+            previous = np.array([warm_start.get(int(comp_id), 0.0) for comp_id in self.composition_ids])
+            if previous.sum() > 0:
+                start = 0.9 * previous / previous.sum() + 0.1 * start
+        log_start = np.log(start)
+
+        # Follow the regularized leader: each side plays a softmax of its
+        # cumulative payoff against the other side's past strategies
+        row_payoff = np.zeros(n)
+        col_payoff = np.zeros(n)
+        row_total = np.zeros(n)
+        col_total = np.zeros(n)
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        self.iterations = 0
+
+        for t in range(1, max_iterations + 1):
+            step = np.sqrt(8 * np.log(n + 1) / t) / payoff_range
+            row = _softmax(log_start + step * row_payoff)
+            col = _softmax(log_start - step * col_payoff)
+            row_total += row
+            col_total += col
+            row_payoff += payoff @ col
+            col_payoff += payoff_t @ row
+            self.iterations = t
+
+            if t % check_every == 0:
+                if self.exploitability_of(row_total / t, col_total / t) <= tolerance:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+
+        return row_total / self.iterations
+
+    def equilibrium_by_id(self):
+        """Equilibrium probability per interned composition ID, usable as a warm start"""
+        return {int(comp_id): float(p) for comp_id, p in zip(self.composition_ids, self.equilibrium)}
+
+    def equilibrium_values(self):
+        """Equilibrium probability per composition key, for storing on TeamComposition rows"""
+        return {self.interner.key(int(comp_id)): float(p) for comp_id, p in zip(self.composition_ids, self.equilibrium)}
@@ -0,0 +1,119 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Role -> (minimum, maximum) number of heroes of that role in a team
+RoleQuotas = Dict[str, Tuple[int, int]]
+
+def build_synergy_matrix(hero_index: Dict[int, int], team_compositions: List[Dict],
+                         prior_games: float = 10.0) -> np.ndarray:
+    """Pairwise ally synergy: the win-minus-loss margin of every pair that played together"""
+    n = len(hero_index)
+    margin = np.zeros((n, n), dtype=np.float64)
+    games = np.zeros((n, n), dtype=np.float64)
+
+    for comp in team_compositions:
+        indices = [hero_index[hero_id] for hero_id in comp["heroes"] if hero_id in hero_index]
+        if len(indices) < 2:
+            continue
+        pair = np.ix_(indices, indices)
+        margin[pair] += comp["wins"] - comp["losses"]
+        games[pair] += comp["wins"] + comp["losses"]
+
+    # prior_games shrinks the margin of rarely seen pairs towards neutral
+    synergy = margin / (games + prior_games)
+    np.fill_diagonal(synergy, 0.0)
+    return synergy.astype(np.float32)
+
+def search_best_team(counter_scores: np.ndarray, synergy: np.ndarray, roles: Sequence[str],
+                     team_size: int, role_quotas: Optional[RoleQuotas] = None,
+                     synergy_weight: float = 1.0) -> Tuple[List[int], float]:
+    """Exact branch-and-bound search for the team maximizing counter scores plus weighted ally synergy
+
+    Returns: (candidate positions, score)
+    """
+    counter_scores = np.asarray(counter_scores, dtype=np.float64)
+    n = len(counter_scores)
+    if n < team_size:
+        raise ValueError(f"Need at least {team_size} candidate heroes, got {n}")
+
+    synergy = synergy_weight * np.asarray(synergy, dtype=np.float64)
+    np.fill_diagonal(synergy, 0.0)
+
+    # future[j, k]: most synergy hero j can collect from k more partners (halved,
+    # because every future pair is counted once from each side)
+    best_partners = -np.sort(-np.maximum(synergy, 0.0), axis=1)[:, :max(team_size - 1, 0)]
+    future = np.zeros((n, team_size), dtype=np.float64)
+    future[:, 1:] = 0.5 * np.cumsum(best_partners, axis=1)
+
+    # Role constraints as per-role count limits; unlisted roles are unconstrained
+    role_quotas = role_quotas or {}
+    role_names = sorted(set(roles) | set(role_quotas))
+    role_codes = np.array([role_names.index(role) for role in roles], dtype=np.int64)
+    min_count = np.array([role_quotas.get(role, (0, team_size))[0] for role in role_names])
+    max_count = np.array([role_quotas.get(role, (0, team_size))[1] for role in role_names])
+    if min_count.sum() > team_size or (min_count > max_count).any():
+        raise ValueError("Role quotas cannot be satisfied by a single team")
+
+    best = {"score": -np.inf, "team": None}
+
+    def visit(available, chosen, score, pair_gain, role_counts):
+        slots = team_size - len(chosen)
+        if slots == 0:
+            if score > best["score"]:
+                best["score"], best["team"] = score, list(chosen)
+            return
+
+        # Heroes that can still be picked without breaking a role quota
+        deficit = np.maximum(min_count - role_counts, 0)
+        need = deficit.sum()
+        if need > slots:
+            return
+        allowed = available & (role_counts[role_codes] < max_count[role_codes])
+        if need == slots:
+            allowed &= deficit[role_codes] > 0
+        remaining = np.flatnonzero(allowed)
+        if len(remaining) < slots:
+            return
+        if need and (np.bincount(role_codes[remaining], minlength=len(role_names)) < deficit).any():
+            return
+
+        gain = counter_scores[remaining] + pair_gain[remaining]
+        if slots == 1:
+            pick = int(np.argmax(gain))
+            if score + gain[pick] > best["score"]:
+                best["score"] = score + gain[pick]
+                best["team"] = list(chosen) + [int(remaining[pick])]
+            return
+
+        # Optimistic gain per hero; the k-th child's bound sums the k-th to
+        # (k + slots - 1)-th best gains and only shrinks with k, so the first
+        # child that cannot beat the incumbent cuts all its later siblings
+        bound = gain + future[remaining, slots - 1]
+        order = np.argsort(-bound, kind="stable")
+        sorted_bound = bound[order]
+        window = np.concatenate(([0.0], np.cumsum(sorted_bound)))
+        last = len(order) - slots + 1
+        child_bounds = score + window[slots:slots + last] - window[:last]
+
+        available = available.copy()
+        for k in range(last):
+            if child_bounds[k] <= best["score"]:
+                break
+            j = int(remaining[order[k]])
+            available[j] = False
+            role_counts[role_codes[j]] += 1
+            chosen.append(j)
+            visit(available, chosen, score + gain[order[k]], pair_gain + synergy[j], role_counts)
+            chosen.pop()
+            role_counts[role_codes[j]] -= 1
+
+    visit(
+        np.ones(n, dtype=bool),
+        [],
+        0.0,
+        np.zeros(n, dtype=np.float64),
+        np.zeros(len(role_names), dtype=np.int64)
+    )
+    if best["team"] is None:
+        raise ValueError("No team satisfies the role quotas with the available heroes")
+    return sorted(best["team"]), float(best["score"])
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import redis
+
+from app.database import async_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+# Scope bumped whenever new matches are stored
+MATCH_DATA_SCOPE = "matches"
+
+class _CacheBase:
+    """Key layout shared by the sync and async caches, so either can invalidate the other's entries"""
+
+    def __init__(self, client, namespace: str = "cache"):
+        self.client = client
+        self.namespace = namespace
+
+    def _version_key(self, scope: str) -> str:
+        return f"{self.namespace}:version:{scope}"
+
+    def _entry_key(self, scope: str, version: int, name: str) -> str:
+        return f"{self.namespace}:{scope}:v{version}:{name}"
+
+class VersionedCache(_CacheBase):
+    """Data-scope versions for synchronous writers such as the ETL loader"""
+
+    def version(self, scope: str = MATCH_DATA_SCOPE) -> int:
+        return int(self.client.get(self._version_key(scope)) or 0)
+
+    def bump_version(self, scope: str = MATCH_DATA_SCOPE) -> Optional[int]:
+        """Invalidate every entry of a scope. Returns the new version, or None if Redis is unavailable"""
+        # Entry keys embed the version, so one INCR makes every older entry unreachable
+        try:
+            return int(self.client.incr(self._version_key(scope)))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not bump cache version for {scope}: {e}")
+            return None
+
+class AsyncVersionedCache(_CacheBase):
+    """Single-flight, stale-while-revalidate Redis cache of pre-serialized JSON for async routes"""
+
+    def __init__(self, client, namespace: str = "cache", lock_timeout: float = 30.0,
+                 wait_timeout: float = 10.0, poll_interval: float = 0.05):
+        super().__init__(client, namespace)
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._refreshes = set()
+
+    async def version(self, scope: str = MATCH_DATA_SCOPE) -> int:
+        return int(await self.client.get(self._version_key(scope)) or 0)
+
+    async def bump_version(self, scope: str = MATCH_DATA_SCOPE) -> Optional[int]:
+        try:
+            return int(await self.client.incr(self._version_key(scope)))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not bump cache version for {scope}: {e}")
+            return None
+
+    # Entries
+
+    @staticmethod
+    def _encode(value: Any, fresh_until: float) -> bytes:
+        return f"{fresh_until:.3f}\n".encode() + json.dumps(value).encode()
+
+    @staticmethod
+    def _decode(raw: bytes):
+        header, _, payload = raw.partition(b"\n")
+        return float(header), payload
+
+    @staticmethod
+    async def _compute_json(compute: Callable[[], Awaitable[Any]]) -> bytes:
+        return json.dumps(await compute()).encode()
+
+    async def _store(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> bytes:
+        value = await compute()
+        entry = self._encode(value, time.time() + ttl)
+        try:
+            # Entries outlive their freshness so they can be served while stale
+            await self.client.set(key, entry, px=int((ttl + stale_ttl) * 1000))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not store cache entry {key}: {e}")
+        return self._decode(entry)[1]
+
+    async def _acquire(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if await self.client.set(f"{key}:lock", token, nx=True, px=int(self.lock_timeout * 1000)):
+            return token
+        return None
+
+    async def _release(self, key: str, token: str):
+        # Only delete our own lock; one that expired and was retaken stays
+        try:
+            if await self.client.get(f"{key}:lock") == token.encode():
+                await self.client.delete(f"{key}:lock")
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not release cache lock {key}: {e}")
+
+    async def _refresh(self, key: str, token: str, compute: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float):
+        try:
+            await self._store(key, compute, ttl, stale_ttl)
+        except Exception as e:
+            logger.error(f"Error refreshing cache entry {key}: {e}")
+        finally:
+            await self._release(key, token)
+
+    def _start_refresh(self, *args):
+        task = asyncio.create_task(self._refresh(*args))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def wait_for_refreshes(self):
+        """Wait for background refreshes started so far, e.g. on shutdown"""
+        if self._refreshes:
+            await asyncio.gather(*self._refreshes, return_exceptions=True)
+
+    async def get_or_compute(self, name: str, compute: Callable[[], Awaitable[Any]], ttl: float,
+                             stale_ttl: float = 0.0, scope: str = MATCH_DATA_SCOPE) -> bytes:
+        """JSON bytes of await compute(), served from the cache when possible"""
+        # Redis errors never fail a request; the value is computed directly instead
+        try:
+            key = self._entry_key(scope, await self.version(scope), name)
+            raw = await self.client.get(key)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Cache unavailable, computing {name} directly: {e}")
+            return await self._compute_json(compute)
+
+        if raw is not None:
+            fresh_until, payload = self._decode(raw)
+            if time.time() >= fresh_until:
+                # Stale: serve it, and let whoever wins the lock refresh it
+                try:
+                    token = await self._acquire(key)
+                except redis.exceptions.RedisError as e:
+                    logger.warning(f"Cache unavailable, serving stale {name} without refreshing: {e}")
+                    token = None
+                if token is not None:
+                    self._start_refresh(key, token, compute, ttl, stale_ttl)
+            return payload
+
+        # Miss: one caller computes, the rest wait for its result
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            token = None
+            try:
+                token = await self._acquire(key)
+                if token is None:
+                    await asyncio.sleep(self.poll_interval)
+                # Also rechecked under the lock: the previous holder may have just stored it
+                raw = await self.client.get(key)
+            except redis.exceptions.RedisError as e:
+                if token is not None:
+                    await self._release(key, token)
+                logger.warning(f"Cache unavailable, computing {name} directly: {e}")
+                return await self._compute_json(compute)
+
+            if token is not None:
+                try:
+                    if raw is not None:
+                        return self._decode(raw)[1]
+                    return await self._store(key, compute, ttl, stale_ttl)
+                finally:
+                    await self._release(key, token)
+            if raw is not None:
+                return self._decode(raw)[1]
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for cache entry {name}, computing it directly")
+                return await self._compute_json(compute)
+
+cache = VersionedCache(redis_client)
+async_cache = AsyncVersionedCache(async_redis_client)
@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from app.routers import matches, analytics, predictions
-from app.database import init_db
+from app.database import init_db, pool_metrics
+from app.analysis.matchup_model import matchup_registry
+from app.cache import async_cache
 
 app = FastAPI(title="Marvel Rivals Analytics")
 
@@ -22,7 +25,20 @@ app.include_router(predictions.router, prefix="/api/predictions", tags=["predict
 @app.on_event("startup")
 async def startup():
     await init_db()
+    # Build the shared matchup model once; it refreshes itself in the background
+    await run_in_threadpool(matchup_registry.start)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await run_in_threadpool(matchup_registry.stop)
+    # Let in-flight stale-while-revalidate refreshes finish before the loop closes
+    await async_cache.wait_for_refreshes()
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Marvel Rivals Analytics API"} 
\ No newline at end of file
+    return {"message": "Welcome to Marvel Rivals Analytics API"} 
+
+@app.get("/metrics/pools")
+async def get_pool_metrics():
+    """Database and Redis pool utilization and checkout waits for this worker"""
+    return pool_metrics()
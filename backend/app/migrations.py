@@ -0,0 +1,159 @@
+import json
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import models
+from app.analysis.compositions import composition_key
+
+logger = logging.getLogger(__name__)
+
+# create_all only creates missing tables. Changes to existing tables are
+# applied here, in order, and recorded in schema_migrations. Every migration
+# must be idempotent because fresh databases already get the current schema
+# from create_all.
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _incremental_aggregates(conn: Connection):
+    """Running hero counters and a unique composition key for upserts"""
+    for column in ("games_played", "wins", "losses"):
+        _add_column(conn, "heroes", column, "INTEGER NOT NULL DEFAULT 0")
+    for column in ("kills", "deaths", "assists", "damage_dealt"):
+        _add_column(conn, "heroes", column, "BIGINT NOT NULL DEFAULT 0")
+
+    _add_column(conn, "team_compositions", "composition_key", "VARCHAR")
+    rows = conn.execute(text(
+        "SELECT id, heroes FROM team_compositions WHERE composition_key IS NULL"
+    )).all()
+    for row_id, heroes in rows:
+        if isinstance(heroes, str):
+            heroes = json.loads(heroes)
+        conn.execute(
+            text("UPDATE team_compositions SET composition_key = :key WHERE id = :id"),
+            {"key": composition_key(heroes or []), "id": row_id}
+        )
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_team_compositions_composition_key "
+        "ON team_compositions (composition_key)"
+    ))
+
+def _create_indexes(conn: Connection, *names: str):
+    """Create indexes declared on the models, by name, if they do not exist yet
+
+    Tables that do not exist yet are skipped; create_all builds them with
+    their indexes.
+    """
+    indexes = {index.name: index for table in models.Base.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        index = indexes[name]
+        if inspect(conn).has_table(index.table.name):
+            index.create(conn, checkfirst=True)
+
+def _analytics_indexes(conn: Connection):
+    """Indexes for the analytics read paths: history stream, time ranges, per-hero series"""
+    _create_indexes(
+        conn,
+        "ix_match_heroes_match_id",
+        "ix_match_heroes_hero_id_match_id",
+        "ix_matches_timestamp",
+        "ix_hero_daily_stats_hero_id_date"
+    )
+
+def _drop_index(conn: Connection, table: str, name: str):
+    if inspect(conn).has_table(table) and name in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        conn.execute(text(f"DROP INDEX {name}"))
+
+def _match_listing_indexes(conn: Connection):
+    """Indexes for keyset-paginated match listing and its map, hero and player filters
+
+    ix_matches_timestamp gains id for the (timestamp, id) keyset, and the
+    (player_id, match_id) index replaces the single-column player_id one.
+    """
+    if inspect(conn).has_table("matches"):
+        timestamp_index = [
+            index for index in inspect(conn).get_indexes("matches") if index["name"] == "ix_matches_timestamp"
+        ]
+        if timestamp_index and timestamp_index[0]["column_names"] == ["timestamp"]:
+            _drop_index(conn, "matches", "ix_matches_timestamp")
+    _drop_index(conn, "match_heroes", "ix_match_heroes_player_id")
+    _create_indexes(
+        conn,
+        "ix_matches_timestamp",
+        "ix_matches_map_timestamp_id",
+        "ix_match_heroes_player_id_match_id"
+    )
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_incremental_aggregates", _incremental_aggregates),
+    ("0002_analytics_indexes", _analytics_indexes),
+    ("0003_match_listing_indexes", _match_listing_indexes),
+]
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+MIGRATION_LOCK_ID = 4_210_771
+
+def _lock_migrations(conn: Connection):
+    """Hold the migration lock until the end of conn's transaction
+
+    Every worker runs migrations at startup; the lock makes the others wait
+    and then find the version already recorded. The statement timeout is
+    lifted first, as waiting for the lock counts against it. A no-op
+    outside PostgreSQL, where SQLite's database lock serializes writers.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+def _warn_if_aggregates_missing(conn: Connection):
+    """Point at the backfill when matches predate the running aggregates
+
+    The backfill reads the whole history, so it is left to the etl.rollups
+    CLI rather than holding up startup.
+    """
+    if not inspect(conn).has_table("aggregate_counters"):
+        return
+    has_matches = conn.execute(text("SELECT 1 FROM matches LIMIT 1")).first() is not None
+    has_counter = conn.execute(text("SELECT 1 FROM aggregate_counters WHERE name = 'matches'")).first() is not None
+    if has_matches and not has_counter:
+        logger.warning(
+            "Stored matches are missing from the running aggregates; "
+            "backfill them with: python -m etl.rollups --aggregates"
+        )
+
+def run_migrations(engine: Engine):
+    """Apply any migrations that have not been recorded yet
+
+    Each migration runs in its own transaction under the migration lock,
+    and is skipped if another worker recorded it while this one waited.
+    """
+    with engine.begin() as conn:
+        _lock_migrations(conn)
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version VARCHAR PRIMARY KEY, applied_at TIMESTAMP)"
+        ))
+
+    for version, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            _lock_migrations(conn)
+            applied = conn.execute(
+                text("SELECT 1 FROM schema_migrations WHERE version = :version"), {"version": version}
+            ).first()
+            if applied:
+                continue
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.utcnow()}
+            )
+        logger.info(f"Applied migration {version}")
+
+    with engine.connect() as conn:
+        _warn_if_aggregates_missing(conn)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -13,6 +13,15 @@ class Hero(Base):
     win_rate = Column(Float, default=0.0)
     pick_rate = Column(Float, default=0.0)
     
+    # Running totals over all loaded matches, folded in by the ETL loader
+    games_played = Column(Integer, default=0, server_default="0", nullable=False)
+    wins = Column(Integer, default=0, server_default="0", nullable=False)
+    losses = Column(Integer, default=0, server_default="0", nullable=False)
+    kills = Column(BigInteger, default=0, server_default="0", nullable=False)
+    deaths = Column(BigInteger, default=0, server_default="0", nullable=False)
+    assists = Column(BigInteger, default=0, server_default="0", nullable=False)
+    damage_dealt = Column(BigInteger, default=0, server_default="0", nullable=False)
+    
     # Relationships
     match_heroes = relationship("MatchHero", back_populates="hero")
 
@@ -28,6 +37,15 @@ class Match(Base):
     
     # Relationships
     heroes = relationship("MatchHero", back_populates="match")
+    
+    # Time range scans (recent matches, rollup recomputes) and keyset
+    # pagination on (timestamp, id); the winner rides along so PostgreSQL
+    # can answer rollup ranges from the index alone
+    __table_args__ = (
+        Index("ix_matches_timestamp", "timestamp", "id", postgresql_include=["winner_team"]),
+        # Keyset pagination within one map
+        Index("ix_matches_map_timestamp_id", "map", "timestamp", "id"),
+    )
 
 class MatchHero(Base):
     __tablename__ = "match_heroes"
@@ -35,7 +53,7 @@ class MatchHero(Base):
     id = Column(Integer, primary_key=True, index=True)
     match_id = Column(Integer, ForeignKey("matches.id"))
     hero_id = Column(Integer, ForeignKey("heroes.id"))
-    player_id = Column(String, index=True)
+    player_id = Column(String)  # indexed by ix_match_heroes_player_id_match_id
     team = Column(Integer)  # 1 or 2
     kills = Column(Integer, default=0)
     deaths = Column(Integer, default=0)
@@ -45,13 +63,43 @@ class MatchHero(Base):
     # Relationships
     match = relationship("Match", back_populates="heroes")
     hero = relationship("Hero", back_populates="match_heroes")
+    
+    __table_args__ = (
+        # Join from matches and the match-ordered history stream; covers the
+        # columns the matchup model and rollups read
+        Index("ix_match_heroes_match_id", "match_id", "id", postgresql_include=["hero_id", "team"]),
+        # Per-hero and per-player lookups
+        Index("ix_match_heroes_hero_id_match_id", "hero_id", "match_id"),
+        Index("ix_match_heroes_player_id_match_id", "player_id", "match_id"),
+    )
 
 class TeamComposition(Base):
     __tablename__ = "team_compositions"
     
     id = Column(Integer, primary_key=True, index=True)
+    composition_key = Column(String, unique=True, index=True)  # Sorted hero IDs, e.g. "1,5,9"
     heroes = Column(JSON)  # List of hero IDs
     win_count = Column(Integer, default=0)
     loss_count = Column(Integer, default=0)
     win_rate = Column(Float, default=0.0)
-    nash_equilibrium_value = Column(Float, nullable=True) 
\ No newline at end of file
+    nash_equilibrium_value = Column(Float, nullable=True)
+
+class HeroDailyStats(Base):
+    __tablename__ = "hero_daily_stats"
+    
+    # Composite key doubles as the (date, hero_id) range-scan index
+    date = Column(Date, primary_key=True)
+    hero_id = Column(Integer, ForeignKey("heroes.id"), primary_key=True)
+    games = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    
+    # Single-hero time series; the counts are included for index-only scans
+    __table_args__ = (
+        Index("ix_hero_daily_stats_hero_id_date", "hero_id", "date", postgresql_include=["games", "wins"]),
+    )
+
+class AggregateCounter(Base):
+    __tablename__ = "aggregate_counters"
+    
+    name = Column(String, primary_key=True)  # e.g. "matches"
+    value = Column(BigInteger, default=0, nullable=False)
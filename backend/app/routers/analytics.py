@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Optional
-from app.database import get_db, redis_client
-import json
+from app.cache import async_cache
+from app.database import AsyncSessionLocal, get_async_db
 from app import models
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import date, datetime, timedelta
 import numpy as np
 
 router = APIRouter()
@@ -17,6 +17,13 @@ class HeroStats(BaseModel):
     win_rate: float
     pick_rate: float
     kda: Optional[float] = None
+    games: int = 0
+    wins: int = 0
+    kills: int = 0
+    deaths: int = 0
+    assists: int = 0
+    damage_dealt: int = 0
+    avg_damage: Optional[float] = None
 
 class TeamCompStats(BaseModel):
     id: int
@@ -25,161 +32,119 @@ class TeamCompStats(BaseModel):
     total_games: int
     nash_equilibrium_value: Optional[float] = None
 
-@router.get("/hero-stats", response_model=List[HeroStats])
-def get_hero_stats(
-    min_games: int = Query(10, description="Minimum games played"),
-    db: Session = Depends(get_db)
-):
-    # Try to get from cache first
-    cache_key = f"hero_stats:{min_games}"
-    cached_data = redis_client.get(cache_key)
-    
-    if cached_data:
-        return json.loads(cached_data)
-    
-    # Query from database
-    heroes = db.query(models.Hero).all()
-    
-    # Calculate additional stats
-    result = []
-    for hero in heroes:
-        # Get match data for this hero
-        match_heroes = db.query(models.MatchHero).filter(
-            models.MatchHero.hero_id == hero.id
-        ).all()
+# Cached values are computed with their own session, because a stale entry
+# is refreshed on a background thread after the request has finished
+async def compute_hero_stats(min_games: int) -> List[Dict]:
+    async with AsyncSessionLocal() as db:
+        # Running totals are maintained by the loader, so this never scans match_heroes
+        heroes = (await db.scalars(
+            select(models.Hero).where(
+                models.Hero.games_played >= min_games
+            ).order_by(models.Hero.id)
+        )).all()
         
-        if len(match_heroes) < min_games:
-            continue
-        
-        # Calculate KDA
-        kills = sum(mh.kills for mh in match_heroes)
-        deaths = sum(mh.deaths for mh in match_heroes)
-        assists = sum(mh.assists for mh in match_heroes)
+        result = []
+        for hero in heroes:
+            result.append({
+                "id": hero.id,
+                "name": hero.name,
+                "win_rate": hero.win_rate,
+                "pick_rate": hero.pick_rate,
+                "kda": (hero.kills + hero.assists) / max(1, hero.deaths),
+                "games": hero.games_played,
+                "wins": hero.wins,
+                "kills": hero.kills,
+                "deaths": hero.deaths,
+                "assists": hero.assists,
+                "damage_dealt": hero.damage_dealt,
+                "avg_damage": hero.damage_dealt / hero.games_played if hero.games_played else None
+            })
+        return result
+
+async def compute_team_compositions(min_games: int) -> List[Dict]:
+    async with AsyncSessionLocal() as db:
+        team_comps = (await db.scalars(
+            select(models.TeamComposition).where(
+                models.TeamComposition.win_count + models.TeamComposition.loss_count >= min_games
+            )
+        )).all()
         
-        kda = (kills + assists) / max(1, deaths)
+        result = []
+        for comp in team_comps:
+            result.append({
+                "id": comp.id,
+                "heroes": comp.heroes,
+                "win_rate": comp.win_rate,
+                "total_games": comp.win_count + comp.loss_count,
+                "nash_equilibrium_value": comp.nash_equilibrium_value
+            })
         
-        result.append({
-            "id": hero.id,
-            "name": hero.name,
-            "win_rate": hero.win_rate,
-            "pick_rate": hero.pick_rate,
-            "kda": kda
-        })
-    
-    # Cache the result
-    redis_client.setex(
-        cache_key,
-        timedelta(minutes=15).seconds,  # Cache for 15 minutes
-        json.dumps(result)
+        # Sort by win rate
+        result.sort(key=lambda x: x["win_rate"], reverse=True)
+        return result
+
+@router.get("/hero-stats", response_model=List[HeroStats])
+async def get_hero_stats(
+    min_games: int = Query(10, description="Minimum games played")
+):
+    # Versioned by the loader, so new matches invalidate it immediately
+    body = await async_cache.get_or_compute(
+        f"hero_stats:{min_games}",
+        lambda: compute_hero_stats(min_games),
+        ttl=timedelta(minutes=15).total_seconds(),
+        stale_ttl=timedelta(minutes=15).total_seconds()
     )
-    
-    return result
+    return Response(content=body, media_type="application/json")
 
 @router.get("/team-compositions", response_model=List[TeamCompStats])
-def get_team_compositions(
-    min_games: int = Query(5, description="Minimum games played"),
-    db: Session = Depends(get_db)
+async def get_team_compositions(
+    min_games: int = Query(5, description="Minimum games played")
 ):
-    # Try to get from cache first
-    cache_key = f"team_comps:{min_games}"
-    cached_data = redis_client.get(cache_key)
-    
-    if cached_data:
-        return json.loads(cached_data)
-    
-    # Query from database
-    team_comps = db.query(models.TeamComposition).all()
-    
-    # Filter and format
-    result = []
-    for comp in team_comps:
-        total_games = comp.win_count + comp.loss_count
-        
-        if total_games < min_games:
-            continue
-        
-        result.append({
-            "id": comp.id,
-            "heroes": comp.heroes,
-            "win_rate": comp.win_rate,
-            "total_games": total_games,
-            "nash_equilibrium_value": comp.nash_equilibrium_value
-        })
-    
-    # Sort by win rate
-    result.sort(key=lambda x: x["win_rate"], reverse=True)
-    
-    # Cache the result
-    redis_client.setex(
-        cache_key,
-        timedelta(minutes=30).seconds,  # Cache for 30 minutes
-        json.dumps(result)
+    body = await async_cache.get_or_compute(
+        f"team_comps:{min_games}",
+        lambda: compute_team_compositions(min_games),
+        ttl=timedelta(minutes=30).total_seconds(),
+        stale_ttl=timedelta(minutes=30).total_seconds()
+    )
+    return Response(content=body, media_type="application/json")
+
+def win_rate_query(start: date, end: date, hero_id: Optional[int] = None):
+    # Range scan over the daily rollup: at most days x heroes rows. The
+    # primary key serves all heroes; ix_hero_daily_stats_hero_id_date one hero
+    query = select(models.HeroDailyStats).where(
+        models.HeroDailyStats.date >= start,
+        models.HeroDailyStats.date <= end
     )
     
-    return result
+    # Filter by hero if specified
+    if hero_id is not None:
+        query = query.where(models.HeroDailyStats.hero_id == hero_id)
+    
+    return query.order_by(models.HeroDailyStats.date, models.HeroDailyStats.hero_id)
 
 @router.get("/win-rate-over-time")
-def get_win_rate_over_time(
+async def get_win_rate_over_time(
     hero_id: Optional[int] = None,
     days: int = Query(30, description="Number of days to analyze"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Calculate date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
     
-    # Base query
-    query = db.query(
-        models.Match.timestamp,
-        models.MatchHero.hero_id,
-        models.MatchHero.team,
-        models.Match.winner_team
-    ).join(
-        models.MatchHero,
-        models.Match.id == models.MatchHero.match_id
-    ).filter(
-        models.Match.timestamp >= start_date,
-        models.Match.timestamp <= end_date
-    )
-    
-    # Filter by hero if specified
-    if hero_id is not None:
-        query = query.filter(models.MatchHero.hero_id == hero_id)
-    
-    # Execute query
-    matches = query.all()
+    rows = (await db.scalars(win_rate_query(start_date.date(), end_date.date(), hero_id))).all()
     
-    # Convert to DataFrame for easier analysis
-    df = pd.DataFrame([
-        {
-            "date": match.timestamp.date(),
-            "hero_id": match.hero_id,
-            "won": match.team == match.winner_team
+    result = []
+    for row in rows:
+        entry = {
+            "date": row.date,
+            "games": row.games,
+            "wins": row.wins,
+            "win_rate": row.wins / row.games if row.games else 0.0
         }
-        for match in matches
-    ])
+        if hero_id is None:
+            # Overall win rate by hero
+            entry["hero_id"] = row.hero_id
+        result.append(entry)
     
-    if df.empty:
-        return []
-    
-    # Group by date and calculate win rate
-    if hero_id is not None:
-        # Single hero analysis
-        result = df.groupby("date").agg(
-            games=("won", "count"),
-            wins=("won", "sum")
-        ).reset_index()
-        
-        result["win_rate"] = result["wins"] / result["games"]
-        
-        return result.to_dict(orient="records")
-    else:
-        # Overall win rate by hero
-        result = df.groupby(["date", "hero_id"]).agg(
-            games=("won", "count"),
-            wins=("won", "sum")
-        ).reset_index()
-        
-        result["win_rate"] = result["wins"] / result["games"]
-        
-        return result.to_dict(orient="records") 
\ No newline at end of file
+    return result
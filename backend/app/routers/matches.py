@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exists, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.database import get_db
+from typing import Any, Dict, List, Literal, Optional
+from app.database import get_async_db, get_db
 from app import models
-from pydantic import BaseModel
+from app.analysis.archive import MatchArchive
+from app.analysis.match_store import MATCH_SLOTS
+from app.analysis.matchup_model import matchup_registry
+from app.cache import cache
+from etl.loader import MarvelRivalsLoader
+from etl.rollups import parse_timestamp
+from pydantic import BaseModel, Field, ValidationError, model_validator
 from datetime import datetime
+import base64
+import json
 
 router = APIRouter()
 
 class HeroStats(BaseModel):
     hero_id: int
     player_id: str
-    team: int
+    team: Literal[1, 2]
     kills: int
     deaths: int
     assists: int
@@ -19,10 +30,20 @@ class HeroStats(BaseModel):
 
 class MatchCreate(BaseModel):
     match_id: str
+    timestamp: Optional[datetime] = None  # defaults to the time it is stored
     duration: int
-    winner_team: int
+    winner_team: Literal[1, 2]
     map: str
-    heroes: List[HeroStats]
+    heroes: List[HeroStats] = Field(max_length=MATCH_SLOTS)
+    
+    @model_validator(mode="after")
+    def check_team_sizes(self):
+        # The analysis stores every match in MATCH_SLOTS slots, half per team
+        for team in (1, 2):
+            size = sum(hero.team == team for hero in self.heroes)
+            if size > MATCH_SLOTS // 2:
+                raise ValueError(f"Team {team} has {size} heroes, max {MATCH_SLOTS // 2}")
+        return self
 
 class MatchResponse(BaseModel):
     id: int
@@ -32,42 +53,236 @@ class MatchResponse(BaseModel):
     winner_team: int
     map: str
 
+class MatchPage(BaseModel):
+    matches: List[MatchResponse]
+    next_cursor: Optional[str] = None  # pass as cursor to get the next page
+
+class BulkMatchResult(BaseModel):
+    index: int  # Position of the match in the request
+    match_id: Optional[str] = None
+    status: str  # "created", "duplicate" or "invalid"
+    id: Optional[int] = None
+    error: Optional[Any] = None
+
+class BulkMatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    results: List[BulkMatchResult]
+
+def match_loader(db: Session, archive: bool = True) -> MarvelRivalsLoader:
+    """Loader for API writes, so they reach the cache and matchup model like ETL loads
+
+    Every archived write adds a file to its day partition, so single-match
+    writes leave archiving to the etl.rollups --export-archive job instead
+    of scattering one-match files that every archive read has to open.
+    """
+    return MarvelRivalsLoader(db, MatchArchive.from_env() if archive else None, cache, matchup_registry)
+
+def unknown_hero_errors(db: Session, matches: List[MatchCreate]) -> List[Optional[List[Dict]]]:
+    """Per match, validation errors for heroes missing from the heroes table, or None if all exist"""
+    hero_ids = {hero.hero_id for match in matches for hero in match.heroes}
+    known = {hero_id for (hero_id,) in db.query(models.Hero.id).filter(models.Hero.id.in_(hero_ids))}
+    errors = []
+    for match in matches:
+        match_errors = [
+            {"type": "unknown_hero", "loc": ["heroes", i, "hero_id"], "msg": "Unknown hero", "input": hero.hero_id}
+            for i, hero in enumerate(match.heroes) if hero.hero_id not in known
+        ]
+        errors.append(match_errors or None)
+    return errors
+
+def store_match(loader: MarvelRivalsLoader, match: MatchCreate) -> models.Match:
+    """Store one match with its heroes in a single transaction"""
+    errors = unknown_hero_errors(loader.db, [match])[0]
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    match_data = dict(match.model_dump(), timestamp=match.timestamp or datetime.utcnow())
+    try:
+        loaded = loader.load_match_batch([match_data], raise_errors=True)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Could not store match")
+    if not loaded:
+        raise HTTPException(status_code=409, detail="Match already exists")
+    return loader.db.get(models.Match, loaded[0]["id"])
+
 @router.post("/", response_model=MatchResponse)
 def create_match(match: MatchCreate, db: Session = Depends(get_db)):
-    db_match = models.Match(
-        match_id=match.match_id,
-        duration=match.duration,
-        winner_team=match.winner_team,
-        map=match.map
-    )
-    db.add(db_match)
-    db.commit()
-    db.refresh(db_match)
+    return store_match(match_loader(db, archive=False), match)
+
+MAX_BULK_MATCHES = 10_000
+MAX_BULK_BODY_BYTES = 32 * 1024 * 1024
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """Request body, rejected with 413 as soon as it grows past limit bytes"""
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail=f"Request body too large, max {limit} bytes")
     
-    for hero_stat in match.heroes:
-        db_match_hero = models.MatchHero(
-            match_id=db_match.id,
-            hero_id=hero_stat.hero_id,
-            player_id=hero_stat.player_id,
-            team=hero_stat.team,
-            kills=hero_stat.kills,
-            deaths=hero_stat.deaths,
-            assists=hero_stat.assists,
-            damage_dealt=hero_stat.damage_dealt
-        )
-        db.add(db_match_hero)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"Request body too large, max {limit} bytes")
+    return bytes(body)
+
+def parse_bulk_matches(body: bytes) -> List:
+    """Validate a JSON array or newline-delimited JSON body, one entry per match
+
+    Each entry is a MatchCreate, or the validation errors of that match.
+    """
+    if body.lstrip().startswith(b"["):
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        validate = MatchCreate.model_validate
+    else:
+        items = [line for line in body.splitlines() if line.strip()]
+        validate = MatchCreate.model_validate_json
+    
+    if len(items) > MAX_BULK_MATCHES:
+        raise HTTPException(status_code=400, detail=f"Too many matches, max {MAX_BULK_MATCHES}")
     
-    db.commit()
-    return db_match
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(validate(item))
+        except ValidationError as e:
+            parsed.append(e.errors(include_url=False, include_context=False))
+    return parsed
+
+def ingest_matches(loader: MarvelRivalsLoader, body: bytes) -> Dict:
+    """Store every valid match of a bulk request in one transaction and report per-match status
+
+    Matches that fail validation, including ones naming unknown heroes,
+    are reported as invalid and the rest are stored.
+    """
+    parsed = parse_bulk_matches(body)
+    hero_errors = iter(unknown_hero_errors(loader.db, [item for item in parsed if isinstance(item, MatchCreate)]))
+    for index, item in enumerate(parsed):
+        if isinstance(item, MatchCreate):
+            parsed[index] = next(hero_errors) or item
+    received = datetime.utcnow()
+    
+    batch = [
+        dict(item.model_dump(), timestamp=item.timestamp or received)
+        for item in parsed if isinstance(item, MatchCreate)
+    ]
+    try:
+        loaded = loader.load_match_batch(batch, raise_errors=True)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Could not store matches, none were stored")
+    row_ids = {match["match_id"]: match["id"] for match in loaded}
+    
+    # Only the first occurrence of a match_id is stored; the rest are duplicates
+    results = []
+    for index, item in enumerate(parsed):
+        if not isinstance(item, MatchCreate):
+            results.append({"index": index, "status": "invalid", "error": item})
+            continue
+        row_id = row_ids.pop(item.match_id, None)
+        results.append({
+            "index": index,
+            "match_id": item.match_id,
+            "status": "duplicate" if row_id is None else "created",
+            "id": row_id
+        })
+    
+    return {
+        "created": len(loaded),
+        "duplicates": sum(result["status"] == "duplicate" for result in results),
+        "invalid": sum(result["status"] == "invalid" for result in results),
+        "results": results
+    }
+
+@router.post("/bulk", response_model=BulkMatchResponse)
+async def create_matches_bulk(request: Request, db: Session = Depends(get_db)):
+    """Store a burst of matches sent as a JSON array or as newline-delimited JSON"""
+    body = await read_body(request, MAX_BULK_BODY_BYTES)
+    return await run_in_threadpool(ingest_matches, match_loader(db), body)
+
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a match in (timestamp, id) order"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp.isoformat(), row_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def match_page_query(limit: int, after=None, map_name: Optional[str] = None, hero_id: Optional[int] = None,
+                     player_id: Optional[str] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None):
+    """One page of matches, newest first, strictly after the (timestamp, id) key after
+
+    Seeks on ix_matches_timestamp (ix_matches_map_timestamp_id with a map
+    filter) instead of skipping rows with OFFSET, so every page costs the
+    same however deep it is. Hero and player filters probe match_heroes.
+    """
+    query = select(models.Match)
+    if after is not None:
+        query = query.where(tuple_(models.Match.timestamp, models.Match.id) < tuple_(*after))
+    if map_name is not None:
+        query = query.where(models.Match.map == map_name)
+    if start is not None:
+        query = query.where(models.Match.timestamp >= start)
+    if end is not None:
+        query = query.where(models.Match.timestamp < end)
+    if hero_id is not None:
+        query = query.where(exists().where(
+            models.MatchHero.match_id == models.Match.id,
+            models.MatchHero.hero_id == hero_id
+        ))
+    if player_id is not None:
+        query = query.where(exists().where(
+            models.MatchHero.match_id == models.Match.id,
+            models.MatchHero.player_id == player_id
+        ))
+    return query.order_by(models.Match.timestamp.desc(), models.Match.id.desc()).limit(limit)
+
+@router.get("/", response_model=MatchPage)
+async def list_matches(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    map_name: Optional[str] = Query(None, alias="map"),
+    hero_id: Optional[int] = None,
+    player_id: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Only matches at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only matches before this time"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    after = decode_cursor(cursor) if cursor is not None else None
+    start = parse_timestamp(start) if start is not None else None
+    end = parse_timestamp(end) if end is not None else None
+    
+    # One extra row tells whether there is a next page
+    matches = (await db.scalars(
+        match_page_query(limit + 1, after, map_name, hero_id, player_id, start, end)
+    )).all()
+    
+    next_cursor = None
+    if len(matches) > limit:
+        matches = matches[:limit]
+        next_cursor = encode_cursor(matches[-1].timestamp, matches[-1].id)
+    return {"matches": matches, "next_cursor": next_cursor}
+
+def recent_matches_query(limit: int):
+    # Newest first, read backwards off ix_matches_timestamp
+    return select(models.Match).order_by(models.Match.timestamp.desc()).limit(limit)
 
 @router.get("/recent", response_model=List[MatchResponse])
-def get_recent_matches(limit: int = 10, db: Session = Depends(get_db)):
-    matches = db.query(models.Match).order_by(models.Match.timestamp.desc()).limit(limit).all()
+async def get_recent_matches(limit: int = 10, db: AsyncSession = Depends(get_async_db)):
+    matches = (await db.scalars(recent_matches_query(limit))).all()
     return matches
 
 @router.get("/{match_id}", response_model=MatchResponse)
-def get_match(match_id: str, db: Session = Depends(get_db)):
-    match = db.query(models.Match).filter(models.Match.match_id == match_id).first()
+async def get_match(match_id: str, db: AsyncSession = Depends(get_async_db)):
+    match = await db.scalar(select(models.Match).where(models.Match.match_id == match_id))
     if match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return match 
\ No newline at end of file
@@ -1,12 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
-from app.database import get_db, redis_client
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Any, List, Dict, Optional
+from app.cache import async_cache
 import json
-from app import models
-from app.analysis.nash_equilibrium import TeamCompositionAnalyzer
-from app.analysis.game_tree import GameTreeAnalysis
-from pydantic import BaseModel
+from app.analysis.matchup_model import MatchupModelSnapshot, matchup_registry
+from pydantic import BaseModel, Field, model_validator
 
 router = APIRouter()
 
@@ -17,194 +16,198 @@ class TeamPredictionRequest(BaseModel):
 class TeamPredictionResponse(BaseModel):
     win_probability: float
     confidence: float
-    key_matchups: List[Dict[str, any]]
+    key_matchups: List[Dict[str, Any]]
+
+MAX_BATCH_SIZE = 100_000
+
+class BatchPredictionRequest(BaseModel):
+    matchups: List[TeamPredictionRequest] = Field(max_length=MAX_BATCH_SIZE)
+
+class BatchPredictionResult(BaseModel):
+    index: int  # Position of the matchup in the request
+    win_probability: float
+
+class BatchPredictionResponse(BaseModel):
+    model_version: int
+    results: List[BatchPredictionResult]
+
+# The counter search is exact and grows exponentially with the team size
+MAX_TEAM_SIZE = 6
+
+class RoleQuota(BaseModel):
+    min: int = Field(0, ge=0)
+    max: int = Field(MAX_TEAM_SIZE, ge=0)
+    
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.min > self.max:
+            raise ValueError(f"min ({self.min}) is greater than max ({self.max})")
+        return self
 
 class CounterTeamRequest(BaseModel):
     enemy_team: List[int]  # List of hero IDs
     available_heroes: Optional[List[int]] = None  # Optional list of available hero IDs
+    banned_heroes: Optional[List[int]] = None
+    role_quotas: Optional[Dict[str, RoleQuota]] = None  # e.g. {"Strategist": {"min": 2, "max": 2}}
+    team_size: int = Field(MAX_TEAM_SIZE, ge=1, le=MAX_TEAM_SIZE)
+    synergy_weight: float = 1.0
+    
+    @model_validator(mode="after")
+    def check_quotas(self):
+        required = sum(quota.min for quota in (self.role_quotas or {}).values())
+        if required > self.team_size:
+            raise ValueError(f"Role minimums add up to {required}, more than the team size of {self.team_size}")
+        return self
 
 class CounterTeamResponse(BaseModel):
     recommended_team: List[int]
     win_probability: float
-    hero_explanations: List[Dict[str, any]]
+    hero_explanations: List[Dict[str, Any]]
+
+def get_matchup_model() -> MatchupModelSnapshot:
+    """Current in-memory matchup model, shared by every request in this process"""
+    snapshot = matchup_registry.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Matchup model is not ready yet")
+    return snapshot
+
+# Model work is CPU-bound, so async routes run it in the threadpool to keep
+# the event loop free for other requests
 
 @router.post("/match-outcome", response_model=TeamPredictionResponse)
-def predict_match_outcome(
+async def predict_match_outcome(
     request: TeamPredictionRequest,
-    db: Session = Depends(get_db)
+    model: MatchupModelSnapshot = Depends(get_matchup_model)
 ):
     # Validate hero IDs
-    all_heroes = set(h.id for h in db.query(models.Hero).all())
     for hero_id in request.team1 + request.team2:
-        if hero_id not in all_heroes:
+        if not model.has_hero(hero_id):
             raise HTTPException(status_code=400, detail=f"Invalid hero ID: {hero_id}")
     
-    # Try to get from cache
-    cache_key = f"prediction:{','.join(map(str, sorted(request.team1)))}:{','.join(map(str, sorted(request.team2)))}"
-    cached_result = redis_client.get(cache_key)
-    
-    if cached_result:
-        return json.loads(cached_result)
-    
-    # Get all matches for analysis
-    matches = db.query(models.Match).all()
-    match_heroes = db.query(models.MatchHero).all()
-    
-    # Format match data for analysis
-    match_data = []
-    for match in matches:
-        heroes = [
-            {
-                "hero_id": mh.hero_id,
-                "team": mh.team
-            }
-            for mh in match_heroes if mh.match_id == match.id
-        ]
-        
-        match_data.append({
-            "id": match.id,
-            "winner_team": match.winner_team,
-            "heroes": heroes
-        })
-    
-    # Get hero data
-    heroes = db.query(models.Hero).all()
-    hero_pool = [{"id": h.id, "name": h.name} for h in heroes]
-    
-    # Initialize game tree analysis
-    game_tree = GameTreeAnalysis(hero_pool)
-    game_tree.initialize_matchup_matrix(match_data)
-    
+    # The model's data version is part of the name, so a rebuilt model never serves old entries
+    body = await async_cache.get_or_compute(
+        f"prediction:{model.cache_tag}:{','.join(map(str, sorted(request.team1)))}:{','.join(map(str, sorted(request.team2)))}",
+        lambda: run_in_threadpool(compute_match_outcome, model, request.team1, request.team2),
+        ttl=3600,
+        scope="predictions"
+    )
+    return Response(content=body, media_type="application/json")
+
+def compute_match_outcome(model: MatchupModelSnapshot, team1: List[int], team2: List[int]) -> Dict:
     # Predict outcome
-    win_probability = game_tree.predict_matchup(request.team1, request.team2)
-    
-    # Identify key matchups
-    key_matchups = []
-    for hero1 in request.team1:
-        for hero2 in request.team2:
-            hero1_idx = next(i for i, h in enumerate(hero_pool) if h["id"] == hero1)
-            hero2_idx = next(i for i, h in enumerate(hero_pool) if h["id"] == hero2)
-            
-            matchup_score = game_tree.matchup_matrix[hero1_idx, hero2_idx]
-            
-            if abs(matchup_score) > 0.1:  # Only include significant matchups
-                hero1_obj = next(h for h in heroes if h.id == hero1)
-                hero2_obj = next(h for h in heroes if h.id == hero2)
-                
-                key_matchups.append({
-                    "hero1": {
-                        "id": hero1,
-                        "name": hero1_obj.name
-                    },
-                    "hero2": {
-                        "id": hero2,
-                        "name": hero2_obj.name
-                    },
-                    "advantage": matchup_score,
-                    "favors": "team1" if matchup_score > 0 else "team2"
-                })
-    
-    # Sort key matchups by absolute advantage
-    key_matchups.sort(key=lambda x: abs(x["advantage"]), reverse=True)
-    
-    # Calculate confidence based on amount of data
-    relevant_matches = sum(1 for m in match_data if any(h["hero_id"] in request.team1 for h in m["heroes"]) and any(h["hero_id"] in request.team2 for h in m["heroes"]))
-    confidence = min(1.0, relevant_matches / 100)  # Scale confidence based on data volume
+    win_probability = model.game_tree.predict_matchup(team1, team2)
     
+    # Key matchups and confidence are lookups over the team1 x team2 block
     result = {
-        "win_probability": win_probability,
-        "confidence": confidence,
-        "key_matchups": key_matchups[:5]  # Return top 5 matchups
+        "win_probability": float(win_probability),
+        "confidence": model.confidence(team1, team2),
+        "key_matchups": model.key_matchups(team1, team2, limit=5)  # Return top 5 matchups
     }
     
-    # Cache the result
-    redis_client.setex(cache_key, 3600, json.dumps(result))  # Cache for 1 hour
-    
     return result
 
+STREAM_CHUNK_SIZE = 4096
+
+def validate_matchups(model: MatchupModelSnapshot, matchups: List[TeamPredictionRequest]):
+    """Reject the batch on the first unknown hero ID"""
+    for i, matchup in enumerate(matchups):
+        for hero_id in matchup.team1 + matchup.team2:
+            if not model.has_hero(hero_id):
+                raise HTTPException(status_code=400, detail=f"Invalid hero ID in matchup {i}: {hero_id}")
+
+def score_batch(model: MatchupModelSnapshot, team1s: List[List[int]], team2s: List[List[int]]) -> bytes:
+    """Score every matchup and serialize the BatchPredictionResponse body"""
+    probabilities = model.game_tree.predict_matchups(team1s, team2s)
+    return json.dumps({
+        "model_version": model.version,
+        "results": [
+            {"index": i, "win_probability": float(p)}
+            for i, p in enumerate(probabilities)
+        ]
+    }).encode()
+
+@router.post("/match-outcome/batch", response_model=BatchPredictionResponse)
+async def predict_match_outcomes(
+    request: BatchPredictionRequest,
+    stream: bool = Query(False, description="Stream results as newline-delimited JSON"),
+    model: MatchupModelSnapshot = Depends(get_matchup_model)
+):
+    matchups = request.matchups
+    
+    # Validate hero IDs, reporting the first offending matchup
+    await run_in_threadpool(validate_matchups, model, matchups)
+    
+    team1s = [matchup.team1 for matchup in matchups]
+    team2s = [matchup.team2 for matchup in matchups]
+    
+    if not stream:
+        body = await run_in_threadpool(score_batch, model, team1s, team2s)
+        return Response(content=body, media_type="application/json")
+    
+    def generate():
+        # Score and emit one chunk at a time so large batches start flowing immediately
+        for lo in range(0, len(matchups), STREAM_CHUNK_SIZE):
+            hi = lo + STREAM_CHUNK_SIZE
+            probabilities = model.game_tree.predict_matchups(team1s[lo:hi], team2s[lo:hi])
+            yield "".join(
+                json.dumps({"index": lo + i, "win_probability": float(p)}) + "\n"
+                for i, p in enumerate(probabilities)
+            )
+    
+    # A sync generator, which StreamingResponse iterates in the threadpool
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Model-Version": str(model.version)}
+    )
+
 @router.post("/counter-team", response_model=CounterTeamResponse)
-def recommend_counter_team(
+async def recommend_counter_team(
     request: CounterTeamRequest,
-    db: Session = Depends(get_db)
+    model: MatchupModelSnapshot = Depends(get_matchup_model)
 ):
     # Validate hero IDs
-    all_heroes = db.query(models.Hero).all()
-    hero_id_set = set(h.id for h in all_heroes)
-    
     for hero_id in request.enemy_team:
-        if hero_id not in hero_id_set:
+        if not model.has_hero(hero_id):
             raise HTTPException(status_code=400, detail=f"Invalid hero ID: {hero_id}")
     
     # Set available heroes if not provided
-    available_heroes = request.available_heroes or list(hero_id_set)
-    
-    # Get all matches for analysis
-    matches = db.query(models.Match).all()
-    match_heroes = db.query(models.MatchHero).all()
-    
-    # Format match data for analysis
-    match_data = []
-    for match in matches:
-        heroes = [
-            {
-                "hero_id": mh.hero_id,
-                "team": mh.team
-            }
-            for mh in match_heroes if mh.match_id == match.id
-        ]
-        
-        match_data.append({
-            "id": match.id,
-            "winner_team": match.winner_team,
-            "heroes": heroes
-        })
-    
-    # Get hero data
-    hero_pool = [{"id": h.id, "name": h.name} for h in all_heroes]
+    available_heroes = request.available_heroes or list(model.hero_names)
+    for hero_id in available_heroes:
+        if not model.has_hero(hero_id):
+            raise HTTPException(status_code=400, detail=f"Invalid hero ID: {hero_id}")
     
-    # Initialize game tree analysis
-    game_tree = GameTreeAnalysis(hero_pool)
-    game_tree.initialize_matchup_matrix(match_data)
+    return await run_in_threadpool(compute_counter_team, model, request, available_heroes)
+
+def compute_counter_team(model: MatchupModelSnapshot, request: CounterTeamRequest,
+                         available_heroes: List[int]) -> Dict:
+    game_tree = model.game_tree
     
     # Find optimal counter team
-    recommended_team = game_tree.find_optimal_counter(request.enemy_team, available_heroes)
+    role_quotas = {
+        role: (quota.min, quota.max)
+        for role, quota in (request.role_quotas or {}).items()
+    }
+    try:
+        recommended_team = game_tree.find_optimal_counter(
+            request.enemy_team,
+            available_heroes,
+            banned_heroes=request.banned_heroes,
+            role_quotas=role_quotas,
+            team_size=request.team_size,
+            synergy_weight=request.synergy_weight
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Predict win probability
     win_probability = game_tree.predict_matchup(recommended_team, request.enemy_team)
     
-    # Generate explanations
-    hero_explanations = []
-    for hero_id in recommended_team:
-        hero = next(h for h in all_heroes if h.id == hero_id)
-        
-        # Find which enemy heroes this hero counters
-        countered_heroes = []
-        for enemy_id in request.enemy_team:
-            hero_idx = next(i for i, h in enumerate(hero_pool) if h["id"] == hero_id)
-            enemy_idx = next(i for i, h in enumerate(hero_pool) if h["id"] == enemy_id)
-            
-            matchup_score = game_tree.matchup_matrix[hero_idx, enemy_idx]
-            
-            if matchup_score > 0.1:  # Significant advantage
-                enemy_hero = next(h for h in all_heroes if h.id == enemy_id)
-                countered_heroes.append({
-                    "id": enemy_id,
-                    "name": enemy_hero.name,
-                    "advantage": matchup_score
-                })
-        
-        hero_explanations.append({
-            "id": hero_id,
-            "name": hero.name,
-            "counters": countered_heroes,
-            "overall_value": sum(c["advantage"] for c in countered_heroes)
-        })
-    
-    # Sort explanations by overall value
-    hero_explanations.sort(key=lambda x: x["overall_value"], reverse=True)
+    # Which enemy heroes each recommended hero counters, most valuable first
+    hero_explanations = model.counter_explanations(recommended_team, request.enemy_team)
     
     return {
         "recommended_team": recommended_team,
-        "win_probability": win_probability,
+        "win_probability": float(win_probability),
         "hero_explanations": hero_explanations
     } 
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Benchmark the vectorized matchup-matrix builder against the original loops.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_matchup_matrix --matches 1000000
+
+The nested-loop builder is far too slow to run on the full synthetic set, so
+it is timed on a sample of --loop-matches matches and extrapolated linearly
+(its cost is linear in the number of matches).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.analysis.matchup_matrix import (
+    build_hero_lookup,
+    build_win_counts,
+    map_hero_ids,
+    normalize_win_counts,
+)
+
+TEAM_SIZE = 6
+
+def synthetic_columns(n_matches: int, n_heroes: int, seed: int = 0):
+    """Columnar 6v6 matches with distinct heroes per match"""
+    rng = np.random.default_rng(seed)
+    hero_ids = np.arange(1, n_heroes + 1) * 3  # non-contiguous ids
+    picks = np.argsort(rng.random((n_matches, n_heroes)), axis=1)[:, :2 * TEAM_SIZE]
+
+    match_idx = np.repeat(np.arange(n_matches), 2 * TEAM_SIZE)
+    hero_id = hero_ids[picks].ravel()
+    team = np.tile(np.repeat([1, 2], TEAM_SIZE), n_matches)
+    winner_team = rng.integers(1, 3, size=n_matches)
+    return hero_ids, match_idx, hero_id, team, winner_team
+
+def loop_builder(hero_ids, match_data):
+    """The original GameTreeAnalysis.initialize_matchup_matrix"""
+    hero_ids = list(hero_ids)
+    n = len(hero_ids)
+    matrix = np.zeros((n, n), dtype=np.float32)
+    for match in match_data:
+        winner_team = match["winner_team"]
+        for hero1 in match["heroes"]:
+            if hero1["team"] == winner_team:
+                for hero2 in match["heroes"]:
+                    if hero2["team"] != winner_team:
+                        idx1 = hero_ids.index(hero1["hero_id"])
+                        idx2 = hero_ids.index(hero2["hero_id"])
+                        matrix[idx1, idx2] += 1
+                        matrix[idx2, idx1] -= 1
+    row_sums = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, row_sums, out=np.zeros_like(matrix), where=row_sums != 0)
+
+def to_match_data(match_idx, hero_id, team, winner_team, n_matches):
+    per_match = 2 * TEAM_SIZE
+    return [
+        {
+            "winner_team": int(winner_team[m]),
+            "heroes": [
+                {"hero_id": int(hero_id[k]), "team": int(team[k])}
+                for k in range(m * per_match, (m + 1) * per_match)
+            ]
+        }
+        for m in range(n_matches)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, default=1_000_000)
+    parser.add_argument("--heroes", type=int, default=40)
+    parser.add_argument("--loop-matches", type=int, default=20_000)
+    args = parser.parse_args()
+
+    hero_ids, match_idx, hero_id, team, winner_team = synthetic_columns(args.matches, args.heroes)
+
+    start = time.perf_counter()
+    lookup = build_hero_lookup(hero_ids)
+    hero_idx = map_hero_ids(lookup, hero_id)
+    counts = build_win_counts(match_idx, hero_idx, team, winner_team, len(hero_ids))
+    vectorized = normalize_win_counts(counts)
+    vectorized_seconds = time.perf_counter() - start
+
+    sample = min(args.loop_matches, args.matches)
+    sample_rows = sample * 2 * TEAM_SIZE
+    match_data = to_match_data(match_idx, hero_id, team, winner_team, sample)
+
+    start = time.perf_counter()
+    looped = loop_builder(hero_ids, match_data)
+    loop_seconds = (time.perf_counter() - start) * args.matches / sample
+
+    sample_counts = build_win_counts(match_idx[:sample_rows], map_hero_ids(lookup, hero_id[:sample_rows]),
+                                     team[:sample_rows], winner_team[:sample], len(hero_ids))
+    assert np.allclose(normalize_win_counts(sample_counts), looped, atol=1e-6)
+
+    print(f"matches:           {args.matches:,} ({args.heroes} heroes, {TEAM_SIZE}v{TEAM_SIZE})")
+    print(f"vectorized build:  {vectorized_seconds:.3f}s")
+    print(f"nested loops:      {loop_seconds:.1f}s (extrapolated from {sample:,} matches)")
+    print(f"speedup:           {loop_seconds / vectorized_seconds:.0f}x")
+    print(f"matrix checksum:   {float(np.abs(vectorized).sum()):.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.analysis.match_history import load_match_store
+from app.analysis.nash_equilibrium import TeamCompositionAnalyzer
+from app.cache import cache
+from app.database import SessionLocal
+from etl.loader import MarvelRivalsLoader
+
+logger = logging.getLogger(__name__)
+
+def stored_equilibrium(db: Session, analyzer: TeamCompositionAnalyzer) -> Dict[int, float]:
+    """Stored nash_equilibrium_value per composition ID of the analyzer's payoff matrix
+
+    Compositions that are not in the matrix are left out; the solver
+    renormalizes what remains over the current compositions.
+    """
+    rows = db.query(models.TeamComposition.composition_key, models.TeamComposition.nash_equilibrium_value) \
+        .filter(models.TeamComposition.nash_equilibrium_value.isnot(None))
+    warm_start = {}
+    for key, value in rows:
+        comp_id = analyzer.interner.get(int(hero_id) for hero_id in key.split(",") if hero_id)
+        if comp_id is not None and comp_id in analyzer.composition_rows:
+            warm_start[comp_id] = value
+    return warm_start
+
+def solve_composition_equilibrium(db: Session, method: str = "oracle", min_games: int = 1,
+                                  time_budget: Optional[float] = None) -> Optional[TeamCompositionAnalyzer]:
+    """Nash equilibrium of the composition game over the stored match history
+
+    The iterative solvers start from the equilibrium stored by the previous run.
+    Returns the analyzer holding the equilibrium, or None if the solver found none.
+    """
+    store = load_match_store(db)
+
+    analyzer = TeamCompositionAnalyzer(hero_pool=[], min_games=min_games)
+    analyzer.build_payoff_matrix(store)
+    warm_start = stored_equilibrium(db, analyzer) if method != "lp" else None
+    if analyzer.find_nash_equilibrium(method=method, warm_start=warm_start, time_budget=time_budget) is None:
+        return None
+    return analyzer
+
+def update_equilibrium_values(loader: MarvelRivalsLoader, method: str = "oracle", min_games: int = 1,
+                              time_budget: Optional[float] = None) -> Optional[int]:
+    """Solve the composition equilibrium and store it on the team_compositions rows
+
+    Compositions outside the equilibrium (e.g. under min_games) are reset to
+    NULL. Returns the number of compositions given a value, or None if the
+    solver failed, in which case the stored values are left as they are.
+    """
+    analyzer = solve_composition_equilibrium(loader.db, method, min_games, time_budget)
+    if analyzer is None:
+        loader.db.rollback()
+        logger.warning(f"No Nash equilibrium found with method {method}, stored values left unchanged")
+        return None
+
+    if not analyzer.converged:
+        logger.warning(f"Composition equilibrium did not reach the tolerance in {analyzer.iterations} iterations, "
+                       f"storing it with exploitability {analyzer.exploitability:.4f}")
+    else:
+        logger.info(f"Solved composition equilibrium in {analyzer.iterations} iterations, "
+                    f"exploitability {analyzer.exploitability:.4f}")
+    return loader.update_nash_equilibrium_values(analyzer.equilibrium_values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the team composition Nash equilibrium and store it")
+    parser.add_argument("--method", choices=["oracle", "mwu", "lp"], default="oracle",
+                        help="oracle solves exactly over the compositions in play, mwu approximates very large "
+                             "games, lp solves the whole game at once")
+    parser.add_argument("--min-games", type=int, default=1, help="Leave out compositions with fewer games")
+    parser.add_argument("--time-budget", type=float, default=300.0, help="Seconds the oracle or mwu solver may run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        loader = MarvelRivalsLoader(db, cache=cache)
+        updated = update_equilibrium_values(loader, args.method, args.min_games, args.time_budget)
+        if updated is not None:
+            logger.info(f"Stored Nash equilibrium values for {updated} compositions")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,157 @@
 import requests
-import json
 import logging
-from typing import List, Dict, Optional
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class MarvelRivalsExtractor:
-    def __init__(self, api_key: str, base_url: str):
+    def __init__(self, api_key: str, base_url: str, max_workers: int = 4,
+                 page_size: int = 1000, max_retries: int = 5, backoff_base: float = 0.5,
+                 timeout: float = 30.0):
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-    
-    def extract_recent_matches(self, hours: int = 24) -> List[Dict]:
-        """Extract match data from the last N hours"""
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.failed_slices: List[Tuple[datetime, datetime]] = []
+
+        # One pooled session shared by all worker threads
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, endpoint: str, params: Optional[Dict] = None) -> Dict:
+        """GET with retries: honours Retry-After on 429 and backs off exponentially on 5xx"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(endpoint, params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+
+            if retry_after is not None and retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = self.backoff_base * 2 ** attempt * (1 + random.random())
+            logger.warning(f"Retrying {endpoint} in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+
+    def _fetch_slice(self, start_time: datetime, end_time: datetime) -> Tuple[List[Dict], List[Tuple[datetime, datetime]]]:
+        """Fetch every match in [start_time, end_time)
+
+        Follows next_cursor when the API returns one. A full page without a
+        cursor means the slice holds more matches than one page, so the slice
+        is handed back split in two instead. A slice of a second or less
+        cannot be split; its page is kept and the slice recorded in
+        failed_slices.
+        """
         endpoint = f"{self.base_url}/matches"
-        
-        # Calculate time range
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=hours)
-        
         params = {
             "start_time": start_time.isoformat(),
             "end_time": end_time.isoformat(),
-            "limit": 1000  # Adjust based on API limitations
+            "limit": self.page_size
         }
-        
-        try:
-            response = requests.get(endpoint, headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json()["matches"]
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error extracting match data: {e}")
-            return []
-    
+
+        matches = []
+        while True:
+            page = self._get(endpoint, params)
+            matches.extend(page["matches"])
+
+            cursor = page.get("next_cursor")
+            if cursor:
+                params = dict(params, cursor=cursor)
+                continue
+
+            if len(page["matches"]) >= self.page_size:
+                if end_time - start_time > timedelta(seconds=1):
+                    middle = start_time + (end_time - start_time) / 2
+                    return [], [(start_time, middle), (middle, end_time)]
+                # Too small to split further: keep the page, but flag the slice for a retry
+                logger.warning(
+                    f"Slice {start_time} - {end_time} still returns a full page of {self.page_size} matches "
+                    f"without a cursor; some of its matches may be missing"
+                )
+                self.failed_slices.append((start_time, end_time))
+            return matches, []
+
+    def iter_recent_matches(self, hours: int = 24, slice_minutes: int = 60) -> Iterator[Dict]:
+        """Stream match data from the last N hours
+
+        The window is cut into slice_minutes slices that are fetched
+        concurrently by at most max_workers threads; matches are yielded as
+        each slice completes, so order is not guaranteed.
+        """
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+
+        pending = deque()
+        slice_start = start_time
+        while slice_start < end_time:
+            slice_end = min(slice_start + timedelta(minutes=slice_minutes), end_time)
+            pending.append((slice_start, slice_end))
+            slice_start = slice_end
+
+        self.failed_slices = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+            while pending or in_flight:
+                while pending and len(in_flight) < self.max_workers:
+                    time_slice = pending.popleft()
+                    in_flight[executor.submit(self._fetch_slice, *time_slice)] = time_slice
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    time_slice = in_flight.pop(future)
+                    try:
+                        matches, splits = future.result()
+                    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                        logger.error(f"Error extracting match data for {time_slice[0]} - {time_slice[1]}: {e}")
+                        self.failed_slices.append(time_slice)
+                        continue
+                    pending.extend(splits)
+                    yield from matches
+
+    def extract_recent_matches(self, hours: int = 24) -> List[Dict]:
+        """Extract match data from the last N hours"""
+        return list(self.iter_recent_matches(hours))
+
     def extract_hero_data(self) -> List[Dict]:
         """Extract hero metadata"""
         endpoint = f"{self.base_url}/heroes"
-        
+
         try:
-            response = requests.get(endpoint, headers=self.headers)
-            response.raise_for_status()
-            return response.json()["heroes"]
+            return self._get(endpoint)["heroes"]
         except requests.exceptions.RequestException as e:
             logger.error(f"Error extracting hero data: {e}")
             return []
-    
+
     def extract_player_stats(self, player_id: str) -> Optional[Dict]:
         """Extract stats for a specific player"""
         endpoint = f"{self.base_url}/players/{player_id}"
-        
+
         try:
-            response = requests.get(endpoint, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            return self._get(endpoint)
         except requests.exceptions.RequestException as e:
             logger.error(f"Error extracting player stats: {e}")
-            return None 
\ No newline at end of file
+            return None
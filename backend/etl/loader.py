@@ -1,108 +1,169 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional
 import logging
 from app import models
+from app.analysis.archive import MatchArchive
+from app.analysis.matchup_model import MatchupModelRegistry
+from app.cache import VersionedCache
+from app.database import dialect_insert
+from etl.rollups import fold_match_aggregates, lock_aggregates, match_date, parse_timestamp, upsert_hero_daily_stats
 
 logger = logging.getLogger(__name__)
 
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 class MarvelRivalsLoader:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, archive: Optional[MatchArchive] = None,
+                 cache: Optional[VersionedCache] = None, matchup_model: Optional[MatchupModelRegistry] = None):
         self.db = db_session
+        self.archive = archive
+        self.cache = cache
+        self.matchup_model = matchup_model
+        self.failed_matches: List[str] = []  # match_ids dropped because the database rejected them
     
-    def load_matches(self, transformed_matches: List[Dict]) -> int:
-        """Load transformed match data into the database"""
+    def load_matches(self, transformed_matches: Iterable[Dict], chunk_size: int = 1000) -> int:
+        """Bulk-load transformed match data in chunks of chunk_size, one transaction each"""
         matches_loaded = 0
         
-        for match_data in transformed_matches:
-            try:
-                # Check if match already exists
-                existing_match = self.db.query(models.Match).filter_by(
-                    match_id=match_data["match_id"]
-                ).first()
-                
-                if existing_match:
-                    logger.info(f"Match {match_data['match_id']} already exists, skipping")
-                    continue
-                
-                # Create new match
-                new_match = models.Match(
-                    match_id=match_data["match_id"],
-                    timestamp=match_data["timestamp"],
-                    duration=match_data["duration"],
-                    winner_team=match_data["winner_team"],
-                    map=match_data["map"]
-                )
-                
-                self.db.add(new_match)
-                self.db.flush()  # Get the ID without committing
-                
-                # Add hero data
-                for hero_data in match_data["heroes"]:
-                    match_hero = models.MatchHero(
-                        match_id=new_match.id,
-                        hero_id=hero_data["hero_id"],
-                        player_id=hero_data["player_id"],
-                        team=hero_data["team"],
-                        kills=hero_data["kills"],
-                        deaths=hero_data["deaths"],
-                        assists=hero_data["assists"],
-                        damage_dealt=hero_data["damage_dealt"]
-                    )
-                    self.db.add(match_hero)
-                
-                matches_loaded += 1
-            except Exception as e:
-                logger.error(f"Error loading match {match_data.get('match_id', 'unknown')}: {e}")
-                self.db.rollback()
-                continue
+        for chunk in chunked(transformed_matches, chunk_size):
+            matches_loaded += len(self.load_match_batch(chunk))
         
-        self.db.commit()
         return matches_loaded
     
-    def update_hero_stats(self, hero_stats: Dict[int, Dict]) -> int:
-        """Update hero statistics in the database"""
-        heroes_updated = 0
+    def load_match_batch(self, batch: List[Dict], raise_errors: bool = False) -> List[Dict]:
+        """Load one batch of matches in a single transaction; returns the new ones, each with its row id"""
+        try:
+            loaded = self._load_match_chunk(batch)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            # API writes report the error to the client instead
+            if raise_errors:
+                logger.error(f"Error loading chunk of {len(batch)} matches: {e}")
+                raise
+            # Retry in halves so only the matches that fail on their own are dropped
+            if len(batch) == 1:
+                match_id = batch[0].get("match_id", "unknown")
+                logger.error(f"Error loading match {match_id}, dropping it: {e}")
+                self.failed_matches.append(match_id)
+                return []
+            logger.warning(f"Error loading chunk of {len(batch)} matches, retrying in halves: {e}")
+            middle = len(batch) // 2
+            return self.load_match_batch(batch[:middle]) + self.load_match_batch(batch[middle:])
+        
+        # Cached analytics built on the old data become unreachable
+        if self.cache is not None and loaded:
+            self.cache.bump_version()
+        
+        # Fold the new matches into this process's matchup model without a
+        # rebuild; other processes only see them on their registry's next poll
+        if self.matchup_model is not None and loaded:
+            self.matchup_model.apply_matches(loaded)
         
-        for hero_id, stats in hero_stats.items():
+        # Archive only after commit; the database remains the source of truth
+        if self.archive is not None and loaded:
             try:
-                hero = self.db.query(models.Hero).filter_by(id=hero_id).first()
-                
-                if not hero:
-                    logger.warning(f"Hero with ID {hero_id} not found, skipping stats update")
-                    continue
-                
-                hero.win_rate = stats["win_rate"]
-                hero.pick_rate = stats["games_played"] / 100  # Normalize based on total matches
-                
-                heroes_updated += 1
+                self.archive.write_matches(loaded, lambda match: match_date(match["timestamp"]))
             except Exception as e:
-                logger.error(f"Error updating stats for hero {hero_id}: {e}")
+                logger.error(f"Error archiving chunk of {len(loaded)} matches: {e}")
+        return loaded
+    
+    def _load_match_chunk(self, chunk: List[Dict]) -> List[Dict]:
+        """Insert one chunk of matches, returning the matches that were actually new"""
+        # Build rows up front so malformed matches are skipped individually
+        candidates = {}
+        for match_data in chunk:
+            try:
+                match_row = {
+                    "match_id": match_data["match_id"],
+                    "timestamp": parse_timestamp(match_data["timestamp"]),
+                    "duration": match_data["duration"],
+                    "winner_team": match_data["winner_team"],
+                    "map": match_data["map"]
+                }
+                hero_rows = [
+                    {
+                        "hero_id": hero_data["hero_id"],
+                        "player_id": hero_data["player_id"],
+                        "team": hero_data["team"],
+                        "kills": hero_data["kills"],
+                        "deaths": hero_data["deaths"],
+                        "assists": hero_data["assists"],
+                        "damage_dealt": hero_data["damage_dealt"]
+                    }
+                    for hero_data in match_data["heroes"]
+                ]
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Error loading match {match_data.get('match_id', 'unknown')}: {e}")
                 continue
+            candidates.setdefault(match_row["match_id"], (match_data, match_row, hero_rows))
         
-        self.db.commit()
-        return heroes_updated
-    
-    def load_team_compositions(self, team_comps: List[Dict]) -> int:
-        """Load team composition data into the database"""
-        comps_loaded = 0
+        if not candidates:
+            return []
         
-        # Clear existing compositions
-        self.db.query(models.TeamComposition).delete()
+        # Dedupe against the database in one set-based query
+        existing = {
+            match_id for (match_id,) in self.db.query(models.Match.match_id).filter(
+                models.Match.match_id.in_(list(candidates))
+            )
+        }
+        if existing:
+            logger.info(f"Skipping {len(existing)} matches that already exist")
+        # Sorted so concurrent loaders wait on each other's match_id conflicts in one order
+        new = [candidate for match_id, candidate in sorted(candidates.items()) if match_id not in existing]
+        if not new:
+            return []
         
-        for comp_data in team_comps:
-            try:
-                new_comp = models.TeamComposition(
-                    heroes=comp_data["heroes"],
-                    win_count=comp_data["wins"],
-                    loss_count=comp_data["losses"],
-                    win_rate=comp_data["win_rate"]
-                )
-                
-                self.db.add(new_comp)
-                comps_loaded += 1
-            except Exception as e:
-                logger.error(f"Error loading team composition: {e}")
+        # ON CONFLICT covers matches inserted concurrently since the lookup
+        insert = dialect_insert(self.db)
+        stmt = insert(models.Match).values([match_row for _, match_row, _ in new])
+        stmt = stmt.on_conflict_do_nothing(index_elements=["match_id"]).returning(
+            models.Match.id, models.Match.match_id
+        )
+        inserted = {match_id: row_id for row_id, match_id in self.db.execute(stmt).all()}
+        
+        loaded = []
+        match_hero_rows = []
+        for match_data, match_row, hero_rows in new:
+            row_id = inserted.get(match_row["match_id"])
+            if row_id is None:
                 continue
+            loaded.append(dict(match_data, id=row_id))
+            match_hero_rows.extend(dict(hero_row, match_id=row_id) for hero_row in hero_rows)
+        
+        if match_hero_rows:
+            self.db.execute(models.MatchHero.__table__.insert(), match_hero_rows)
+        
+        # Keep the running aggregates and daily rollup in step with the newly
+        # loaded matches; folding first takes the aggregate lock for both
+        fold_match_aggregates(self.db, loaded)
+        upsert_hero_daily_stats(self.db, loaded)
+        return loaded
+    
+    def update_nash_equilibrium_values(self, equilibrium_values: Dict[str, float]) -> int:
+        """Store equilibrium probabilities by composition key in one bulk UPDATE, NULL for missing ones"""
+        lock_aggregates(self.db)
+        rows = self.db.query(models.TeamComposition.id, models.TeamComposition.composition_key).all()
+        mappings = [
+            {
+                "id": row.id,
+                "nash_equilibrium_value": equilibrium_values.get(row.composition_key)
+            }
+            for row in rows
+        ]
         
+        if mappings:
+            self.db.execute(update(models.TeamComposition), mappings)
         self.db.commit()
-        return comps_loaded 
\ No newline at end of file
+        if self.cache is not None:
+            self.cache.bump_version()
+        return sum(1 for m in mappings if m["nash_equilibrium_value"] is not None)
@@ -0,0 +1,328 @@
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, bindparam, case, cast, func, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.analysis.archive import MatchArchive
+from app.analysis.match_history import iter_matches
+from app.cache import cache
+from app.database import SessionLocal, dialect_insert, disable_statement_timeout
+from etl.transformer import MarvelRivalsTransformer
+
+logger = logging.getLogger(__name__)
+
+def parse_timestamp(timestamp) -> datetime:
+    """Match timestamp as a naive UTC datetime, accepting ISO strings with a trailing Z"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def match_date(timestamp) -> date:
+    """Calendar day of a match timestamp given as a datetime or ISO string"""
+    return parse_timestamp(timestamp).date()
+
+def in_lock_order(rows: Dict) -> List[Tuple]:
+    """(conflict key, row) pairs sorted by key"""
+    # Concurrent writers that upsert rows in the same order lock them in the
+    # same order too, so they queue instead of deadlocking
+    return sorted(rows.items())
+
+def daily_hero_counts(matches: List[Dict]) -> Dict[Tuple[date, int], Dict[str, int]]:
+    """Games and wins per (day, hero) for a batch of transformed matches"""
+    counts = defaultdict(lambda: {"games": 0, "wins": 0})
+    for match in matches:
+        day = match_date(match["timestamp"])
+        for hero in match["heroes"]:
+            entry = counts[(day, hero["hero_id"])]
+            entry["games"] += 1
+            if hero["team"] == match["winner_team"]:
+                entry["wins"] += 1
+    return counts
+
+def upsert_hero_daily_stats(db: Session, matches: List[Dict]) -> int:
+    """Fold newly loaded matches into hero_daily_stats
+
+    Adds to existing (date, hero_id) rows with ON CONFLICT DO UPDATE, so the
+    cost is proportional to the batch, not to the history. Does not commit.
+    """
+    counts = daily_hero_counts(matches)
+    if not counts:
+        return 0
+
+    insert = dialect_insert(db)
+    stmt = insert(models.HeroDailyStats).values([
+        {"date": day, "hero_id": hero_id, "games": c["games"], "wins": c["wins"]}
+        for (day, hero_id), c in in_lock_order(counts)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date", "hero_id"],
+        set_={
+            "games": models.HeroDailyStats.games + stmt.excluded.games,
+            "wins": models.HeroDailyStats.wins + stmt.excluded.wins
+        }
+    )
+    db.execute(stmt)
+    return len(counts)
+
+def daily_hero_counts_query(db: Session, start: Optional[date] = None, end: Optional[date] = None):
+    """Games and wins per (day, hero) straight from the raw match tables"""
+    day = func.date(models.Match.timestamp)
+    won = case((models.MatchHero.team == models.Match.winner_team, 1), else_=0)
+    source = db.query(
+        day.label("date"),
+        models.MatchHero.hero_id,
+        func.count(models.MatchHero.id).label("games"),
+        func.sum(won).label("wins")
+    ).join(
+        models.MatchHero,
+        models.Match.id == models.MatchHero.match_id
+    )
+    if start is not None:
+        source = source.filter(models.Match.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        source = source.filter(models.Match.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return source.group_by(day, models.MatchHero.hero_id)
+
+def recompute_hero_daily_stats(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Rebuild hero_daily_stats for the days in [start, end] from the raw match tables
+
+    Either bound may be omitted to cover the whole history. Takes the
+    aggregate lock (see add_match_count) so it cannot interleave with
+    loaders upserting the same rows. Commits.
+    """
+    disable_statement_timeout(db)
+    lock_aggregates(db)
+    rollups = db.query(models.HeroDailyStats)
+    if start is not None:
+        rollups = rollups.filter(models.HeroDailyStats.date >= start)
+    if end is not None:
+        rollups = rollups.filter(models.HeroDailyStats.date <= end)
+    rollups.delete(synchronize_session=False)
+
+    source = daily_hero_counts_query(db, start, end)
+    result = db.execute(
+        models.HeroDailyStats.__table__.insert().from_select(
+            ["date", "hero_id", "games", "wins"],
+            source.statement
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+# Running hero and composition aggregates
+
+MATCH_COUNTER = "matches"
+
+HERO_COUNTERS = ("games_played", "wins", "losses", "kills", "deaths", "assists", "damage_dealt")
+
+def upsert_hero_aggregates(db: Session, hero_stats: Dict[int, Dict]) -> int:
+    """Add per-hero counter deltas to the running totals on heroes
+
+    hero_stats is keyed by hero ID with the counters produced by
+    MarvelRivalsTransformer.accumulate. Win rate is rederived from the new
+    totals in the same UPDATE. Unknown heroes are skipped. Does not commit.
+    """
+    if not hero_stats:
+        return 0
+
+    known = {
+        hero_id for (hero_id,) in db.query(models.Hero.id).filter(models.Hero.id.in_(list(hero_stats)))
+    }
+    missing = set(hero_stats) - known
+    if missing:
+        logger.warning(f"Heroes {sorted(missing)} not found, skipping their aggregates")
+    if not known:
+        return 0
+
+    heroes = models.Hero.__table__
+    games_played = heroes.c.games_played + bindparam("d_games_played")
+    values = {column: heroes.c[column] + bindparam(f"d_{column}") for column in HERO_COUNTERS}
+    values["win_rate"] = cast(heroes.c.wins + bindparam("d_wins"), Float) / func.nullif(games_played, 0)
+    stmt = update(heroes).where(heroes.c.id == bindparam("hero_id")).values(values)
+    db.execute(stmt, [
+        dict({f"d_{column}": stats[column] for column in HERO_COUNTERS}, hero_id=hero_id)
+        for hero_id, stats in in_lock_order({hero_id: hero_stats[hero_id] for hero_id in known})
+    ])
+    return len(known)
+
+def upsert_composition_aggregates(db: Session, team_comps: Dict[str, Dict]) -> int:
+    """Add per-composition win/loss deltas to team_compositions
+
+    team_comps is keyed by composition key, as produced by
+    MarvelRivalsTransformer.accumulate. New compositions are inserted and
+    existing ones incremented with ON CONFLICT DO UPDATE. Does not commit.
+    """
+    if not team_comps:
+        return 0
+
+    comps = models.TeamComposition
+    insert = dialect_insert(db)
+    stmt = insert(comps).values([
+        {
+            "composition_key": key,
+            "heroes": c["heroes"],
+            "win_count": c["wins"],
+            "loss_count": c["losses"],
+            "win_rate": c["wins"] / max(1, c["wins"] + c["losses"])
+        }
+        for key, c in in_lock_order(team_comps)
+    ])
+    win_count = comps.win_count + stmt.excluded.win_count
+    loss_count = comps.loss_count + stmt.excluded.loss_count
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["composition_key"],
+        set_={
+            "win_count": win_count,
+            "loss_count": loss_count,
+            "win_rate": cast(win_count, Float) / func.nullif(win_count + loss_count, 0)
+        }
+    )
+    db.execute(stmt)
+    return len(team_comps)
+
+def add_match_count(db: Session, matches: int) -> int:
+    """Add to the running match total, returning the new total
+
+    The upsert also locks the counter row until commit, which makes it the
+    aggregate lock: every writer takes it before touching hero, composition
+    or daily rows, so concurrent loaders queue on it instead of locking
+    hero rows in conflicting orders. Does not commit.
+    """
+    insert = dialect_insert(db)
+    stmt = insert(models.AggregateCounter).values(name=MATCH_COUNTER, value=matches)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"value": models.AggregateCounter.value + stmt.excluded.value}
+    ))
+    return db.query(models.AggregateCounter.value).filter_by(name=MATCH_COUNTER).scalar() or 0
+
+def lock_aggregates(db: Session) -> int:
+    """Take the aggregate lock without counting any matches. Does not commit"""
+    return add_match_count(db, 0)
+
+def update_pick_rates(db: Session, total: int):
+    """Rederive every hero's pick rate, the share of the total matches it appeared in"""
+    if total > 0:
+        db.query(models.Hero).update(
+            {models.Hero.pick_rate: cast(models.Hero.games_played, Float) / total},
+            synchronize_session=False
+        )
+
+def fold_match_aggregates(db: Session, matches: List[Dict]) -> int:
+    """Fold a batch of newly loaded matches into every running aggregate
+
+    Costs O(batch) plus one pick-rate UPDATE over the heroes table, never
+    O(history). Takes the aggregate lock first (see add_match_count). Does
+    not commit, so callers can keep it in the same transaction as the
+    match insert.
+    """
+    if not matches:
+        return 0
+
+    hero_stats, team_comps = {}, {}
+    MarvelRivalsTransformer().accumulate(matches, hero_stats, team_comps)
+    total = add_match_count(db, len(matches))
+    upsert_hero_aggregates(db, hero_stats)
+    upsert_composition_aggregates(db, team_comps)
+    update_pick_rates(db, total)
+    return len(matches)
+
+def rebuild_match_aggregates(db: Session, batch_size: int = 10_000) -> int:
+    """Reset the running aggregates and refold the full match history
+
+    A repair and backfill tool; routine loads only fold new matches.
+    Composition rows, and their Nash values, are kept and recounted in
+    place. Commits. Returns the number of matches folded.
+    """
+    disable_statement_timeout(db)
+    lock_aggregates(db)
+    reset = {column: 0 for column in HERO_COUNTERS}
+    reset.update(win_rate=0.0, pick_rate=0.0)
+    db.query(models.Hero).update(reset, synchronize_session=False)
+    db.query(models.TeamComposition).update(
+        {models.TeamComposition.win_count: 0, models.TeamComposition.loss_count: 0,
+         models.TeamComposition.win_rate: 0.0},
+        synchronize_session=False
+    )
+    db.query(models.AggregateCounter).filter_by(name=MATCH_COUNTER).update(
+        {models.AggregateCounter.value: 0}, synchronize_session=False
+    )
+
+    # Fold in batches so only one batch of matches is held in memory
+    folded = 0
+    batch = []
+    for match in iter_matches(db, batch_size=batch_size):
+        batch.append(match)
+        if len(batch) >= batch_size:
+            folded += fold_match_aggregates(db, batch)
+            batch = []
+    folded += fold_match_aggregates(db, batch)
+    db.commit()
+    return folded
+
+def _archive_new_matches(archive: MatchArchive, matches: List[Dict], archived: np.ndarray) -> int:
+    """Write the matches whose IDs are not in the sorted archived IDs; returns how many were written"""
+    if not matches:
+        return 0
+    done = np.isin([match["id"] for match in matches], archived)
+    new = [match for match, is_done in zip(matches, done) if not is_done]
+    if new:
+        archive.write_matches(new, lambda m: match_date(m["timestamp"]))
+    return len(new)
+
+def export_match_archive(db: Session, archive: MatchArchive, batch_size: int = 10_000) -> int:
+    """Write stored matches that are not archived yet to a MatchArchive, one batch at a time
+
+    Backfills the archive for matches loaded before archiving was enabled
+    or without it. Matches already in the archive are skipped, so the
+    export can be rerun. Returns the number of matches written.
+    """
+    archived = archive.match_ids()
+    exported = 0
+    batch = []
+    for match in iter_matches(db, batch_size=batch_size):
+        batch.append(match)
+        if len(batch) >= batch_size:
+            exported += _archive_new_matches(archive, batch, archived)
+            batch = []
+    exported += _archive_new_matches(archive, batch, archived)
+    return exported
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill or recompute the hero_daily_stats rollup and, with --aggregates, the running aggregates"
+    )
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to recompute (default: all history)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to recompute (default: all history)")
+    parser.add_argument("--aggregates", action="store_true",
+                        help="Also rebuild the running hero and composition aggregates from all history; "
+                             "needed once after upgrading a database with stored matches")
+    parser.add_argument("--export-archive", metavar="DIR",
+                        help="Also write stored matches that are not archived yet to a columnar match archive in DIR")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        rows = recompute_hero_daily_stats(db, args.start, args.end)
+        logger.info(f"Recomputed {rows} hero_daily_stats rows")
+        if args.aggregates:
+            matches = rebuild_match_aggregates(db)
+            logger.info(f"Rebuilt running aggregates from {matches} matches")
+        cache.bump_version()
+        if args.export_archive:
+            matches = export_match_archive(db, MatchArchive(args.export_archive))
+            logger.info(f"Exported {matches} matches to {args.export_archive}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional
 import logging
+from app.analysis.compositions import CompositionInterner, composition_key
+from app.analysis.match_store import EMPTY_SLOT, MatchStore
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +13,10 @@ class MarvelRivalsTransformer:
     
     def transform_match_data(self, raw_matches: List[Dict]) -> List[Dict]:
         """Transform raw match data into a format suitable for analysis"""
-        transformed_matches = []
-        
+        return list(self.iter_transform_match_data(raw_matches))
+    
+    def iter_transform_match_data(self, raw_matches: Iterable[Dict]) -> Iterator[Dict]:
+        """Transform raw matches one at a time, for streaming pipelines"""
         for match in raw_matches:
             try:
                 # Extract basic match info
@@ -37,52 +41,131 @@ class MarvelRivalsTransformer:
                         "damage_dealt": player["stats"]["damage_dealt"]
                     }
                     transformed_match["heroes"].append(hero_data)
-                
-                transformed_matches.append(transformed_match)
             except KeyError as e:
                 logger.error(f"Error transforming match data: {e}")
                 continue
-        
-        return transformed_matches
+            
+            yield transformed_match
     
     def calculate_hero_stats(self, matches: List[Dict]) -> Dict[int, Dict]:
-        """Calculate statistics for each hero based on match data"""
+        """Calculate statistics for each hero based on match data (match dicts or a MatchStore)"""
         hero_stats = {}
-        
-        # Initialize counters
+        if isinstance(matches, MatchStore):
+            self._add_store_hero_appearances(matches, hero_stats)
+        else:
+            for match in matches:
+                self._add_hero_appearances(match, hero_stats)
+        return self.derive_hero_stats(hero_stats)
+    
+    def identify_team_compositions(self, matches: List[Dict],
+                                   interner: Optional[CompositionInterner] = None) -> List[Dict]:
+        """Identify and analyze team compositions from match data
+
+        When an interner is given, each composition also carries its interned
+        "composition_id" so it lines up with TeamCompositionAnalyzer rows.
+        """
+        team_comps = {}
+        if isinstance(matches, MatchStore):
+            self._add_store_compositions(matches, team_comps)
+        else:
+            for match in matches:
+                self._add_compositions(match, team_comps)
+        return self.derive_team_compositions(team_comps, interner)
+    
+    def accumulate(self, matches: Iterable[Dict], hero_stats: Dict[int, Dict],
+                   team_comps: Dict[str, Dict]):
+        """Fold a batch of matches into running hero and composition counters in one pass"""
+        if isinstance(matches, MatchStore):
+            self._add_store_hero_appearances(matches, hero_stats)
+            self._add_store_compositions(matches, team_comps)
+            return
         for match in matches:
-            for hero in match["heroes"]:
-                hero_id = hero["hero_id"]
-                if hero_id not in hero_stats:
-                    hero_stats[hero_id] = {
-                        "games_played": 0,
-                        "wins": 0,
-                        "losses": 0,
-                        "kills": 0,
-                        "deaths": 0,
-                        "assists": 0,
-                        "damage_dealt": 0
-                    }
+            self._add_hero_appearances(match, hero_stats)
+            self._add_compositions(match, team_comps)
+    
+    def _add_hero_appearances(self, match: Dict, hero_stats: Dict[int, Dict]):
+        winner_team = match["winner_team"]
+        for hero in match["heroes"]:
+            stats = hero_stats.get(hero["hero_id"])
+            if stats is None:
+                stats = hero_stats[hero["hero_id"]] = {
+                    "games_played": 0,
+                    "wins": 0,
+                    "losses": 0,
+                    "kills": 0,
+                    "deaths": 0,
+                    "assists": 0,
+                    "damage_dealt": 0
+                }
+            
+            stats["games_played"] += 1
+            if hero["team"] == winner_team:
+                stats["wins"] += 1
+            else:
+                stats["losses"] += 1
+            
+            stats["kills"] += hero["kills"]
+            stats["deaths"] += hero["deaths"]
+            stats["assists"] += hero["assists"]
+            stats["damage_dealt"] += hero["damage_dealt"]
+    
+    def _add_compositions(self, match: Dict, team_comps: Dict[str, Dict]):
+        winner_team = match["winner_team"]
+        for team in (1, 2):
+            heroes = sorted(h["hero_id"] for h in match["heroes"] if h["team"] == team)
+            key = composition_key(heroes)
+            if key not in team_comps:
+                team_comps[key] = {"heroes": heroes, "wins": 0, "losses": 0}
+            if winner_team == team:
+                team_comps[key]["wins"] += 1
+            else:
+                team_comps[key]["losses"] += 1
+    
+    def _add_store_hero_appearances(self, store: MatchStore, hero_stats: Dict[int, Dict]):
+        """Vectorized _add_hero_appearances over a whole MatchStore"""
+        filled = store.filled
+        hero_ids = store.heroes[filled].astype(np.int64)
+        if len(hero_ids) == 0:
+            return
+        won = (store.team_of_slot() == store.winner_team[:, None])[filled]
         
-        # Aggregate stats
-        for match in matches:
-            winner_team = match["winner_team"]
-            for hero in match["heroes"]:
-                hero_id = hero["hero_id"]
-                team = hero["team"]
-                
-                hero_stats[hero_id]["games_played"] += 1
-                if team == winner_team:
-                    hero_stats[hero_id]["wins"] += 1
-                else:
-                    hero_stats[hero_id]["losses"] += 1
-                
-                hero_stats[hero_id]["kills"] += hero["kills"]
-                hero_stats[hero_id]["deaths"] += hero["deaths"]
-                hero_stats[hero_id]["assists"] += hero["assists"]
-                hero_stats[hero_id]["damage_dealt"] += hero["damage_dealt"]
+        size = int(hero_ids.max()) + 1
+        games = np.bincount(hero_ids, minlength=size)
+        totals = {
+            "games_played": games,
+            "wins": np.bincount(hero_ids[won], minlength=size),
+            "losses": np.bincount(hero_ids[~won], minlength=size)
+        }
+        for name in ("kills", "deaths", "assists", "damage_dealt"):
+            totals[name] = np.bincount(hero_ids, weights=store.stat(name)[filled], minlength=size).astype(np.int64)
         
-        # Calculate derived metrics
+        for hero_id in np.flatnonzero(games):
+            stats = hero_stats.setdefault(int(hero_id), {name: 0 for name in totals})
+            for name, counts in totals.items():
+                stats[name] += int(counts[hero_id])
+    
+    def _add_store_compositions(self, store: MatchStore, team_comps: Dict[str, Dict]):
+        """Vectorized _add_compositions: only distinct team rows become Python objects"""
+        for team in (1, 2):
+            rows = store.team_heroes(team)
+            if len(rows) == 0:
+                continue
+            unique_rows, inverse = np.unique(rows, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            won = store.winner_team == team
+            wins = np.bincount(inverse[won], minlength=len(unique_rows))
+            losses = np.bincount(inverse[~won], minlength=len(unique_rows))
+            
+            for row, heroes in enumerate(unique_rows):
+                heroes = heroes[heroes != EMPTY_SLOT].tolist()
+                key = composition_key(heroes)
+                if key not in team_comps:
+                    team_comps[key] = {"heroes": heroes, "wins": 0, "losses": 0}
+                team_comps[key]["wins"] += int(wins[row])
+                team_comps[key]["losses"] += int(losses[row])
+    
+    def derive_hero_stats(self, hero_stats: Dict[int, Dict]) -> Dict[int, Dict]:
+        """Add win rate, KDA and average damage to accumulated hero counters"""
         for hero_id, stats in hero_stats.items():
             games_played = stats["games_played"]
             if games_played > 0:
@@ -96,39 +179,13 @@ class MarvelRivalsTransformer:
         
         return hero_stats
     
-    def identify_team_compositions(self, matches: List[Dict]) -> List[Dict]:
-        """Identify and analyze team compositions from match data"""
-        team_comps = {}
-        
-        for match in matches:
-            winner_team = match["winner_team"]
-            
-            # Extract team compositions
-            team1_heroes = sorted([h["hero_id"] for h in match["heroes"] if h["team"] == 1])
-            team2_heroes = sorted([h["hero_id"] for h in match["heroes"] if h["team"] == 2])
-            
-            # Create composition keys
-            team1_key = ",".join(map(str, team1_heroes))
-            team2_key = ",".join(map(str, team2_heroes))
-            
-            # Update team1 stats
-            if team1_key not in team_comps:
-                team_comps[team1_key] = {"heroes": team1_heroes, "wins": 0, "losses": 0}
-            if winner_team == 1:
-                team_comps[team1_key]["wins"] += 1
-            else:
-                team_comps[team1_key]["losses"] += 1
-            
-            # Update team2 stats
-            if team2_key not in team_comps:
-                team_comps[team2_key] = {"heroes": team2_heroes, "wins": 0, "losses": 0}
-            if winner_team == 2:
-                team_comps[team2_key]["wins"] += 1
-            else:
-                team_comps[team2_key]["losses"] += 1
-        
-        # Calculate win rates
+    def derive_team_compositions(self, team_comps: Dict[str, Dict],
+                                 interner: Optional[CompositionInterner] = None) -> List[Dict]:
+        """Add win rates to accumulated composition counters, most played first"""
         for comp_key, comp_data in team_comps.items():
+            comp_data["key"] = comp_key
+            if interner is not None:
+                comp_data["composition_id"] = interner.intern(comp_data["heroes"])
             total_games = comp_data["wins"] + comp_data["losses"]
             if total_games > 0:
                 comp_data["win_rate"] = comp_data["wins"] / total_games
@@ -141,4 +198,4 @@ class MarvelRivalsTransformer:
         team_comp_list = list(team_comps.values())
         team_comp_list.sort(key=lambda x: x["total_games"], reverse=True)
         
-        return team_comp_list 
\ No newline at end of file
+        return team_comp_list
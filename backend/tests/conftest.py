@@ -0,0 +1,58 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models  # noqa: F401 (registers the tables on Base.metadata)
+from app.database import Base
+
+# PostgreSQL-only tests run against this database, which they wipe
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs a scratch PostgreSQL database at TEST_DATABASE_URL")
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def pg_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def build_match(match_id, team1=range(1, 7), team2=range(7, 13), winner_team=1,
+                timestamp="2024-03-20T12:00:00Z", **fields):
+    """A transformed match with team1 on team 1 and team2 on team 2; fields override match-level keys"""
+    match = {
+        "match_id": match_id,
+        "timestamp": timestamp,
+        "duration": 300,
+        "winner_team": winner_team,
+        "map": "test_map",
+        "heroes": [
+            {"hero_id": hero_id, "player_id": f"{match_id}-{hero_id}", "team": team,
+             "kills": 1, "deaths": 2, "assists": 3, "damage_dealt": 400}
+            for team, heroes in ((1, team1), (2, team2)) for hero_id in heroes
+        ]
+    }
+    match.update(fields)
+    return match
+
+@pytest.fixture
+def make_match():
+    return build_match
@@ -0,0 +1,63 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.analysis.game_tree import GameTreeAnalysis
+from etl.loader import MarvelRivalsLoader
+from etl.rollups import export_match_archive
+
+pytest.importorskip("pyarrow")
+
+from app.analysis.archive import MatchArchive
+
+HERO_POOL = [{"id": h, "name": f"hero{h}", "role": "duelist"} for h in range(1, 13)]
+
+def test_loader_archive_matches_database_model(db, tmp_path, make_match):
+    archive = MatchArchive(str(tmp_path))
+    matches = [make_match(str(i), winner_team=1 + i % 2, timestamp=f"2024-03-{20 + i % 3}T12:00:00Z") for i in range(9)]
+    MarvelRivalsLoader(db, archive).load_matches(matches, chunk_size=4)
+
+    assert archive.days() == [date(2024, 3, 20), date(2024, 3, 21), date(2024, 3, 22)]
+    columns = archive.read_columns()
+    assert columns["hero_id"].dtype == np.int16
+    assert columns["team"].dtype == np.int8
+    assert len(columns["hero_id"]) == 9 * 12
+
+    from_archive = GameTreeAnalysis(HERO_POOL)
+    from_archive.initialize_from_archive(archive)
+    from_matches = GameTreeAnalysis(HERO_POOL)
+    from_matches.initialize_matchup_matrix(matches)
+    np.testing.assert_array_equal(from_archive.win_counts, from_matches.win_counts)
+
+    one_day = GameTreeAnalysis(HERO_POOL)
+    one_day.initialize_from_archive(archive, start=date(2024, 3, 21), end=date(2024, 3, 21))
+    assert one_day.win_counts.sum() == 3 * 36
+
+def test_export_backfills_archive(db, tmp_path, make_match):
+    MarvelRivalsLoader(db).load_matches([make_match(str(i)) for i in range(3)])
+
+    archive = MatchArchive(str(tmp_path))
+    assert export_match_archive(db, archive, batch_size=2) == 3
+    assert len(np.unique(archive.read_columns()["match_id"])) == 3
+
+def test_export_skips_archived_matches(db, tmp_path, make_match):
+    archive = MatchArchive(str(tmp_path))
+    loader = MarvelRivalsLoader(db, archive)
+    loader.load_matches([make_match("a"), make_match("b")])
+    MarvelRivalsLoader(db).load_matches([make_match("c")])  # stored without archiving
+
+    assert export_match_archive(db, archive) == 1
+    assert export_match_archive(db, archive) == 0
+    assert len(archive.read_columns()["hero_id"]) == 3 * 12
+
+def test_duplicate_files_are_read_once(db, tmp_path, make_match):
+    archive = MatchArchive(str(tmp_path))
+    matches = [make_match("a"), make_match("b", winner_team=2)]
+    MarvelRivalsLoader(db, archive).load_matches(matches)
+    # An older export that appended the same matches again
+    archive.write_matches([dict(m, id=i + 1) for i, m in enumerate(matches)], lambda m: date(2024, 3, 20))
+
+    assert len(archive.read_table()) == 4 * 12
+    match_idx, hero_id, team, winner_team = archive.match_columns()
+    assert np.bincount(match_idx).tolist() == [12, 12]
+    assert winner_team.tolist() == [1, 2]
+
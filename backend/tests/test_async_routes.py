@@ -0,0 +1,117 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+import fakeredis
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import models
+from app.cache import AsyncVersionedCache
+from app.database import Base
+from app.routers import analytics
+from app.routers.analytics import get_hero_stats, get_win_rate_over_time
+from app.routers.matches import decode_cursor, get_match, get_recent_matches, list_matches
+from etl.loader import MarvelRivalsLoader
+
+async def with_session(scenario):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        today = datetime.utcnow().date()
+        db.add(models.Hero(id=1, name="hero1"))
+        db.add_all([
+            models.HeroDailyStats(date=today, hero_id=1, games=4, wins=3),
+            models.HeroDailyStats(date=today - timedelta(days=60), hero_id=1, games=9, wins=9),
+            models.Match(match_id="old", timestamp=datetime(2024, 3, 1), duration=300, winner_team=1, map="m"),
+            models.Match(match_id="new", timestamp=datetime(2024, 3, 2), duration=300, winner_team=2, map="m"),
+        ])
+        await db.commit()
+        result = await scenario(db)
+    await engine.dispose()
+    return result
+
+def test_win_rate_over_time_reads_rollup_async():
+    rows = asyncio.run(with_session(lambda db: get_win_rate_over_time(hero_id=1, days=30, db=db)))
+    assert [(row["games"], row["wins"], row["win_rate"]) for row in rows] == [(4, 3, 0.75)]
+
+def test_match_lookups_async():
+    async def scenario(db):
+        return await get_recent_matches(limit=1, db=db), await get_match("old", db=db)
+
+    recent, match = asyncio.run(with_session(scenario))
+    assert [m.match_id for m in recent] == ["new"]
+    assert match.winner_team == 1
+
+def test_match_listing_pages_by_keyset():
+    async def scenario(db):
+        # Equal timestamps must not be skipped or repeated across pages
+        for i in range(5):
+            db.add(models.Match(match_id=f"tie{i}", timestamp=datetime(2024, 3, 3), duration=300,
+                                winner_team=1, map="tokyo"))
+        await db.commit()
+        tie = await db.scalar(select(models.Match).where(models.Match.match_id == "tie4"))
+        db.add(models.MatchHero(match_id=tie.id, hero_id=1, player_id="p1", team=1))
+        await db.commit()
+
+        pages, cursor = [], None
+        while True:
+            page = await list_matches(limit=2, cursor=cursor, map_name=None, hero_id=None, player_id=None,
+                                      start=None, end=None, db=db)
+            pages.append([m.match_id for m in page["matches"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        filtered = await list_matches(limit=10, cursor=None, map_name="tokyo", hero_id=1, player_id="p1",
+                                      start=datetime(2024, 3, 2), end=None, db=db)
+        windowed = await list_matches(limit=10, cursor=None, map_name=None, hero_id=None, player_id=None,
+                                      start=datetime(2024, 3, 1), end=datetime(2024, 3, 3), db=db)
+        return pages, filtered, windowed
+
+    pages, filtered, windowed = asyncio.run(with_session(scenario))
+    assert pages == [["tie4", "tie3"], ["tie2", "tie1"], ["tie0", "new"], ["old"]]
+    assert [m.match_id for m in filtered["matches"]] == ["tie4"]
+    assert [m.match_id for m in windowed["matches"]] == ["new", "old"]
+
+def test_match_listing_rejects_bad_cursor():
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor")
+
+def test_hero_stats_route_filters_and_totals(tmp_path, monkeypatch, make_match):
+    path = tmp_path / "stats.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    for hero_id in range(1, 4):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.commit()
+
+    MarvelRivalsLoader(db).load_matches([
+        make_match("a", [1], [2]), make_match("b", [1], [2], winner_team=2), make_match("c", [1], [3])
+    ])
+    db.close()
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(analytics, "AsyncSessionLocal", async_sessionmaker(async_engine, expire_on_commit=False))
+    monkeypatch.setattr(analytics, "async_cache", AsyncVersionedCache(fakeredis.FakeAsyncRedis()))
+
+    async def scenario():
+        try:
+            return [json.loads((await get_hero_stats(min_games=min_games)).body) for min_games in (2, 1)]
+        finally:
+            await async_engine.dispose()
+
+    frequent, everyone = asyncio.run(scenario())
+    assert [h["id"] for h in frequent] == [1, 2]
+    assert [h["id"] for h in everyone] == [1, 2, 3]
+    hero1 = frequent[0]
+    assert (hero1["games"], hero1["wins"], hero1["kills"], hero1["damage_dealt"]) == (3, 2, 3, 1200)
+    assert hero1["win_rate"] == pytest.approx(2 / 3)
+    assert hero1["pick_rate"] == 1.0
+    assert frequent[1]["pick_rate"] == pytest.approx(2 / 3)
+    assert hero1["kda"] == 2.0 and hero1["avg_damage"] == 400
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from app import models
+from app.analysis import archive
+from app.routers.matches import MatchCreate, ingest_matches, match_loader, read_body, store_match
+from etl.loader import MarvelRivalsLoader
+
+@pytest.fixture
+def db(db):
+    for hero_id in (1, 2):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.add(models.Match(match_id="existing", duration=100, winner_team=1, map="m"))
+    db.commit()
+    return db
+
+def test_array_body_reports_status_per_match(db, make_match):
+    body = json.dumps([
+        make_match("a", [1], [2]),
+        make_match("existing", [1], [2]),
+        make_match("b", [1], [2], winner_team="first"),
+        make_match("a", [1], [2]),
+        make_match("c", [1], [2], timestamp=None),
+    ]).encode()
+
+    response = ingest_matches(MarvelRivalsLoader(db), body)
+
+    assert [r["status"] for r in response["results"]] == ["created", "duplicate", "invalid", "duplicate", "created"]
+    assert (response["created"], response["duplicates"], response["invalid"]) == (2, 2, 1)
+    assert response["results"][2]["error"][0]["loc"] == ("winner_team",)
+    stored = db.query(models.Match).filter_by(match_id="a").one()
+    assert response["results"][0]["id"] == stored.id
+    assert len(stored.heroes) == 2
+    assert db.query(models.Match).filter_by(match_id="c").one().timestamp is not None
+    assert db.get(models.Hero, 1).games_played == 2
+
+def test_unknown_heroes_and_teams_are_invalid(db, make_match):
+    bad_team = make_match("bad-team", [1], [2])
+    bad_team["heroes"][1]["team"] = 3
+    body = json.dumps([
+        make_match("unknown-hero", [1], [99]),
+        bad_team,
+        make_match("bad-winner", [1], [2], winner_team=0),
+        make_match("ok", [1], [2]),
+    ]).encode()
+
+    response = ingest_matches(MarvelRivalsLoader(db), body)
+
+    assert [r["status"] for r in response["results"]] == ["invalid", "invalid", "invalid", "created"]
+    assert response["results"][0]["error"] == [
+        {"type": "unknown_hero", "loc": ["heroes", 1, "hero_id"], "msg": "Unknown hero", "input": 99}
+    ]
+    assert response["results"][1]["error"][0]["loc"] == ("heroes", 1, "team")
+    assert [m.match_id for m in db.query(models.Match).order_by(models.Match.id)] == ["existing", "ok"]
+
+def test_matches_with_too_many_heroes_are_invalid(db, make_match):
+    body = json.dumps([
+        make_match("thirteen", [1] * 7, [2] * 6),
+        make_match("seven", [1] * 7, [2]),
+        make_match("six", [1] * 6, [2] * 6),
+    ]).encode()
+
+    response = ingest_matches(MarvelRivalsLoader(db), body)
+
+    assert [r["status"] for r in response["results"]] == ["invalid", "invalid", "created"]
+    assert response["results"][0]["error"][0]["type"] == "too_long"
+    assert "Team 1 has 7 heroes" in response["results"][1]["error"][0]["msg"]
+
+def test_ndjson_body(db, make_match):
+    lines = [json.dumps(make_match("x", [1], [2])), "", "{not json", json.dumps(make_match("y", [1], [2]))]
+    response = ingest_matches(MarvelRivalsLoader(db), "\n".join(lines).encode())
+
+    assert [r["status"] for r in response["results"]] == ["created", "invalid", "created"]
+    assert db.query(models.Match).count() == 3
+
+def test_failed_transaction_stores_nothing(db, make_match):
+    body = json.dumps([make_match("a", [1], [2]), make_match("b", [1], [2])]).encode()
+    db.execute(text("DROP TABLE match_heroes"))
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        ingest_matches(MarvelRivalsLoader(db), body)
+    assert error.value.status_code == 500
+    assert db.query(models.Match).count() == 1
+
+def test_single_match_uses_the_loader_write_path(db, make_match):
+    loader = MarvelRivalsLoader(db)
+    stored = store_match(loader, MatchCreate.model_validate(make_match("single", [1], [2])))
+
+    assert stored.match_id == "single"
+    assert len(stored.heroes) == 2
+    assert db.get(models.Hero, 1).games_played == 1
+
+    with pytest.raises(HTTPException) as error:
+        store_match(loader, MatchCreate.model_validate(make_match("single", [1], [2])))
+    assert error.value.status_code == 409
+
+    with pytest.raises(HTTPException) as error:
+        store_match(loader, MatchCreate.model_validate(make_match("unknown", [1], [99])))
+    assert error.value.status_code == 422
+
+def test_single_match_writes_skip_the_archive(db, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(archive, "MATCH_ARCHIVE_DIR", str(tmp_path))
+
+    assert match_loader(db).archive.root == str(tmp_path)
+    assert match_loader(db, archive=False).archive is None
+
+class StreamedRequest:
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+def test_body_is_capped_while_reading():
+    assert asyncio.run(read_body(StreamedRequest([b"[1,", b"2]"]), 10)) == b"[1,2]"
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_body(StreamedRequest([b"x" * 6, b"x" * 6]), 10))
+    assert error.value.status_code == 413
+
+    # Rejected from the declared length, before anything is read
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_body(StreamedRequest([], {"content-length": "11"}), 10))
+    assert error.value.status_code == 413
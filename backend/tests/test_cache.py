@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+import fakeredis
+import redis
+from app.cache import AsyncVersionedCache, VersionedCache
+from etl.loader import MarvelRivalsLoader
+
+def make_caches():
+    """A sync and an async cache sharing one fake Redis server"""
+    server = fakeredis.FakeServer()
+    return (VersionedCache(fakeredis.FakeRedis(server=server)),
+            AsyncVersionedCache(fakeredis.FakeAsyncRedis(server=server), poll_interval=0.01))
+
+def test_hits_return_serialized_bytes_until_version_bump():
+    sync_cache, cache = make_caches()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    async def scenario():
+        first = await cache.get_or_compute("stats", compute, ttl=60)
+        second = await cache.get_or_compute("stats", compute, ttl=60)
+        sync_cache.bump_version()
+        return first, second, await cache.get_or_compute("stats", compute, ttl=60)
+
+    first, second, bumped = asyncio.run(scenario())
+    assert first == second == b'{"value": 1}'
+    assert json.loads(bumped) == {"value": 2}
+    assert sync_cache.version("predictions") == 0
+
+def test_concurrent_misses_compute_once():
+    _, cache = make_caches()
+    calls = []
+
+    async def slow_compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return [1, 2, 3]
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_compute("slow", slow_compute, ttl=60) for _ in range(8)])
+
+    assert asyncio.run(scenario()) == [b"[1, 2, 3]"] * 8
+    assert len(calls) == 1
+
+def test_stale_entries_are_served_while_refreshing():
+    _, cache = make_caches()
+    values = iter(["old", "new"])
+
+    async def compute():
+        return next(values)
+
+    async def scenario():
+        assert await cache.get_or_compute("swr", compute, ttl=0.05, stale_ttl=60) == b'"old"'
+        await asyncio.sleep(0.1)
+        assert await cache.get_or_compute("swr", compute, ttl=60, stale_ttl=60) == b'"old"'
+        await cache.wait_for_refreshes()
+        assert await cache.get_or_compute("swr", compute, ttl=60) == b'"new"'
+
+    asyncio.run(scenario())
+
+async def computed():
+    return "computed"
+
+def test_redis_outage_falls_back_to_computing():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    cache = AsyncVersionedCache(fakeredis.FakeAsyncRedis(server=server))
+
+    assert asyncio.run(cache.get_or_compute("stats", computed, ttl=60)) == b'"computed"'
+    assert VersionedCache(fakeredis.FakeRedis(server=server)).bump_version() is None
+
+class LockFailingRedis(fakeredis.FakeAsyncRedis):
+    """Redis that drops the connection when a lock is taken"""
+
+    async def set(self, name, value, *args, nx=False, **kwargs):
+        if nx:
+            raise redis.exceptions.ConnectionError("connection lost")
+        return await super().set(name, value, *args, nx=nx, **kwargs)
+
+def test_redis_outage_after_lookup_falls_back_to_computing():
+    cache = AsyncVersionedCache(LockFailingRedis(), poll_interval=0.01)
+
+    async def scenario():
+        assert await cache.get_or_compute("miss", computed, ttl=60) == b'"computed"'
+        # A stale entry is still served when its refresh cannot be locked
+        await cache.client.set(cache._entry_key("matches", 0, "stale"), cache._encode("old", time.time() - 1))
+        assert await cache.get_or_compute("stale", computed, ttl=60) == b'"old"'
+
+    asyncio.run(scenario())
+
+def test_loader_bumps_version_for_new_matches(db, make_match):
+    cache, _ = make_caches()
+    match = make_match("m1", [1], [])
+
+    loader = MarvelRivalsLoader(db, cache=cache)
+    loader.load_matches([match])
+    assert cache.version() == 1
+    loader.load_matches([match])  # Nothing new, nothing invalidated
+    assert cache.version() == 1
@@ -0,0 +1,51 @@
+import threading
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import QueuePool
+from app.database import PoolMetrics, async_database_url, disable_statement_timeout, instrumented_pool
+
+def test_instrumented_pool_records_waits_and_timeouts(tmp_path):
+    metrics = PoolMetrics()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=instrumented_pool(QueuePool, metrics),
+        pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+
+    # A waiter is served as soon as the held connection is returned
+    threading.Timer(0.05, held.close).start()
+    with engine.connect():
+        snapshot = metrics.snapshot(engine.pool)
+
+    assert snapshot["checkouts"] == 2
+    assert snapshot["timeouts"] == 1
+    assert snapshot["checked_out"] == 1
+    assert snapshot["utilization"] == 1.0
+    assert snapshot["max_wait_ms"] >= 40
+    engine.dispose()
+
+def test_async_database_url_keeps_credentials():
+    assert async_database_url("postgresql://user:secret@db:5432/marvel") == "postgresql+asyncpg://user:secret@db:5432/marvel"
+    assert async_database_url("sqlite:///local.db") == "sqlite+aiosqlite:///local.db"
+
+def test_statement_timeout_is_lifted_per_transaction_on_postgresql():
+    executed = []
+
+    class Session:
+        def __init__(self, dialect):
+            self.dialect = type("Dialect", (), {"name": dialect})()
+
+        def get_bind(self):
+            return self
+
+        def execute(self, statement):
+            executed.append(str(statement))
+
+    disable_statement_timeout(Session("sqlite"))
+    assert executed == []
+    disable_statement_timeout(Session("postgresql"))
+    assert executed == ["SET LOCAL statement_timeout = 0"]
@@ -0,0 +1,56 @@
+import pytest
+from app import models
+from etl.equilibrium import solve_composition_equilibrium, update_equilibrium_values
+from etl.loader import MarvelRivalsLoader
+
+def stored_values(db):
+    db.expire_all()
+    return {comp.composition_key: comp.nash_equilibrium_value for comp in db.query(models.TeamComposition)}
+
+def test_equilibrium_values_are_solved_and_stored(db, make_match):
+    loader = MarvelRivalsLoader(db)
+    # Rock-paper-scissors between three compositions, plus one played only once
+    loader.load_matches([
+        make_match(f"{i}-{j}", *pair, winner_team=1)
+        for i, pair in enumerate([([1, 2], [3, 4]), ([3, 4], [5, 6]), ([5, 6], [1, 2])])
+        for j in range(2)
+    ] + [make_match("rare", [7, 8], [1, 2], winner_team=2)])
+    db.query(models.TeamComposition).filter_by(composition_key="7,8").update({"nash_equilibrium_value": 0.5})
+    db.commit()
+
+    assert update_equilibrium_values(loader, method="lp", min_games=2) == 3
+
+    values = stored_values(db)
+    for key in ("1,2", "3,4", "5,6"):
+        assert values[key] == pytest.approx(1 / 3, abs=1e-6)
+    # Compositions outside the equilibrium are cleared, not left with old values
+    assert values["7,8"] is None
+
+def test_failed_solve_leaves_stored_values(db, monkeypatch, make_match):
+    loader = MarvelRivalsLoader(db)
+    loader.load_matches([make_match("a", [1, 2], [3, 4], winner_team=1)])
+    db.query(models.TeamComposition).update({"nash_equilibrium_value": 0.25})
+    db.commit()
+
+    monkeypatch.setattr("etl.equilibrium.TeamCompositionAnalyzer.find_nash_equilibrium", lambda self, **kwargs: None)
+    assert update_equilibrium_values(loader) is None
+    assert set(stored_values(db).values()) == {0.25}
+
+def test_solver_starts_from_the_stored_equilibrium(db, make_match):
+    loader = MarvelRivalsLoader(db)
+    # Unbalanced cycle: the equilibrium is far from uniform
+    results = [([1, 2], [3, 4], [1, 1, 1, 2]), ([3, 4], [5, 6], [1, 2]), ([5, 6], [1, 2], [1, 1, 1, 1, 2]),
+               ([7, 8], [1, 2], [2, 2, 1])]
+    loader.load_matches([
+        make_match(f"{i}-{j}", team1, team2, winner_team=winner)
+        for i, (team1, team2, winners) in enumerate(results) for j, winner in enumerate(winners)
+    ])
+
+    cold = solve_composition_equilibrium(db)
+    loader.update_nash_equilibrium_values(cold.equilibrium_values())
+    warm = solve_composition_equilibrium(db)
+
+    assert cold.converged and warm.converged
+    # The stored support already holds the equilibrium, so one restricted solve confirms it
+    assert cold.iterations > 1
+    assert warm.iterations == 1
@@ -0,0 +1,88 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from etl.extractor import MarvelRivalsExtractor
+
+NOW = datetime.utcnow()
+MATCHES = [
+    {"id": str(i), "timestamp": (NOW - timedelta(minutes=5 * i + 1)).isoformat()}
+    for i in range(250)
+]
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves MATCHES by time range; cursors only when use_cursor is set"""
+    use_cursor = False
+    throttled = set()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        start, end = params["start_time"], params["end_time"]
+
+        # Rate limit the first request for every window once
+        if (start, end) not in self.throttled:
+            self.throttled.add((start, end))
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        selected = sorted(
+            (m for m in MATCHES if start <= m["timestamp"] < end),
+            key=lambda m: m["timestamp"]
+        )
+        limit = int(params["limit"])
+        offset = int(params.get("cursor", 0))
+        page = {"matches": selected[offset:offset + limit]}
+        if self.use_cursor and offset + limit < len(selected):
+            page["next_cursor"] = str(offset + limit)
+
+        body = json.dumps(page).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(params=[False, True], ids=["split", "cursor"])
+def stub_server(request):
+    handler = type("Handler", (StubHandler,), {"use_cursor": request.param, "throttled": set()})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+def test_extracts_every_match_across_pages(stub_server):
+    extractor = MarvelRivalsExtractor("key", stub_server, max_workers=3, page_size=7, backoff_base=0)
+    matches = list(extractor.iter_recent_matches(hours=24, slice_minutes=120))
+
+    assert sorted(m["id"] for m in matches) == sorted(m["id"] for m in MATCHES)
+    assert extractor.failed_slices == []
+
+def test_unsplittable_full_slice_is_flagged(caplog):
+    handler = type("Handler", (StubHandler,), {"throttled": set()})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        extractor = MarvelRivalsExtractor("key", f"http://127.0.0.1:{server.server_address[1]}",
+                                          page_size=1, backoff_base=0)
+        # Two matches share this one-second slice, but a page holds only one
+        start = datetime.fromisoformat(MATCHES[0]["timestamp"]).replace(microsecond=0)
+        MATCHES.append({"id": "twin", "timestamp": MATCHES[0]["timestamp"]})
+        try:
+            matches, splits = extractor._fetch_slice(start, start + timedelta(seconds=1))
+        finally:
+            MATCHES.pop()
+    finally:
+        server.shutdown()
+
+    assert len(matches) == 1 and splits == []
+    assert extractor.failed_slices == [(start, start + timedelta(seconds=1))]
+    assert "full page" in caplog.text
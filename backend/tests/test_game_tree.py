@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from app.analysis import backend
+from app.analysis.backend import NUMPY_BACKEND, get_backend
+from app.analysis.game_tree import GameTreeAnalysis
+
+@pytest.fixture
+def game_tree():
+    rng = np.random.default_rng(3)
+    hero_pool = [{"id": hero_id, "name": f"hero{hero_id}"} for hero_id in range(10, 30)]
+    matches = []
+    for i in range(300):
+        picks = rng.choice(range(10, 30), size=12, replace=False)
+        matches.append({
+            "id": i,
+            "winner_team": int(rng.integers(1, 3)),
+            "heroes": [
+                {"hero_id": int(h), "team": 1 if k < 6 else 2}
+                for k, h in enumerate(picks)
+            ]
+        })
+    tree = GameTreeAnalysis(hero_pool)
+    tree.initialize_matchup_matrix(matches)
+    return tree
+
+@pytest.fixture
+def no_accelerator(monkeypatch):
+    monkeypatch.setattr(backend, "load_cupy_backend", lambda: None)
+    get_backend.cache_clear()
+    yield
+    get_backend.cache_clear()
+
+def test_numpy_backend_without_accelerator(no_accelerator):
+    assert get_backend("numpy") is NUMPY_BACKEND
+    assert get_backend("cupy") is NUMPY_BACKEND
+    assert get_backend("auto") is NUMPY_BACKEND
+    assert GameTreeAnalysis([{"id": 1, "name": "a"}]).backend is NUMPY_BACKEND
+
+def test_predict_matchup_sums_pairwise_scores(game_tree):
+    team1, team2 = [10, 11, 12], [20, 21, 22]
+    score = sum(
+        game_tree.matchup_matrix[game_tree.hero_index[a], game_tree.hero_index[b]]
+        for a in team1 for b in team2
+    )
+    assert game_tree.predict_matchup(team1, team2) == pytest.approx(1 / (1 + np.exp(-score)), rel=1e-5)
+
+def test_counter_team_excludes_enemy_heroes(game_tree):
+    enemy = [10, 11, 12, 13, 14, 15]
+    available = list(range(10, 30))
+    team = game_tree.find_optimal_counter(enemy, available, banned_heroes=[20])
+    assert len(team) == 6
+    assert len(team) == len(set(team))
+    assert not set(team) & set(enemy + [20])
+
+def test_batch_predictions_match_single_predictions(game_tree):
+    team1s = [[10, 11, 12, 13, 14, 15], [16], [20, 21]]
+    team2s = [[20, 21, 22, 23, 24, 25], [17, 18, 19], [22, 23, 24, 25]]
+    expected = [game_tree.predict_matchup(t1, t2) for t1, t2 in zip(team1s, team2s)]
+    np.testing.assert_allclose(game_tree.predict_matchups(team1s, team2s, chunk_size=2), expected, rtol=1e-6)
+
+def test_pair_games_track_win_counts(game_tree):
+    np.testing.assert_array_equal(game_tree.pair_games, game_tree.win_counts + game_tree.win_counts.T)
+    assert game_tree.win_counts.dtype == np.int32
+    assert (np.abs(game_tree.matchup_matrix) < 1).all()
+
+def test_applying_matches_matches_a_full_rebuild():
+    rng = np.random.default_rng(11)
+    hero_pool = [{"id": hero_id, "name": f"hero{hero_id}"} for hero_id in range(10, 30)]
+    matches = []
+    for i in range(120):
+        # Later matches draw from fewer heroes, so some rows stay untouched
+        picks = rng.choice(range(10, 30) if i < 100 else range(10, 22), size=12, replace=False)
+        matches.append({
+            "winner_team": int(rng.integers(1, 3)),
+            "heroes": [{"hero_id": int(h), "team": 1 if k < 6 else 2} for k, h in enumerate(picks)]
+        })
+    
+    full = GameTreeAnalysis(hero_pool)
+    full.initialize_matchup_matrix(matches)
+    
+    online = GameTreeAnalysis(hero_pool)
+    online.initialize_matchup_matrix(matches[:100])
+    before = online.matchup_matrix
+    online.apply_matches(matches[100:110])
+    online.apply_matches(matches[110:])
+    
+    np.testing.assert_array_equal(online.win_counts, full.win_counts)
+    np.testing.assert_array_equal(online.pair_games, full.pair_games)
+    np.testing.assert_allclose(online.matchup_matrix, full.matchup_matrix, atol=1e-7)
+    assert online.matchup_matrix is not before
+    assert online.predict_matchup([10, 11], [12, 13]) == pytest.approx(full.predict_matchup([10, 11], [12, 13]))
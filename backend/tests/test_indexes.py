@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.analysis.match_history import match_rows_query
+from app.migrations import run_migrations
+from app.routers.analytics import win_rate_query
+from app.routers.matches import match_page_query, recent_matches_query
+from etl.rollups import daily_hero_counts_query
+
+def query_plan(db, statement):
+    compiled = statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+def assert_no_full_scans(plan):
+    # SQLite reports "SCAN <table>" for full table scans and adds "USING ... INDEX" otherwise
+    scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+    assert not scans, plan
+
+def test_recent_matches_reads_the_timestamp_index(db):
+    plan = query_plan(db, recent_matches_query(10))
+    assert any("ix_matches_timestamp" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+def test_win_rate_queries_use_indexes(db):
+    start, end = date(2024, 3, 1), date(2024, 3, 30)
+    assert_no_full_scans(query_plan(db, win_rate_query(start, end)))
+
+    plan = query_plan(db, win_rate_query(start, end, hero_id=3))
+    assert any("ix_hero_daily_stats_hero_id_date" in step for step in plan), plan
+
+def test_match_history_joins_through_indexes(db):
+    plan = query_plan(db, match_rows_query(db).statement)
+    assert any("ix_match_heroes_match_id" in step for step in plan), plan
+    assert_no_full_scans(plan)
+
+    window = match_rows_query(db, datetime(2024, 3, 1), datetime(2024, 3, 2)).statement
+    plan = query_plan(db, window)
+    assert any("ix_matches_timestamp" in step for step in plan), plan
+
+def test_daily_rollup_source_is_range_scanned(db):
+    plan = query_plan(db, daily_hero_counts_query(db, date(2024, 3, 1), date(2024, 3, 2)).statement)
+    assert any("ix_matches_timestamp" in step for step in plan), plan
+    assert any("ix_match_heroes_match_id" in step for step in plan), plan
+
+def test_match_pages_seek_on_the_keyset_index(db):
+    after = (datetime(2024, 3, 20), 42)
+    plan = query_plan(db, match_page_query(100, after))
+    assert any("ix_matches_timestamp" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+    plan = query_plan(db, match_page_query(100, after, map_name="tokyo"))
+    assert any("ix_matches_map_timestamp_id" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+    plan = query_plan(db, match_page_query(100, after, hero_id=3, player_id="p1"))
+    assert_no_full_scans(plan)
+    assert any("ix_match_heroes_player_id_match_id" in step or "ix_match_heroes_hero_id_match_id" in step
+               for step in plan), plan
+
+def test_migrations_add_indexes_to_existing_schema():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE heroes (id INTEGER PRIMARY KEY, name VARCHAR)"))
+        conn.execute(text("CREATE TABLE team_compositions (id INTEGER PRIMARY KEY, heroes JSON)"))
+        conn.execute(text("CREATE TABLE matches (id INTEGER PRIMARY KEY, match_id VARCHAR, timestamp DATETIME, winner_team INTEGER, map VARCHAR)"))
+        conn.execute(text("CREATE TABLE match_heroes (id INTEGER PRIMARY KEY, match_id INTEGER, hero_id INTEGER, player_id VARCHAR, team INTEGER)"))
+        # Indexes the earlier schema had
+        conn.execute(text("CREATE INDEX ix_match_heroes_player_id ON match_heroes (player_id)"))
+        conn.execute(text("CREATE INDEX ix_matches_timestamp ON matches (timestamp)"))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    inspector = inspect(engine)
+    match_indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes("matches")}
+    assert match_indexes["ix_matches_timestamp"] == ["timestamp", "id"]
+    assert match_indexes["ix_matches_map_timestamp_id"] == ["map", "timestamp", "id"]
+    hero_indexes = {index["name"] for index in inspector.get_indexes("match_heroes")}
+    assert {"ix_match_heroes_match_id", "ix_match_heroes_hero_id_match_id", "ix_match_heroes_player_id_match_id"} <= hero_indexes
+    assert "ix_match_heroes_player_id" not in hero_indexes
+
+@pytest.fixture
+def pg_db(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(models.Hero.__table__.insert(), [{"id": h, "name": f"hero{h}"} for h in range(1, 9)])
+        conn.execute(models.Match.__table__.insert(), [
+            {"id": i, "match_id": str(i), "timestamp": datetime(2024, 1, 1) + timedelta(minutes=10 * i),
+             "duration": 300, "winner_team": 1 + i % 2, "map": f"map{i % 5}"}
+            for i in range(1, 5001)
+        ])
+        conn.execute(models.MatchHero.__table__.insert(), [
+            {"match_id": i, "hero_id": h, "player_id": f"p{(i + h) % 300}", "team": 1 + h % 2}
+            for i in range(1, 5001) for h in range(1, 5)
+        ])
+        conn.execute(models.HeroDailyStats.__table__.insert(), [
+            {"date": date(2024, 1, 1) + timedelta(days=d), "hero_id": h, "games": 10, "wins": 5}
+            for d in range(200) for h in range(1, 9)
+        ])
+    # Fresh statistics and visibility map, so index-only scans are possible
+    with pg_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    session = sessionmaker(bind=pg_engine)()
+    yield session
+    session.close()
+
+def pg_plan(db, statement):
+    compiled = statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return "\n".join(row[0] for row in db.execute(text(f"EXPLAIN {compiled}")))
+
+@pytest.mark.postgres
+def test_postgresql_plans_use_the_covering_indexes(pg_db):
+    plan = pg_plan(pg_db, recent_matches_query(10))
+    assert "Index Scan Backward using ix_matches_timestamp" in plan and "Sort" not in plan, plan
+
+    plan = pg_plan(pg_db, win_rate_query(date(2024, 3, 1), date(2024, 3, 30), hero_id=3))
+    assert "Index Only Scan using ix_hero_daily_stats_hero_id_date" in plan, plan
+    plan = pg_plan(pg_db, win_rate_query(date(2024, 3, 1), date(2024, 3, 30)))
+    assert "hero_daily_stats_pkey" in plan, plan
+
+    # The included columns let the rollup source skip the heap entirely
+    plan = pg_plan(pg_db, daily_hero_counts_query(pg_db, date(2024, 3, 1), date(2024, 3, 2)).statement)
+    assert "Index Only Scan using ix_matches_timestamp" in plan, plan
+    assert "Index Only Scan using ix_match_heroes_match_id" in plan, plan
+
+    after = (datetime(2024, 1, 20), 42)
+    plan = pg_plan(pg_db, match_page_query(100, after))
+    assert "Index Scan Backward using ix_matches_timestamp" in plan and "Sort" not in plan, plan
+    plan = pg_plan(pg_db, match_page_query(100, after, map_name="map3"))
+    assert "Index Scan Backward using ix_matches_map_timestamp_id" in plan and "Sort" not in plan, plan
+    plan = pg_plan(pg_db, match_page_query(100, after, hero_id=3, player_id="p1"))
+    assert "ix_match_heroes_player_id_match_id" in plan, plan
+    assert "ix_match_heroes_hero_id_match_id" in plan, plan
@@ -0,0 +1,193 @@
+import sys
+import threading
+from datetime import datetime
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.analysis.matchup_model import MatchupModelRegistry
+from app.cache import VersionedCache
+from app.migrations import MIGRATIONS, run_migrations
+from etl.loader import MarvelRivalsLoader
+from etl import rollups
+from etl.rollups import rebuild_match_aggregates
+
+def test_bulk_load_skips_existing_and_repeated_matches(db, make_match):
+    loader = MarvelRivalsLoader(db)
+    assert loader.load_matches([make_match("a"), make_match("b")]) == 2
+
+    batch = [make_match("b"), make_match("c"), make_match("c"), make_match("d")]
+    assert loader.load_matches(batch, chunk_size=2) == 2
+
+    assert sorted(m.match_id for m in db.query(models.Match)) == ["a", "b", "c", "d"]
+    assert db.query(models.MatchHero).count() == 4 * 12
+    match = db.query(models.Match).filter_by(match_id="c").one()
+    assert len(match.heroes) == 12
+
+def test_malformed_match_does_not_block_its_chunk(db, make_match):
+    broken = make_match("x")
+    del broken["heroes"][0]["kills"]
+
+    loaded = MarvelRivalsLoader(db).load_matches([broken, make_match("y")])
+    assert loaded == 1
+    assert [m.match_id for m in db.query(models.Match)] == ["y"]
+
+def test_aggregates_are_folded_incrementally(db, make_match):
+    for hero_id in range(1, 13):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.commit()
+
+    loader = MarvelRivalsLoader(db)
+    loader.load_matches([make_match("a", winner_team=1), make_match("b", winner_team=2)])
+    loader.load_matches([make_match("b"), make_match("c", winner_team=1), make_match("d")])
+
+    hero = db.get(models.Hero, 1)
+    assert (hero.games_played, hero.wins, hero.losses) == (4, 3, 1)
+    assert (hero.kills, hero.deaths, hero.assists, hero.damage_dealt) == (4, 8, 12, 1600)
+    assert hero.win_rate == pytest.approx(0.75)
+    assert hero.pick_rate == pytest.approx(1.0)
+
+    comps = {c.composition_key: (c.win_count, c.loss_count, c.win_rate) for c in db.query(models.TeamComposition)}
+    assert comps == {"1,2,3,4,5,6": (3, 1, 0.75), "7,8,9,10,11,12": (1, 3, 0.25)}
+
+def test_rebuild_matches_incremental_aggregates(db, make_match):
+    for hero_id in range(1, 13):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.commit()
+    MarvelRivalsLoader(db).load_matches([make_match(str(i), winner_team=1 + i % 2) for i in range(5)], chunk_size=2)
+
+    def snapshot():
+        heroes = [(h.games_played, h.wins, h.kills, h.win_rate, h.pick_rate) for h in db.query(models.Hero).order_by(models.Hero.id)]
+        comps = sorted((c.composition_key, c.win_count, c.loss_count) for c in db.query(models.TeamComposition))
+        return heroes, comps
+
+    incremental = snapshot()
+    assert rebuild_match_aggregates(db, batch_size=2) == 5
+    assert snapshot() == incremental
+
+def test_migrations_upgrade_existing_schema():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE heroes (id INTEGER PRIMARY KEY, name VARCHAR)"))
+        conn.execute(text("CREATE TABLE team_compositions (id INTEGER PRIMARY KEY, heroes JSON)"))
+        conn.execute(text("INSERT INTO team_compositions (id, heroes) VALUES (1, '[5, 1, 3]')"))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    columns = {c["name"] for c in inspect(engine).get_columns("heroes")}
+    assert {"games_played", "wins", "losses", "damage_dealt"} <= columns
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT composition_key FROM team_compositions")).scalar() == "1,3,5"
+
+def test_loaded_matches_update_the_matchup_model(db, make_match):
+    for hero_id in range(1, 13):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.commit()
+    registry = MatchupModelRegistry(lambda: sessionmaker(bind=db.get_bind())())
+    registry.refresh(force=True)
+
+    MarvelRivalsLoader(db, matchup_model=registry).load_matches([make_match("a"), make_match("b", winner_team=2)])
+
+    assert registry.snapshot.version == 2
+    assert registry.snapshot.pair_games[0, 6] == 2
+    assert not registry.refresh()
+
+def test_stored_history_is_backfilled_by_the_cli_not_at_startup(engine, db, make_match, monkeypatch, caplog):
+    for hero_id in range(1, 13):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    # Matches stored before the running aggregates existed
+    for i, winner_team in enumerate((1, 1, 2)):
+        match = make_match(str(i), winner_team=winner_team)
+        row = models.Match(id=i + 1, match_id=match["match_id"], timestamp=datetime(2024, 3, 20, 12),
+                           duration=300, winner_team=winner_team, map="m")
+        db.add(row)
+        for hero in match["heroes"]:
+            db.add(models.MatchHero(match_id=i + 1, **hero))
+    db.commit()
+
+    run_migrations(engine)
+    assert db.get(models.Hero, 1).games_played == 0
+    assert "python -m etl.rollups --aggregates" in caplog.text
+
+    monkeypatch.setattr(rollups, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(rollups, "cache", VersionedCache(fakeredis.FakeRedis()))
+    monkeypatch.setattr(sys, "argv", ["rollups", "--aggregates"])
+    rollups.main()
+    db.expire_all()
+
+    hero = db.get(models.Hero, 1)
+    assert (hero.games_played, hero.wins, hero.kills) == (3, 2, 3)
+    assert hero.pick_rate == pytest.approx(1.0)
+    assert db.query(models.AggregateCounter).filter_by(name="matches").one().value == 3
+    assert db.query(models.HeroDailyStats).filter_by(hero_id=1).one().games == 3
+
+@pytest.mark.postgres
+def test_concurrent_startups_apply_each_migration_once(pg_engine):
+    errors = []
+
+    def migrate():
+        try:
+            run_migrations(pg_engine)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with pg_engine.connect() as conn:
+        versions = [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))]
+        conn.execute(text("DROP TABLE schema_migrations"))
+        conn.commit()
+    assert sorted(versions) == [version for version, _ in MIGRATIONS]
+
+@pytest.mark.postgres
+def test_concurrent_loads_do_not_deadlock(pg_engine, make_match):
+    Session = sessionmaker(bind=pg_engine)
+    with Session() as db:
+        db.add_all(models.Hero(id=hero_id, name=f"hero{hero_id}") for hero_id in range(1, 13))
+        db.commit()
+
+    # Disjoint heroes, so only the shared counter and pick-rate update order the two loaders
+    barrier = threading.Barrier(2)
+    loaded = {}
+
+    def load(prefix, team1, team2):
+        with Session() as db:
+            barrier.wait()
+            matches = [make_match(f"{prefix}{i}", team1, team2) for i in range(30)]
+            loaded[prefix] = MarvelRivalsLoader(db).load_matches(matches, chunk_size=1)
+
+    threads = [
+        threading.Thread(target=load, args=("a", range(1, 4), range(4, 7))),
+        threading.Thread(target=load, args=("b", range(7, 10), range(10, 13)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loaded == {"a": 30, "b": 30}
+    with Session() as db:
+        hero = db.get(models.Hero, 1)
+        assert (hero.games_played, hero.wins, hero.pick_rate) == (30, 30, 0.5)
+        assert db.query(models.AggregateCounter).filter_by(name="matches").one().value == 60
+
+def test_rejected_matches_are_dropped_without_their_chunk(db, make_match):
+    db.execute(text("PRAGMA foreign_keys = ON"))
+    db.add_all(models.Hero(id=hero_id, name=f"hero{hero_id}") for hero_id in (1, 2))
+    db.commit()
+
+    # Match "c" names a hero that does not exist, a foreign key violation
+    batch = [make_match(match_id, [1], [99 if match_id == "c" else 2]) for match_id in "abcdefg"]
+    loader = MarvelRivalsLoader(db)
+
+    assert loader.load_matches(batch) == 6
+    assert loader.failed_matches == ["c"]
+    assert sorted(m.match_id for m in db.query(models.Match)) == ["a", "b", "d", "e", "f", "g"]
+    assert db.get(models.Hero, 1).games_played == 6
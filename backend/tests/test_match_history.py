@@ -0,0 +1,98 @@
+from datetime import datetime
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.analysis.match_history import iter_matches, load_match_store
+from app.analysis import matchup_model
+from app.analysis.matchup_model import MatchupModelRegistry, build_snapshot
+
+@pytest.fixture
+def db(db):
+    for hero_id in range(1, 5):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}", role="duelist"))
+    for match_id in (1, 2, 3):
+        db.add(models.Match(id=match_id, match_id=str(match_id), winner_team=1 + match_id % 2,
+                                 timestamp=datetime(2024, 3, 20, match_id)))
+    # Interleave the appearances so grouping cannot rely on insertion order
+    for hero_id in range(1, 5):
+        for match_id in (3, 1, 2):
+            db.add(models.MatchHero(match_id=match_id, hero_id=hero_id, team=1 if hero_id <= 2 else 2,
+                                         player_id=f"p{hero_id}", kills=hero_id))
+    db.commit()
+    return db
+
+def test_iter_matches_groups_heroes_per_match(db):
+    matches = list(iter_matches(db, batch_size=2))
+
+    assert [m["id"] for m in matches] == [1, 2, 3]
+    assert [[h["hero_id"] for h in m["heroes"]] for m in matches] == [[1, 2, 3, 4]] * 3
+    assert matches[0]["winner_team"] == 2
+
+    windowed = iter_matches(db, start=datetime(2024, 3, 20, 2), end=datetime(2024, 3, 20, 3))
+    assert [m["id"] for m in windowed] == [2]
+
+def test_snapshot_builds_from_match_store(db):
+    store = load_match_store(db, batch_size=2)
+    assert len(store) == 3
+    assert store.stat("kills")[0, :4].tolist() == [1, 2, 3, 4]
+
+    snapshot = build_snapshot(db, version=1)
+    assert snapshot.pair_games.shape == (4, 4)
+    assert snapshot.pair_games[0, 2] == snapshot.pair_games[2, 0] == 3
+    assert snapshot.pair_games[0, 1] == 0
+    # Team 1 (heroes 1, 2) won match 2, team 2 won matches 1 and 3
+    assert snapshot.game_tree.win_counts[0, 2] == 1
+    assert snapshot.game_tree.win_counts[2, 0] == 2
+
+def test_registry_applies_new_matches_without_rebuilding(db):
+    registry = MatchupModelRegistry(lambda: sessionmaker(bind=db.get_bind())())
+    registry.refresh(force=True)
+    first = registry.snapshot
+
+    db.add(models.Match(id=4, match_id="4", winner_team=1, timestamp=datetime(2024, 3, 20, 4)))
+    for hero_id in range(1, 5):
+        db.add(models.MatchHero(match_id=4, hero_id=hero_id, team=1 if hero_id <= 2 else 2, player_id=f"p{hero_id}"))
+    db.commit()
+    match = next(iter_matches(db, start=datetime(2024, 3, 20, 4)))
+
+    assert registry.apply_matches([match])
+    assert not registry.apply_matches([match])
+    snapshot = registry.snapshot
+    assert snapshot.version == 2
+    assert snapshot.game_tree.win_counts[0, 2] == 2
+    assert first.game_tree.win_counts[0, 2] == 1
+    # The data version caught up, so the background worker has nothing to rebuild
+    assert not registry.refresh()
+
+def test_match_committed_during_build_is_counted_once(db, monkeypatch):
+    fingerprint = matchup_model.get_data_version
+
+    def get_data_version_then_insert(session):
+        # A match lands between the fingerprint read and the history stream
+        version = fingerprint(session)
+        db.add(models.Match(id=4, match_id="4", winner_team=1, timestamp=datetime(2024, 3, 20, 4)))
+        for hero_id in range(1, 5):
+            db.add(models.MatchHero(match_id=4, hero_id=hero_id, team=1 if hero_id <= 2 else 2, player_id=f"p{hero_id}"))
+        db.commit()
+        monkeypatch.setattr(matchup_model, "get_data_version", fingerprint)
+        return version
+
+    monkeypatch.setattr(matchup_model, "get_data_version", get_data_version_then_insert)
+    registry = MatchupModelRegistry(lambda: sessionmaker(bind=db.get_bind())())
+    registry.refresh(force=True)
+    assert registry.snapshot.game_tree.win_counts[0, 2] == 1
+
+    match = next(iter_matches(db, start=datetime(2024, 3, 20, 4)))
+    assert registry.apply_matches([match])
+    assert registry.snapshot.game_tree.win_counts[0, 2] == 2
+    assert not registry.refresh()
+
+def test_oversized_matches_are_skipped_not_fatal(db, caplog):
+    db.add(models.Match(id=4, match_id="4", winner_team=1, timestamp=datetime(2024, 3, 20, 4)))
+    for slot in range(13):
+        db.add(models.MatchHero(match_id=4, hero_id=1 + slot % 4, team=1 + slot % 2, player_id=f"p{slot}"))
+    db.commit()
+
+    store = load_match_store(db)
+    assert store.match_ids.tolist() == [1, 2, 3]
+    assert "Skipped 1 matches with more than 12 heroes" in caplog.text
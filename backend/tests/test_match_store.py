@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from app.analysis.game_tree import GameTreeAnalysis
+from app.analysis.match_store import EMPTY_SLOT, MatchStore
+from app.analysis.nash_equilibrium import TeamCompositionAnalyzer
+from etl.transformer import MarvelRivalsTransformer
+
+def make_matches(n, seed=0):
+    rng = np.random.default_rng(seed)
+    matches = []
+    for i in range(n):
+        heroes = rng.choice(np.arange(1, 16), size=12, replace=False)
+        matches.append({
+            "id": i + 1,
+            "timestamp": f"2024-03-{1 + i // 10:02d}T12:00:00Z",
+            "winner_team": int(rng.integers(1, 3)),
+            "heroes": [
+                {"hero_id": int(h), "team": 1 if slot < 6 else 2, "kills": slot, "deaths": 1,
+                 "assists": 2, "damage_dealt": 100 * slot}
+                for slot, h in enumerate(heroes)
+            ]
+        })
+    return matches
+
+def test_append_grows_and_keeps_compact_dtypes():
+    matches = make_matches(50)
+    store = MatchStore(capacity=4)
+    store.append(matches[:20])
+    store.append(matches[20:])
+
+    assert len(store) == 50
+    assert store.heroes.shape == (50, 12)
+    assert store.heroes.dtype == np.int16
+    assert store.winner_team.dtype == np.int8
+    assert store.match_ids.tolist() == list(range(1, 51))
+
+def test_window_hero_filter_and_padding():
+    store = MatchStore.from_matches(make_matches(50))
+
+    window = store.window("2024-03-02T00:00:00Z", "2024-03-04T00:00:00Z")
+    assert window.match_ids.tolist() == list(range(11, 31))
+    assert np.shares_memory(window.heroes, store.heroes)
+
+    with_hero = store.with_hero(3, team=1)
+    assert len(with_hero) > 0
+    assert ((with_hero.heroes == 3) & with_hero.team1).any(axis=1).all()
+
+    short = MatchStore.from_matches([{"winner_team": 1, "timestamp": "2024-03-01T00:00:00",
+                                      "heroes": [{"hero_id": 7, "team": 1}, {"hero_id": 2, "team": 2}]}])
+    assert short.team_heroes(1)[0].tolist() == [7] + [EMPTY_SLOT] * 11
+    assert len(short.to_columns()[0]) == 2
+
+def test_consumers_match_list_of_dicts():
+    matches = make_matches(200)
+    store = MatchStore.from_matches(matches)
+    transformer = MarvelRivalsTransformer()
+
+    assert transformer.calculate_hero_stats(store) == transformer.calculate_hero_stats(matches)
+    by_key = lambda comps: {c["key"]: c for c in comps}
+    assert by_key(transformer.identify_team_compositions(store)) == by_key(transformer.identify_team_compositions(matches))
+
+    hero_pool = [{"id": h, "name": f"hero{h}", "role": "duelist"} for h in range(1, 16)]
+    from_store, from_dicts = GameTreeAnalysis(hero_pool), GameTreeAnalysis(hero_pool)
+    from_store.initialize_from_store(store)
+    from_dicts.initialize_matchup_matrix(matches)
+    np.testing.assert_array_equal(from_store.win_counts, from_dicts.win_counts)
+
+    store_analyzer, dict_analyzer = TeamCompositionAnalyzer([]), TeamCompositionAnalyzer([])
+    store_payoff = store_analyzer.build_payoff_matrix(store)
+    dict_payoff = dict_analyzer.build_payoff_matrix(matches)
+
+    def entries(analyzer, payoff):
+        payoff = payoff.tocoo()
+        return {
+            (analyzer.interner.key(int(analyzer.composition_ids[i])), analyzer.interner.key(int(analyzer.composition_ids[j]))): v
+            for i, j, v in zip(payoff.row, payoff.col, payoff.data)
+        }
+    assert entries(store_analyzer, store_payoff) == pytest.approx(entries(dict_analyzer, dict_payoff))
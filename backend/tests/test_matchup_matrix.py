@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from app.analysis.matchup_matrix import (
+    build_hero_lookup,
+    build_win_counts,
+    map_hero_ids,
+    match_data_to_columns,
+    normalize_win_counts,
+    smooth_win_counts,
+)
+
+@pytest.fixture
+def sample_matches():
+    rng = np.random.default_rng(7)
+    hero_ids = [3, 8, 11, 12, 20, 21, 30, 41]
+    matches = []
+    for i in range(200):
+        picks = rng.choice(hero_ids, size=8, replace=False)
+        matches.append({
+            "id": i,
+            "winner_team": int(rng.integers(1, 3)),
+            "heroes": [
+                {"hero_id": int(h), "team": 1 if k < 4 else 2}
+                for k, h in enumerate(picks)
+            ]
+        })
+    return hero_ids, matches
+
+def reference_matrix(hero_ids, matches):
+    """The original nested-loop builder"""
+    n = len(hero_ids)
+    matrix = np.zeros((n, n), dtype=np.float32)
+    for match in matches:
+        winner_team = match["winner_team"]
+        for hero1 in match["heroes"]:
+            if hero1["team"] == winner_team:
+                for hero2 in match["heroes"]:
+                    if hero2["team"] != winner_team:
+                        idx1 = hero_ids.index(hero1["hero_id"])
+                        idx2 = hero_ids.index(hero2["hero_id"])
+                        matrix[idx1, idx2] += 1
+                        matrix[idx2, idx1] -= 1
+    row_sums = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, row_sums, out=np.zeros_like(matrix), where=row_sums != 0)
+
+def test_hero_lookup_maps_ids_to_indices():
+    lookup = build_hero_lookup([5, 2, 9])
+    assert map_hero_ids(lookup, [9, 5, 2]).tolist() == [2, 0, 1]
+    with pytest.raises(ValueError):
+        map_hero_ids(lookup, [3])
+
+def test_vectorized_matrix_matches_reference(sample_matches):
+    hero_ids, matches = sample_matches
+    match_idx, hero_id, team, winner_team = match_data_to_columns(matches)
+    hero_idx = map_hero_ids(build_hero_lookup(hero_ids), hero_id)
+
+    # Small chunks exercise the chunk boundaries
+    counts = build_win_counts(match_idx, hero_idx, team, winner_team, len(hero_ids), chunk_size=17)
+
+    assert counts.sum() == 200 * 4 * 4
+    np.testing.assert_allclose(normalize_win_counts(counts), reference_matrix(hero_ids, matches), atol=1e-6)
+
+def test_unsorted_appearances(sample_matches):
+    hero_ids, matches = sample_matches
+    match_idx, hero_id, team, winner_team = match_data_to_columns(matches)
+    hero_idx = map_hero_ids(build_hero_lookup(hero_ids), hero_id)
+    order = np.random.default_rng(1).permutation(len(match_idx))
+
+    expected = build_win_counts(match_idx, hero_idx, team, winner_team, len(hero_ids))
+    shuffled = build_win_counts(match_idx[order], hero_idx[order], team[order], winner_team, len(hero_ids))
+    np.testing.assert_array_equal(shuffled, expected)
+
+def test_smoothing_shrinks_rare_pairs():
+    win_counts = np.array([
+        [0, 2, 30_000],
+        [0, 0, 0],
+        [20_000, 0, 0],
+    ])
+    matrix = smooth_win_counts(win_counts, prior_games=20)
+
+    np.testing.assert_allclose(matrix, -matrix.T)
+    # Two wins out of two is weak evidence; 30k out of 50k is not
+    assert matrix[0, 1] == pytest.approx(2 / 22)
+    assert matrix[0, 2] == pytest.approx(10_000 / 50_020)
+    assert matrix[1, 2] == 0
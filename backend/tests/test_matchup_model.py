@@ -0,0 +1,56 @@
+from datetime import datetime
+import numpy as np
+from app.analysis.game_tree import GameTreeAnalysis
+from app.analysis.matchup_model import MatchupModelSnapshot
+
+def make_snapshot(matchup_matrix, pair_games):
+    hero_pool = [{"id": hero_id, "name": f"hero{hero_id}", "role": "duelist"} for hero_id in (10, 20, 30, 40)]
+    game_tree = GameTreeAnalysis(hero_pool)
+    game_tree.matchup_matrix = np.asarray(matchup_matrix, dtype=np.float32)
+    game_tree.pair_games = np.asarray(pair_games, dtype=np.int32)
+    return MatchupModelSnapshot(
+        version=1,
+        data_version=(0, 0, 4),
+        built_at=datetime(2024, 3, 20),
+        hero_pool=hero_pool,
+        game_tree=game_tree,
+        hero_names={h["id"]: h["name"] for h in hero_pool},
+        name_table=[h["name"] for h in hero_pool]
+    )
+
+MATRIX = [
+    [0.0, 0.05, 0.5, -0.3],
+    [-0.05, 0.0, 0.2, 0.15],
+    [-0.5, -0.2, 0.0, 0.0],
+    [0.3, -0.15, 0.0, 0.0],
+]
+
+def test_key_matchups_rank_significant_pairs():
+    snapshot = make_snapshot(MATRIX, np.zeros((4, 4)))
+
+    matchups = snapshot.key_matchups([10, 20], [30, 40])
+    assert [(m["hero1"]["id"], m["hero2"]["id"]) for m in matchups] == [(10, 30), (10, 40), (20, 30), (20, 40)]
+    assert matchups[1]["favors"] == "team2"
+    assert matchups[0]["hero2"] == {"id": 30, "name": "hero30"}
+    assert len(snapshot.key_matchups([10, 20], [30, 40], limit=2)) == 2
+    assert snapshot.key_matchups([10], [20]) == []
+
+def test_counter_explanations_sum_countered_advantages():
+    snapshot = make_snapshot(MATRIX, np.zeros((4, 4)))
+
+    explanations = snapshot.counter_explanations([10, 20], [30, 40])
+    assert [e["id"] for e in explanations] == [10, 20]
+    assert [c["id"] for c in explanations[0]["counters"]] == [30]
+    assert [c["id"] for c in explanations[1]["counters"]] == [30, 40]
+    assert explanations[1]["overall_value"] == float(np.float32(0.2)) + float(np.float32(0.15))
+
+def test_confidence_averages_pair_games():
+    pair_games = np.full((4, 4), 200)
+    pair_games[0, 2] = pair_games[2, 0] = 0
+    snapshot = make_snapshot(MATRIX, pair_games)
+
+    assert snapshot.confidence([20], [30, 40]) == 1.0
+    assert snapshot.confidence([10], [30, 40]) == 1.0
+    assert snapshot.confidence([10], [30]) == 0.0
+    snapshot.pair_games[0, 3] = 50
+    assert snapshot.confidence([10], [30, 40]) == 0.25
@@ -0,0 +1,91 @@
+import pytest
+from app.analysis.compositions import CompositionInterner
+from app.analysis.nash_equilibrium import TeamCompositionAnalyzer
+from etl.transformer import MarvelRivalsTransformer
+
+def make_match(team1, team2, winner_team):
+    return {
+        "winner_team": winner_team,
+        "heroes": [{"hero_id": h, "team": 1} for h in team1] + [{"hero_id": h, "team": 2} for h in team2]
+    }
+
+@pytest.fixture
+def match_history():
+    return [
+        make_match([1, 2], [3, 4], 1),
+        make_match([2, 1], [4, 3], 2),
+        make_match([1, 2], [3, 4], 1),
+        make_match([3, 4], [5, 6], 1),
+        make_match([7, 8], [1, 2], 2),  # [7, 8] only plays once
+    ]
+
+def test_payoff_matrix_is_sparse_and_zero_sum(match_history):
+    analyzer = TeamCompositionAnalyzer(hero_pool=[], min_games=2)
+    payoff = analyzer.build_payoff_matrix(match_history)
+
+    rows = {tuple(analyzer.composition_heroes(row)): row for row in range(payoff.shape[0])}
+    assert set(rows) == {(1, 2), (3, 4)}
+    assert payoff.nnz == 2
+    assert payoff[rows[(1, 2)], rows[(3, 4)]] == pytest.approx(1 / 3)
+    assert payoff[rows[(3, 4)], rows[(1, 2)]] == pytest.approx(-1 / 3)
+    assert analyzer.pair_games[rows[(1, 2)], rows[(3, 4)]] == 3
+
+def test_interner_shared_with_transformer(match_history):
+    interner = CompositionInterner()
+    comps = MarvelRivalsTransformer().identify_team_compositions(match_history, interner=interner)
+    analyzer = TeamCompositionAnalyzer(hero_pool=[], interner=interner)
+    analyzer.build_payoff_matrix(match_history)
+
+    for comp in comps:
+        assert analyzer.interner.heroes(comp["composition_id"]) == comp["heroes"]
+        assert comp["composition_id"] in analyzer.composition_rows
+
+@pytest.fixture
+def cyclic_history():
+    # Rock-paper-scissors between three compositions
+    return [
+        make_match([1, 2], [3, 4], 1),
+        make_match([3, 4], [5, 6], 1),
+        make_match([5, 6], [1, 2], 1),
+    ]
+
+@pytest.mark.parametrize("method", ["lp", "oracle", "mwu"])
+def test_equilibrium_of_cyclic_game(cyclic_history, method):
+    analyzer = TeamCompositionAnalyzer(hero_pool=[])
+    analyzer.build_payoff_matrix(cyclic_history)
+    strategy = analyzer.find_nash_equilibrium(method=method, tolerance=1e-4)
+
+    assert strategy == pytest.approx([1 / 3] * 3, abs=1e-3)
+    assert analyzer.exploitability <= 1e-3
+    assert analyzer.converged
+    assert set(analyzer.equilibrium_values()) == {"1,2", "3,4", "5,6"}
+
+def test_mwu_respects_iteration_limit_and_warm_start(cyclic_history):
+    analyzer = TeamCompositionAnalyzer(hero_pool=[])
+    analyzer.build_payoff_matrix(cyclic_history)
+    skewed = {analyzer.interner.get([1, 2]): 1.0}
+    analyzer.find_nash_equilibrium(method="mwu", warm_start=skewed, tolerance=0, max_iterations=50)
+    assert analyzer.iterations == 50
+    coarse = analyzer.exploitability
+
+    warm_start = analyzer.equilibrium_by_id()
+    analyzer.find_nash_equilibrium(method="mwu", warm_start=warm_start, tolerance=1e-2, time_budget=1.0)
+    assert analyzer.exploitability <= min(coarse, 1e-2)
+
+def test_double_oracle_solves_a_large_cyclic_game_exactly():
+    # Composition i beats i + 1 and i + 2 and loses to i - 1 and i - 2 (mod 101), so every
+    # composition is in the unique, uniform equilibrium
+    history = [
+        make_match([i], [(i + step) % 101], 1)
+        for i in range(101) for step in (1, 2)
+    ]
+    analyzer = TeamCompositionAnalyzer(hero_pool=[])
+    analyzer.build_payoff_matrix(history)
+
+    strategy = analyzer.find_nash_equilibrium(method="oracle", tolerance=1e-6)
+    assert analyzer.converged
+    assert strategy == pytest.approx([1 / 101] * 101, abs=1e-6)
+
+    # Cut short, the solver says so instead of passing the strategy off as converged
+    analyzer.find_nash_equilibrium(method="oracle", tolerance=1e-6, max_iterations=2)
+    assert not analyzer.converged
@@ -0,0 +1,66 @@
+import pytest
+from app import models
+from etl.loader import MarvelRivalsLoader
+from etl.pipeline import StreamingETLPipeline
+from etl.transformer import MarvelRivalsTransformer
+
+def raw_match(i):
+    return {
+        "id": str(i),
+        "timestamp": f"2024-03-20T12:{i % 60:02d}:00Z",
+        "duration": 300,
+        "winner_team": 1 + i % 2,
+        "map": "test_map",
+        "players": [
+            {"hero_id": h, "player_id": f"p{h}", "team": 1 if h <= 2 else 2,
+             "stats": {"kills": 1, "deaths": 1, "assists": 0, "damage_dealt": 10}}
+            for h in (1, 2, 3, 4)
+        ]
+    }
+
+class StubExtractor:
+    failed_slices = []
+
+    def __init__(self, raw_matches):
+        self.raw_matches = raw_matches
+
+    def iter_recent_matches(self, hours):
+        yield from self.raw_matches
+
+@pytest.fixture
+def db(db):
+    for hero_id in (1, 2, 3, 4):
+        db.add(models.Hero(id=hero_id, name=f"hero{hero_id}"))
+    db.commit()
+    return db
+
+def test_pipeline_streams_batches_and_aggregates_new_matches(db):
+    MarvelRivalsLoader(db).load_matches(MarvelRivalsTransformer().transform_match_data([raw_match(0)]))
+
+    pipeline = StreamingETLPipeline(
+        StubExtractor([raw_match(i) for i in range(25)]),
+        MarvelRivalsTransformer(),
+        MarvelRivalsLoader(db),
+        batch_size=10
+    )
+    summary = pipeline.run()
+
+    assert summary["batches"] == 3
+    assert summary["matches_seen"] == 25
+    assert summary["matches_loaded"] == 24
+    assert db.query(models.Match).count() == 25
+
+    comps = {tuple(c.heroes): (c.win_count, c.loss_count) for c in db.query(models.TeamComposition)}
+    # Match 0 was folded in by the first load; the pipeline only adds 1..24
+    assert comps[(1, 2)] == (13, 12)
+
+def test_single_pass_accumulate_matches_separate_passes():
+    transformer = MarvelRivalsTransformer()
+    matches = transformer.transform_match_data([raw_match(i) for i in range(7)])
+
+    hero_stats, team_comps = {}, {}
+    transformer.accumulate(matches[:3], hero_stats, team_comps)
+    transformer.accumulate(matches[3:], hero_stats, team_comps)
+
+    assert transformer.derive_hero_stats(hero_stats) == transformer.calculate_hero_stats(matches)
+    assert transformer.derive_team_compositions(team_comps) == transformer.identify_team_compositions(matches)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from datetime import datetime
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from app.analysis.game_tree import GameTreeAnalysis
+from app.analysis.matchup_model import MatchupModelSnapshot
+from app.routers import predictions
+from app.routers.predictions import BatchPredictionRequest, CounterTeamRequest, TeamPredictionRequest
+
+def test_counter_team_request_bounds_team_size():
+    assert CounterTeamRequest(enemy_team=[1]).team_size == 6
+    for team_size in (0, -1, 7, 14):
+        with pytest.raises(ValidationError):
+            CounterTeamRequest(enemy_team=[1], team_size=team_size)
+
+def test_counter_team_request_validates_role_quotas():
+    CounterTeamRequest(enemy_team=[1], role_quotas={"Vanguard": {"min": 2, "max": 2}, "Strategist": {"min": 2}})
+    invalid = [
+        {"Vanguard": {"min": -1}},
+        {"Vanguard": {"max": -1}},
+        {"Vanguard": {"min": 3, "max": 2}},
+        {"Vanguard": {"min": 3}, "Strategist": {"min": 3}, "Duelist": {"min": 1}},
+    ]
+    for role_quotas in invalid:
+        with pytest.raises(ValidationError):
+            CounterTeamRequest(enemy_team=[1], role_quotas=role_quotas)
+    with pytest.raises(ValidationError):
+        CounterTeamRequest(enemy_team=[1], team_size=3, role_quotas={"Vanguard": {"min": 2}, "Strategist": {"min": 2}})
+
+def make_model():
+    hero_pool = [{"id": hero_id, "name": f"hero{hero_id}", "role": "duelist"} for hero_id in (1, 2, 3, 4)]
+    game_tree = GameTreeAnalysis(hero_pool)
+    game_tree.initialize_matchup_matrix([
+        {"winner_team": 1, "heroes": [{"hero_id": 1, "team": 1}, {"hero_id": 2, "team": 1},
+                                      {"hero_id": 3, "team": 2}, {"hero_id": 4, "team": 2}]},
+        {"winner_team": 1, "heroes": [{"hero_id": 1, "team": 1}, {"hero_id": 3, "team": 2}]},
+    ])
+    return MatchupModelSnapshot(
+        version=7,
+        data_version=(2, 2, 4),
+        built_at=datetime(2024, 3, 20),
+        hero_pool=hero_pool,
+        game_tree=game_tree,
+        hero_names={h["id"]: h["name"] for h in hero_pool},
+        name_table=[h["name"] for h in hero_pool]
+    )
+
+def batch_request(pairs):
+    return BatchPredictionRequest(matchups=[TeamPredictionRequest(team1=t1, team2=t2) for t1, t2 in pairs])
+
+PAIRS = [([1], [3]), ([3], [1]), ([1, 2], [3, 4]), ([2], [4]), ([4], [1, 2])]
+
+def test_batch_route_scores_every_matchup():
+    model = make_model()
+    response = asyncio.run(predictions.predict_match_outcomes(batch_request(PAIRS), stream=False, model=model))
+    body = json.loads(response.body)
+
+    assert body["model_version"] == 7
+    assert [r["index"] for r in body["results"]] == list(range(len(PAIRS)))
+    expected = [model.game_tree.predict_matchup(t1, t2) for t1, t2 in PAIRS]
+    np.testing.assert_allclose([r["win_probability"] for r in body["results"]], expected, rtol=1e-6)
+    assert body["results"][0]["win_probability"] > 0.5 > body["results"][1]["win_probability"]
+
+def test_batch_route_streams_ndjson_in_chunks(monkeypatch):
+    monkeypatch.setattr(predictions, "STREAM_CHUNK_SIZE", 2)
+    model = make_model()
+
+    async def scenario():
+        response = await predictions.predict_match_outcomes(batch_request(PAIRS), stream=True, model=model)
+        return response, [chunk async for chunk in response.body_iterator]
+
+    response, chunks = asyncio.run(scenario())
+    assert response.headers["X-Model-Version"] == "7"
+    assert len(chunks) == 3
+    lines = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [line["index"] for line in lines] == list(range(len(PAIRS)))
+
+def test_batch_route_validates_heroes_and_size():
+    model = make_model()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(predictions.predict_match_outcomes(batch_request([([1], [3]), ([1], [99])]), stream=False, model=model))
+    assert error.value.status_code == 400
+    assert "matchup 1" in error.value.detail
+
+    oversized = {"matchups": [{"team1": [1], "team2": [3]}] * (predictions.MAX_BATCH_SIZE + 1)}
+    with pytest.raises(ValidationError) as error:
+        BatchPredictionRequest.model_validate(oversized)
+    assert error.value.errors()[0]["type"] == "too_long"
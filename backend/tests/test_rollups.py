@@ -0,0 +1,100 @@
+from datetime import date, datetime
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from app import models
+from etl.loader import MarvelRivalsLoader
+from etl.rollups import (
+    export_match_archive, rebuild_match_aggregates, recompute_hero_daily_stats, upsert_composition_aggregates,
+    upsert_hero_daily_stats
+)
+
+def rollup(db):
+    return {
+        (row.date, row.hero_id): (row.games, row.wins)
+        for row in db.query(models.HeroDailyStats).all()
+    }
+
+def test_incremental_rollup_matches_recompute(db, make_match):
+    loader = MarvelRivalsLoader(db)
+    loader.load_matches([
+        make_match("a", [1, 2], [3, 4], winner_team=1, timestamp=datetime(2024, 3, 20, 10)),
+        make_match("b", [1, 3], [2, 4], winner_team=2, timestamp=datetime(2024, 3, 20, 23)),
+    ])
+    loader.load_matches([
+        make_match("b", [1, 3], [2, 4], winner_team=2, timestamp=datetime(2024, 3, 20, 23)),  # duplicate, skipped
+        make_match("c", [1, 4], [2, 3], winner_team=1, timestamp=datetime(2024, 3, 21, 1)),
+    ])
+
+    incremental = rollup(db)
+    assert incremental[(date(2024, 3, 20), 1)] == (2, 1)
+    assert incremental[(date(2024, 3, 20), 4)] == (2, 1)
+    assert incremental[(date(2024, 3, 21), 4)] == (1, 1)
+
+    recompute_hero_daily_stats(db)
+    assert rollup(db) == incremental
+
+def test_recompute_only_touches_requested_days(db, make_match):
+    MarvelRivalsLoader(db).load_matches([
+        make_match("a", [1], [2], winner_team=1, timestamp=datetime(2024, 3, 20, 10)),
+        make_match("b", [1], [2], winner_team=1, timestamp=datetime(2024, 3, 21, 10)),
+    ])
+    db.query(models.HeroDailyStats).update({"games": 99})
+    db.commit()
+
+    recompute_hero_daily_stats(db, start=date(2024, 3, 21), end=date(2024, 3, 21))
+    stats = rollup(db)
+    assert stats[(date(2024, 3, 20), 1)][0] == 99
+    assert stats[(date(2024, 3, 21), 1)] == (1, 1)
+
+def test_upserts_send_rows_in_conflict_key_order(db, make_match):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, context, many: statements.append((statement, parameters)))
+
+    matches = [
+        make_match("b", [9, 2], [5, 7], winner_team=1, timestamp="2024-03-21T12:00:00Z"),
+        make_match("a", [8, 1], [6, 3], winner_team=2, timestamp="2024-03-20T12:00:00Z"),
+    ]
+    upsert_hero_daily_stats(db, matches)
+    upsert_composition_aggregates(db, {"5,7": {"heroes": [5, 7], "wins": 0, "losses": 1},
+                                       "1,8": {"heroes": [1, 8], "wins": 0, "losses": 1}})
+
+    daily = next(p for s, p in statements if "hero_daily_stats" in s)
+    keys = [(daily[i], daily[i + 1]) for i in range(0, len(daily), 4)]
+    assert keys == sorted(keys) and len(keys) == 8
+    comps = next(p for s, p in statements if "team_compositions" in s)
+    assert [p for p in comps if p in ("1,8", "5,7")] == ["1,8", "5,7"]
+
+class ListArchive:
+    def __init__(self):
+        self.matches = []
+
+    def match_ids(self):
+        return np.unique([match["id"] for match in self.matches])
+
+    def write_matches(self, matches, day_of):
+        self.matches.extend(matches)
+
+@pytest.mark.postgres
+def test_maintenance_jobs_lift_the_statement_timeout(pg_engine, make_match):
+    engine = create_engine(pg_engine.url, connect_args={"options": "-c statement_timeout=30000"})
+    timeouts = []
+    event.listen(engine, "commit", lambda conn: timeouts.append(conn.exec_driver_sql("SHOW statement_timeout").scalar()))
+    db = sessionmaker(bind=engine)()
+    db.add_all([models.Hero(id=1, name="hero1"), models.Hero(id=2, name="hero2")])
+    db.commit()
+    MarvelRivalsLoader(db).load_matches([make_match("a", [1], [2]), make_match("b", [1], [2], winner_team=2)])
+    assert timeouts == ["30s", "30s"]
+
+    recompute_hero_daily_stats(db)
+    assert rebuild_match_aggregates(db) == 2
+    assert timeouts == ["30s", "30s", "0", "0"]
+
+    archive = ListArchive()
+    assert export_match_archive(db, archive) == 2
+    assert db.execute(text("SHOW statement_timeout")).scalar() == "0"
+    db.close()
+    engine.dispose()
+
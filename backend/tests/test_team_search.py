@@ -0,0 +1,46 @@
+import itertools
+import numpy as np
+import pytest
+from app.analysis.team_search import build_synergy_matrix, search_best_team
+
+def brute_force(counter_scores, synergy, roles, team_size, role_quotas):
+    best_team, best_score = None, -np.inf
+    for team in itertools.combinations(range(len(counter_scores)), team_size):
+        counts = {}
+        for i in team:
+            counts[roles[i]] = counts.get(roles[i], 0) + 1
+        if any(not lo <= counts.get(role, 0) <= hi for role, (lo, hi) in role_quotas.items()):
+            continue
+        score = counter_scores[list(team)].sum() + sum(synergy[a, b] for a, b in itertools.combinations(team, 2))
+        if score > best_score:
+            best_team, best_score = list(team), score
+    return best_team, best_score
+
+@pytest.mark.parametrize("role_quotas", [{}, {"Vanguard": (1, 2), "Strategist": (2, 2)}])
+def test_search_matches_brute_force(role_quotas):
+    rng = np.random.default_rng(11)
+    roles = ["Vanguard", "Duelist", "Strategist"] * 4
+    for _ in range(10):
+        counter_scores = rng.normal(size=12)
+        synergy = rng.normal(scale=0.3, size=(12, 12))
+        synergy = (synergy + synergy.T) / 2
+        np.fill_diagonal(synergy, 0.0)
+
+        team, score = search_best_team(counter_scores, synergy, roles, 6, role_quotas)
+        expected_team, expected_score = brute_force(counter_scores, synergy, roles, 6, role_quotas)
+        assert team == expected_team
+        assert score == pytest.approx(expected_score)
+
+def test_infeasible_quotas():
+    with pytest.raises(ValueError):
+        search_best_team(np.zeros(8), np.zeros((8, 8)), ["Duelist"] * 8, 6, {"Strategist": (1, 6)})
+
+def test_synergy_matrix_is_shrunk_and_symmetric():
+    hero_index = {1: 0, 2: 1, 3: 2}
+    synergy = build_synergy_matrix(hero_index, [
+        {"heroes": [1, 2], "wins": 10, "losses": 0},
+        {"heroes": [2, 3], "wins": 0, "losses": 1},
+    ])
+    assert synergy[0, 1] == synergy[1, 0] == pytest.approx(10 / 20)
+    assert synergy[1, 2] == pytest.approx(-1 / 11)
+    assert synergy[0, 2] == 0